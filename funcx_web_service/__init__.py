@@ -6,9 +6,23 @@ from flask import Flask
 from flask.logging import default_handler
 from pythonjsonlogger import jsonlogger
 
+from funcx_web_service.authentication.auth import GroupMembershipCache
+from funcx_web_service.authentication.globus_auth import (
+    GlobusClients,
+    TokenIntrospectionCache,
+)
+from funcx_web_service.compression import compress_response, decompress_request
 from funcx_web_service.container_service_adapter import ContainerServiceAdapter
+from funcx_web_service.cooperative import is_cooperative
 from funcx_web_service.error_responses import create_error_response
 from funcx_web_service.models import db, load_all_models
+from funcx_web_service.models.redis_pool import RedisPoolManager
+from funcx_web_service.models.redis_replicas import ReplicaReader
+from funcx_web_service.models.redis_shards import parse_nodes
+from funcx_web_service.models.search_queue import SearchIngestQueue
+from funcx_web_service.models.task_changes import TaskChangeRecorder
+from funcx_web_service.models.task_log import TaskLogWriter
+from funcx_web_service.models.task_waiter import TaskWaiter
 from funcx_web_service.response import FuncxResponse
 from funcx_web_service.routes.container import container_api
 from funcx_web_service.routes.funcx import funcx_api
@@ -72,6 +86,143 @@ def create_app(test_config=None):
     else:
         application.extensions["ContainerService"] = None
 
+    if application.config.get("TASK_LOG_BACKGROUND_WRITES", False):
+        application.extensions["TaskLogWriter"] = TaskLogWriter(
+            application,
+            max_queue_size=application.config.get("TASK_LOG_QUEUE_SIZE", 10000),
+        )
+    else:
+        application.extensions["TaskLogWriter"] = None
+
+    application.extensions["GlobusClients"] = GlobusClients(application)
+
+    # for state shared between workers, e.g. the auth caches and the search ingest
+    # queue, and for the tasks themselves. Every use shares one pool per worker.
+    shared_redis = None
+    redis_shards = parse_nodes(application.config.get("REDIS_SHARDS", []))
+    redis_replicas = parse_nodes(application.config.get("REDIS_REPLICAS", []))
+    if redis_replicas and redis_shards:
+        # each shard would need replicas of its own
+        logger.warning("REDIS_REPLICAS is not supported with REDIS_SHARDS")
+        redis_replicas = []
+    if "REDIS_HOST" in application.config:
+        redis_pool = RedisPoolManager(
+            application.config["REDIS_HOST"],
+            application.config["REDIS_PORT"],
+            max_connections=application.config.get("REDIS_MAX_CONNECTIONS", 50),
+            timeout=application.config.get("REDIS_POOL_TIMEOUT", 5.0),
+            health_check_interval=application.config.get(
+                "REDIS_HEALTH_CHECK_INTERVAL", 30
+            ),
+            stats_interval=application.config.get("REDIS_POOL_STATS_INTERVAL", 60.0),
+            shards=redis_shards,
+            replicas=redis_replicas,
+        )
+        application.extensions["RedisPoolManager"] = redis_pool
+
+        @application.after_request
+        def log_redis_pool_stats(response):
+            redis_pool.log_stats(logger)
+            return response
+
+        shared_redis = redis_pool.client
+    else:
+        application.extensions["RedisPoolManager"] = None
+
+    # for read-only status checks, which fall back to the primary if no replica is
+    # fresh enough
+    if shared_redis is not None and redis_replicas:
+        application.extensions["RedisReplicaReader"] = ReplicaReader(
+            redis_pool.replica_clients,
+            max_staleness=application.config.get("REDIS_REPLICA_MAX_STALENESS"),
+            check_interval=application.config.get("REDIS_REPLICA_CHECK_INTERVAL", 5.0),
+        )
+    else:
+        application.extensions["RedisReplicaReader"] = None
+
+    introspection_ttl = application.config.get("TOKEN_INTROSPECTION_CACHE_TTL", 60)
+    if introspection_ttl > 0:
+        use_shared = application.config.get("TOKEN_INTROSPECTION_CACHE_SHARED", True)
+        application.extensions["TokenIntrospectionCache"] = TokenIntrospectionCache(
+            shared_redis if use_shared else None,
+            max_ttl=introspection_ttl,
+            negative_ttl=application.config.get(
+                "TOKEN_INTROSPECTION_NEGATIVE_CACHE_TTL", 5
+            ),
+            maxsize=application.config.get("TOKEN_INTROSPECTION_CACHE_SIZE", 4096),
+        )
+    else:
+        application.extensions["TokenIntrospectionCache"] = None
+
+    group_membership_ttl = application.config.get("GROUP_MEMBERSHIP_CACHE_TTL", 300)
+    if group_membership_ttl > 0:
+        use_shared = application.config.get("GROUP_MEMBERSHIP_CACHE_SHARED", True)
+        application.extensions["GroupMembershipCache"] = GroupMembershipCache(
+            shared_redis if use_shared else None,
+            ttl=group_membership_ttl,
+            maxsize=application.config.get("GROUP_MEMBERSHIP_CACHE_SIZE", 4096),
+        )
+    else:
+        application.extensions["GroupMembershipCache"] = None
+
+    search_ingest_queue = application.config.get("SEARCH_INGEST_QUEUE", False)
+    if search_ingest_queue and shared_redis is None:
+        logger.warning("SEARCH_INGEST_QUEUE needs REDIS_HOST to be set")
+    if shared_redis is not None and search_ingest_queue:
+        application.extensions["SearchIngestQueue"] = SearchIngestQueue(
+            application,
+            shared_redis,
+            batch_size=application.config.get("SEARCH_INGEST_BATCH_SIZE", 100),
+        )
+    else:
+        application.extensions["SearchIngestQueue"] = None
+
+    task_waits = application.config.get("TASK_WAIT_MAX", 30) > 0
+    # task hash notifications are published by each shard, and the waiter only
+    # listens to one node
+    if task_waits and redis_shards:
+        logger.warning("Task waits are not supported with REDIS_SHARDS")
+        task_waits = False
+    if shared_redis is not None and task_waits:
+        application.extensions["TaskWaiter"] = TaskWaiter(
+            application,
+            shared_redis,
+            recheck_interval=application.config.get("TASK_WAIT_RECHECK_INTERVAL", 5.0),
+            configure_notifications=application.config.get(
+                "TASK_WAIT_CONFIGURE_NOTIFICATIONS", False
+            ),
+        )
+        if not is_cooperative():
+            logger.warning(
+                "Requests which wait on tasks hold their worker until they return, "
+                "run uwsgi with gevent as uwsgi.ini does to serve them concurrently"
+            )
+    else:
+        application.extensions["TaskWaiter"] = None
+
+    change_feed = application.config.get("TASK_CHANGE_FEED", False)
+    # task hash notifications are published by each shard, and the recorder only
+    # listens to one node
+    if change_feed and redis_shards:
+        logger.warning("TASK_CHANGE_FEED is not supported with REDIS_SHARDS")
+    if shared_redis is not None and change_feed and not redis_shards:
+        recorder = TaskChangeRecorder(
+            application,
+            shared_redis,
+            lease_ttl=application.config.get("TASK_CHANGE_RECORDER_LEASE_TTL", 30.0),
+            reconcile_interval=application.config.get(
+                "TASK_CHANGE_RECORDER_RECONCILE_INTERVAL", 60.0
+            ),
+            configure_notifications=application.config.get(
+                "TASK_WAIT_CONFIGURE_NOTIFICATIONS", False
+            ),
+        )
+        application.extensions["TaskChangeRecorder"] = recorder
+        # in each worker, rather than in the process they are forked from
+        application.before_first_request(recorder.start)
+    else:
+        application.extensions["TaskChangeRecorder"] = None
+
     load_all_models()
     db.init_app(application)
 
@@ -79,6 +230,9 @@ def create_app(test_config=None):
     def create_tables():
         db.create_all()
 
+    application.before_request(decompress_request)
+    application.after_request(compress_response)
+
     @application.errorhandler(Exception)
     def handle_exception(e):
         logger.exception(e)
@@ -1,8 +1,12 @@
 from flask_migrate import Migrate
 
 from funcx_web_service import create_app
+from funcx_web_service.cooperative import patch_database_driver
 from funcx_web_service.models import db
 
+# before the first connection to the database is made
+patch_database_driver()
+
 app = create_app()
 db.init_app(app)
 
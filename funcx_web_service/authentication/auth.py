@@ -1,4 +1,4 @@
-import functools
+import typing as t
 from functools import wraps
 
 from flask import current_app, make_response
@@ -10,12 +10,14 @@ from funcx_common.response_errors import (
 from globus_nexus_client import NexusClient
 from globus_sdk import AccessTokenAuthorizer
 from globus_sdk.base import BaseClient
+from redis import Redis
 
 from funcx_web_service.models.auth_groups import AuthGroup
 from funcx_web_service.models.endpoint import Endpoint
 from funcx_web_service.models.function import Function, FunctionAuthGroup
 
 from .auth_state import get_auth_state
+from .cache import TwoTierCache
 from .globus_auth import get_auth_client
 
 # Default scope if not provided in config
@@ -76,7 +78,25 @@ def authenticated_w_uuid(f):
     return decorated_function
 
 
-def check_group_membership(token, endpoint_groups):
+class GroupMembershipCache(TwoTierCache):
+    """
+    Caches the ids of the groups which each user is a member of, keyed by the user
+    rather than by token, for `ttl` seconds. A user who joins or leaves a group may
+    therefore wait up to that long for access to change.
+    """
+
+    def __init__(
+        self, redis_client: t.Optional[Redis], *, ttl: float = 300, maxsize: int = 4096
+    ):
+        super().__init__("group_membership", redis_client, maxsize=maxsize)
+        self.ttl = ttl
+
+    def get_group_ids(self, user_id, loader: t.Callable[[], t.Set[str]]) -> t.Set[str]:
+        group_ids = self.get_or_load(str(user_id), lambda: sorted(loader()), self.ttl)
+        return set(group_ids)
+
+
+def check_group_membership(token, endpoint_groups, user_id=None):
     """Determine whether or not the user is a member
     of any of the groups
 
@@ -86,28 +106,41 @@ def check_group_membership(token, endpoint_groups):
         The user's nexus token
     endpoint_groups : list
         A list of the group ids associated with the endpoint
+    user_id : str
+        The primary identity of the user. If given, the user's groups are looked up
+        in the GroupMembershipCache before calling the Groups API.
 
     Returns
     -------
     bool
         Whether or not the user is a member of any of the groups
     """
+    cache = current_app.extensions.get("GroupMembershipCache")
+    if cache is not None and user_id is not None:
+        user_group_ids = cache.get_group_ids(
+            user_id, lambda: _get_user_group_ids(token)
+        )
+    else:
+        user_group_ids = _get_user_group_ids(token)
+
+    # Check if any of the user's groups match
+    if user_group_ids & set(endpoint_groups):
+        return True
+    return False
+
+
+def _get_user_group_ids(token):
     client = get_auth_client()
     dep_tokens = client.oauth2_get_dependent_tokens(token)
 
     if "groups.api.globus.org" in dep_tokens.by_resource_server:
         current_app.logger.debug("Using groups v2 api.")
         token = dep_tokens.by_resource_server["groups.api.globus.org"]["access_token"]
-        user_group_ids = _get_group_ids_groups_api(token)
+        return _get_group_ids_groups_api(token)
     else:
         current_app.logger.debug("Using legacy nexus api.")
         token = dep_tokens.by_resource_server["nexus.api.globus.org"]["access_token"]
-        user_group_ids = _get_group_ids_nexus_api(token)
-
-    # Check if any of the user's groups match
-    if user_group_ids & set(endpoint_groups):
-        return True
-    return False
+        return _get_group_ids_nexus_api(token)
 
 
 def _get_group_ids_groups_api(token):
@@ -134,7 +167,6 @@ def _get_group_ids_nexus_api(token):
     return user_group_ids
 
 
-@functools.lru_cache()
 def authorize_endpoint(user_id, endpoint_uuid, function_uuid, token):
     """Determine whether or not the user is allowed to access this endpoint.
     This is done in two steps: first, check if the user owns the endpoint. If not,
@@ -185,12 +217,11 @@ def authorize_endpoint(user_id, endpoint_uuid, function_uuid, token):
         groups = AuthGroup.find_by_endpoint_uuid(endpoint_uuid)
         endpoint_groups = [g.group_id for g in groups]
         if len(endpoint_groups) > 0:
-            authorized = check_group_membership(token, endpoint_groups)
+            authorized = check_group_membership(token, endpoint_groups, user_id=user_id)
 
     return authorized
 
 
-@functools.lru_cache()
 def authorize_function(user_id, function_uuid, token):
     """Determine whether or not the user is allowed to access this function.
     This is done in two steps: first, check if the user owns the function. If not,
@@ -231,6 +262,76 @@ def authorize_function(user_id, function_uuid, token):
         function_groups = [g.group_id for g in groups]
 
         if len(function_groups) > 0:
-            authorized = check_group_membership(token, function_groups)
+            authorized = check_group_membership(token, function_groups, user_id=user_id)
 
     return authorized
+
+
+def authorize_function_record(user_id, function, function_groups, token):
+    """Determine whether or not the user is allowed to access an already loaded
+    function record. This is the same check as `authorize_function`, for callers
+    which have resolved the function and its group ids in bulk.
+
+    Parameters
+    ----------
+    user_id : str
+        The primary identity of the user
+    function : Function
+        The function record
+    function_groups : list
+        The group ids associated with the function
+    token : str
+        The auth token
+
+    Returns
+    -------
+    bool
+        Whether or not the user is allowed access to the function
+    """
+    if function.user_id == user_id or function.public:
+        return True
+
+    if len(function_groups) > 0:
+        return check_group_membership(token, function_groups, user_id=user_id)
+    return False
+
+
+def authorize_endpoint_record(user_id, endpoint, endpoint_groups, function_uuid, token):
+    """Determine whether or not the user is allowed to access an already loaded
+    endpoint record. This is the same check as `authorize_endpoint`, for callers
+    which have resolved the endpoint, its whitelist and its group ids in bulk.
+
+    Raises an Exception if the endpoint is restricted and the provided function is
+    not whitelisted.
+
+    Parameters
+    ----------
+    user_id : str
+        The primary identity of the user
+    endpoint : Endpoint
+        The endpoint record
+    endpoint_groups : list
+        The group ids associated with the endpoint
+    function_uuid : str
+        The uuid of the function
+    token : str
+        The auth token
+
+    Returns
+    -------
+    bool
+        Whether or not the user is allowed access to the endpoint
+    """
+    if endpoint.restricted:
+        current_app.logger.debug("Restricted endpoint, checking function is allowed.")
+        whitelisted_functions = [f.function_uuid for f in endpoint.restricted_functions]
+
+        if function_uuid not in whitelisted_functions:
+            raise FunctionNotPermitted(function_uuid, endpoint.endpoint_uuid)
+
+    if endpoint.public or endpoint.user_id == user_id:
+        return True
+
+    if len(endpoint_groups) > 0:
+        return check_group_membership(token, endpoint_groups, user_id=user_id)
+    return False
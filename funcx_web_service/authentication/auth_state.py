@@ -1,6 +1,5 @@
 import typing as t
 
-import globus_sdk
 from flask import abort, current_app, g, request
 
 from funcx_web_service.models.user import User
@@ -34,7 +33,7 @@ class AuthenticationState:
         )
         self.token = token
 
-        self.introspect_data: t.Optional[globus_sdk.GlobusHTTPResponse] = None
+        self.introspect_data: t.Optional[t.Dict[str, t.Any]] = None
         self.identity_id: t.Optional[str] = None
         self.username: t.Optional[str] = None
         self._user_object: t.Optional[User] = None
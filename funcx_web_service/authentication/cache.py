@@ -0,0 +1,257 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+import typing as t
+import uuid
+from collections import OrderedDict
+
+from redis import Redis, RedisError
+
+logger = logging.getLogger(__name__)
+
+# delete a lock only if it is still held by the caller
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class LocalTTLCache:
+    """
+    A bounded, thread-safe, in-process cache whose entries each expire after their
+    own TTL. When full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, t.Tuple[float, t.Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> t.Any:
+        """Get a value, or None if it is not cached or has expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: t.Any, ttl: float) -> None:
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class TwoTierCache:
+    """
+    A cache of JSON-serializable values with an in-process tier in front of a tier
+    in Redis which is shared by every worker.
+
+    Lookups try the in-process tier, then Redis, and a value found in Redis is kept
+    in-process for the rest of its TTL. Failures to reach Redis are logged and treated
+    as misses, so that the cache can never make a request fail.
+
+    `get_or_load` also makes sure that concurrent misses for one key produce one call
+    to the loader between them, rather than one each: threads in this process wait on
+    a lock, and other processes wait up to `lock_timeout` seconds for the value to
+    appear in Redis.
+
+    Hits in each tier, misses and Redis errors are counted in `stats`.
+    """
+
+    _STATS = {"local": "local_hits", "shared": "shared_hits", "miss": "misses"}
+
+    def __init__(
+        self,
+        name: str,
+        redis_client: t.Optional[Redis],
+        *,
+        maxsize: int = 4096,
+        lock_timeout: float = 5.0,
+        poll_interval: float = 0.05,
+    ):
+        self.name = name
+        self.redis_client = redis_client
+        self.local = LocalTTLCache(maxsize)
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._key_locks: t.Dict[str, t.List[t.Any]] = {}
+        self._key_locks_lock = threading.Lock()
+
+    def _count(self, stat: str) -> None:
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.name}_{key}"
+
+    def get(self, key: str) -> t.Any:
+        """Get a value, or None if neither tier has it"""
+        value, result = self._lookup(key)
+        self._record(result)
+        return value
+
+    def get_or_load(self, key: str, loader: t.Callable[[], t.Any], ttl: float) -> t.Any:
+        """
+        Get a value, calling `loader` to produce it and caching the result for ttl
+        seconds if neither tier has it. Exceptions from the loader are not cached.
+        """
+        value, result = self._lookup(key)
+        if value is None:
+            with self._key_lock(key):
+                # another thread may have loaded it while this one waited
+                value, result = self._lookup(key)
+                if value is None:
+                    value, result = self._load(key, loader, ttl)
+        self._record(result)
+        return value
+
+    def set(self, key: str, value: t.Any, ttl: float) -> None:
+        """Cache a value in both tiers for ttl seconds; a ttl of 0 or less is a no-op"""
+        if ttl <= 0:
+            return
+        self.local.set(key, value, ttl)
+
+        if self.redis_client is not None:
+            entry = {"expires": time.time() + ttl, "value": value}
+            try:
+                self.redis_client.set(
+                    self._redis_key(key), json.dumps(entry), px=int(ttl * 1000)
+                )
+            except RedisError:
+                self._count("errors")
+                logger.warning(f"Failed to write to {self.name} cache", exc_info=True)
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(self._redis_key(key))
+            except RedisError:
+                self._count("errors")
+                logger.warning(
+                    f"Failed to delete from {self.name} cache", exc_info=True
+                )
+
+    def _lookup(self, key: str) -> t.Tuple[t.Any, str]:
+        value = self.local.get(key)
+        if value is not None:
+            return value, "local"
+        value = self._lookup_shared(key)
+        if value is not None:
+            return value, "shared"
+        return None, "miss"
+
+    def _lookup_shared(self, key: str) -> t.Any:
+        if self.redis_client is None:
+            return None
+        try:
+            raw = self.redis_client.get(self._redis_key(key))
+        except RedisError:
+            self._count("errors")
+            logger.warning(f"Failed to read from {self.name} cache", exc_info=True)
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        self.local.set(key, entry["value"], entry["expires"] - time.time())
+        return entry["value"]
+
+    def _load(
+        self, key: str, loader: t.Callable[[], t.Any], ttl: float
+    ) -> t.Tuple[t.Any, str]:
+        lock_key = self._redis_key(f"lock_{key}")
+        lock_token = str(uuid.uuid4())
+        acquired = self._acquire_shared_lock(lock_key, lock_token)
+
+        if not acquired:
+            # another process is loading this key, wait for it to store the value
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value = self._lookup_shared(key)
+                if value is not None:
+                    return value, "shared"
+            logger.warning(
+                f"Timed out waiting for {self.name} cache to be filled, loading it"
+            )
+
+        try:
+            value = loader()
+            self.set(key, value, ttl)
+        finally:
+            if acquired:
+                self._release_shared_lock(lock_key, lock_token)
+        return value, "miss"
+
+    def _acquire_shared_lock(self, lock_key: str, lock_token: str) -> bool:
+        if self.redis_client is None:
+            return True
+        try:
+            return bool(
+                self.redis_client.set(
+                    lock_key, lock_token, nx=True, px=int(self.lock_timeout * 1000)
+                )
+            )
+        except RedisError:
+            self._count("errors")
+            logger.warning(f"Failed to lock {self.name} cache", exc_info=True)
+            # carry on without the lock rather than without the value
+            return True
+
+    def _release_shared_lock(self, lock_key: str, lock_token: str) -> None:
+        if self.redis_client is None:
+            return
+        try:
+            release = self.redis_client.register_script(_RELEASE_LOCK_SCRIPT)
+            release(keys=[lock_key], args=[lock_token])
+        except RedisError:
+            self._count("errors")
+            logger.warning(f"Failed to unlock {self.name} cache", exc_info=True)
+
+    @contextlib.contextmanager
+    def _key_lock(self, key: str) -> t.Iterator[None]:
+        # one lock per key being loaded, dropped once nothing is waiting on it
+        with self._key_locks_lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def _record(self, result: str) -> None:
+        self._count(self._STATS[result])
+        logger.debug(
+            f"{self.name} cache lookup: {result}",
+            extra={"log_type": "cache_lookup", "cache": self.name, "result": result},
+        )
@@ -1,22 +1,115 @@
+import hashlib
+import os
+import threading
+import time
+import typing as t
+
 import globus_sdk
 from flask import abort, current_app
+from redis import Redis
+
+from .cache import TwoTierCache
+
+
+class TokenIntrospectionCache(TwoTierCache):
+    """
+    Caches token introspection responses, keyed by the sha256 of the token so that
+    tokens themselves are never stored.
+
+    Active tokens are cached until they expire, but for no more than `max_ttl`
+    seconds, so that revoked tokens stop working within that time. Inactive tokens
+    are cached for `negative_ttl` seconds, so that a client retrying with a bad token
+    cannot force an introspection call on every request.
+    """
+
+    def __init__(
+        self,
+        redis_client: t.Optional[Redis],
+        *,
+        max_ttl: float = 60,
+        negative_ttl: float = 5,
+        maxsize: int = 4096,
+    ):
+        super().__init__("token_introspection", redis_client, maxsize=maxsize)
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, data: t.Dict[str, t.Any]) -> float:
+        if not data.get("active", False):
+            return self.negative_ttl
+        ttl = self.max_ttl
+        if data.get("exp") is not None:
+            ttl = min(ttl, data["exp"] - time.time())
+        return ttl
+
+    def get_introspection(self, token: str) -> t.Optional[t.Dict[str, t.Any]]:
+        return self.get(self.token_key(token))
+
+    def set_introspection(self, token: str, data: t.Dict[str, t.Any]) -> None:
+        self.set(self.token_key(token), data, self.ttl_for(data))
 
 
-def introspect_token(
-    token: str, *, verify: bool = True
-) -> globus_sdk.GlobusHTTPResponse:
-    client = get_auth_client()
-    data = client.oauth2_token_introspect(token)
+def introspect_token(token: str, *, verify: bool = True) -> t.Dict[str, t.Any]:
+    cache = current_app.extensions.get("TokenIntrospectionCache")
+    data = cache.get_introspection(token) if cache is not None else None
+    if data is None:
+        client = get_auth_client()
+        data = client.oauth2_token_introspect(token).data
+        if cache is not None:
+            cache.set_introspection(token, data)
+
     if verify:
         if not data.get("active", False):
             abort(401, "Credentials are inactive.")
     return data
 
 
-# FIXME:
-# this should be only creating a single client per web worker, not a new one per call
+class GlobusClients:
+    """
+    Globus SDK clients shared by every request in a worker, so that their HTTP
+    sessions, and the connections those keep alive, are reused rather than opened
+    again for each call.
+
+    Clients are created on first use in each process. Any created before a fork are
+    discarded in the child, so that uwsgi workers never share the sockets of a session
+    which was opened in the master.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._clients: t.Dict[str, t.Any] = {}
+        self._pid: t.Optional[int] = None
+        # reentrant, since creating one client may need another
+        self._lock = threading.RLock()
+
+    def get(self, name: str, factory: t.Callable[[], t.Any]) -> t.Any:
+        """Get the named client, creating it with factory if this worker has none"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients = {}
+                self._pid = os.getpid()
+            client = self._clients.get(name)
+            if client is None:
+                client = self._clients[name] = factory()
+            return client
+
+    def auth_client(self) -> globus_sdk.ConfidentialAppAuthClient:
+        return self.get("auth", self._new_auth_client)
+
+    def _new_auth_client(self) -> globus_sdk.ConfidentialAppAuthClient:
+        return globus_sdk.ConfidentialAppAuthClient(
+            self.app.config["GLOBUS_CLIENT"], self.app.config["GLOBUS_KEY"]
+        )
+
+
+def get_globus_clients() -> GlobusClients:
+    return current_app.extensions["GlobusClients"]
+
+
 def get_auth_client():
-    """Create an AuthClient for the service."""
-    return globus_sdk.ConfidentialAppAuthClient(
-        current_app.config["GLOBUS_CLIENT"], current_app.config["GLOBUS_KEY"]
-    )
+    """Get the worker's AuthClient for the service."""
+    return get_globus_clients().auth_client()
@@ -0,0 +1,118 @@
+"""
+Content-Encoding for request and response bodies.
+
+Responses longer than RESPONSE_COMPRESSION_THRESHOLD bytes are compressed with
+whichever of zstd and gzip the client prefers in its Accept-Encoding, zstd only
+being offered if the `zstandard` package is installed. Streamed responses are sent
+as they are.
+
+Bodies of the task routes, which can carry batches of serialized arguments, may be
+sent compressed in the same encodings. They are decompressed before the route reads
+them, and refused if they would decompress to more than
+REQUEST_MAX_DECOMPRESSED_SIZE bytes, so that a small request cannot expand into an
+unbounded amount of memory.
+"""
+
+import gzip
+import io
+import zlib
+
+try:
+    import zstandard
+
+    has_zstd = True
+except ImportError:
+    has_zstd = False
+
+from flask import current_app as app
+from flask import request
+from funcx_common.response_errors import RequestMalformed
+
+# the routes whose bodies may be compressed
+DECOMPRESSED_ENDPOINTS = {"routes.submit", "routes.batch_status"}
+
+# favour speed, since responses are compressed while the client waits
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def _response_encodings():
+    return ["zstd", "gzip"] if has_zstd else ["gzip"]
+
+
+def compress_response(response):
+    """Compress a response in the encoding the client prefers, if it is worth it"""
+    threshold = app.config.get("RESPONSE_COMPRESSION_THRESHOLD", 1024)
+    if (
+        not app.config.get("RESPONSE_COMPRESSION", True)
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(_response_encodings())
+    if encoding is None or (response.content_length or 0) < threshold:
+        return response
+
+    data = response.get_data()
+    if encoding == "zstd":
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def decompress_body(data: bytes, encoding: str, max_size: int) -> bytes:
+    """
+    Decompress a request body, raising RequestMalformed if it is not valid or would
+    be larger than max_size bytes
+    """
+    try:
+        if encoding == "gzip":
+            # 16 + MAX_WBITS reads the gzip header and trailer
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            raw = decompressor.decompress(data, max_size + 1)
+            if len(raw) <= max_size and not decompressor.eof:
+                raise RequestMalformed("request body is truncated")
+        elif encoding == "zstd" and has_zstd:
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+            chunks = []
+            size = 0
+            while size <= max_size:
+                chunk = reader.read(max_size + 1 - size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+            raw = b"".join(chunks)
+        else:
+            raise RequestMalformed(f"unsupported Content-Encoding: {encoding}")
+    except RequestMalformed:
+        raise
+    except Exception:
+        raise RequestMalformed(f"request body could not be decoded as {encoding}")
+
+    if len(raw) > max_size:
+        raise RequestMalformed(
+            f"decompressed request body is larger than {max_size} bytes"
+        )
+    return raw
+
+
+def decompress_request():
+    """Replace the compressed body of a task route's request with its contents"""
+    encoding = request.content_encoding
+    if not encoding or encoding == "identity":
+        return
+    if request.endpoint not in DECOMPRESSED_ENDPOINTS:
+        raise RequestMalformed(f"unsupported Content-Encoding: {encoding}")
+
+    max_size = app.config.get("REQUEST_MAX_DECOMPRESSED_SIZE", 100 * 1024 * 1024)
+    data = request.get_data(cache=False)
+    # request.json and get_data() read from the cache, so see the contents from here
+    request._cached_data = decompress_body(data, encoding.lower(), max_size)
@@ -0,0 +1,40 @@
+"""
+Support for serving requests on uwsgi's gevent loop, as uwsgi.ini configures.
+
+Status requests may wait on their tasks for up to TASK_WAIT_MAX seconds, and task
+group event streams for longer. Under gevent, such a request only holds a greenlet
+while it waits, and its worker carries on serving other requests. uwsgi monkey-
+patches the standard library before the app is imported, so that threads, Events,
+sockets and so on all yield to the loop. psycopg2 talks to the database from C, so
+it is made to yield separately, with psycogreen.
+"""
+
+try:
+    from gevent import monkey
+
+    has_gevent = True
+except ImportError:
+    has_gevent = False
+
+try:
+    from psycogreen.gevent import patch_psycopg
+
+    has_psycogreen = True
+except ImportError:
+    has_psycogreen = False
+
+
+def is_cooperative() -> bool:
+    """Whether a blocked request yields its worker to others"""
+    return has_gevent and monkey.is_module_patched("threading")
+
+
+def patch_database_driver() -> bool:
+    """
+    Make database queries yield to other requests, if the worker is cooperative,
+    returning whether they do
+    """
+    if not is_cooperative() or not has_psycogreen:
+        return False
+    patch_psycopg()
+    return True
@@ -20,3 +20,9 @@ class AuthGroup(db.Model):
     @classmethod
     def find_by_endpoint_uuid(cls, endpoint_uuid):
         return cls.query.filter_by(endpoint_id=endpoint_uuid).all()
+
+    @classmethod
+    def find_by_endpoint_uuids(cls, endpoint_uuids):
+        if not endpoint_uuids:
+            return []
+        return cls.query.filter(cls.endpoint_id.in_(list(endpoint_uuids))).all()
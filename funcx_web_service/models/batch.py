@@ -0,0 +1,136 @@
+import time
+import typing as t
+from types import MappingProxyType
+
+from flask import current_app as app
+from funcx_common.response_errors import EndpointNotFound, FunctionNotFound
+
+from funcx_web_service.authentication.auth import (
+    authorize_endpoint_record,
+    authorize_function_record,
+)
+from funcx_web_service.models.auth_groups import AuthGroup
+from funcx_web_service.models.endpoint import Endpoint
+from funcx_web_service.models.function import Function
+
+
+class SubmitBatchLookup:
+    """
+    Read-only lookup table of the functions and endpoints used by a batch of tasks.
+
+    Each distinct function and endpoint in the batch is loaded once, together with
+    the container, auth group and whitelist relationships needed to authorize and
+    launch a task, so that launching the tasks of a batch does not repeat the same
+    queries for every task.
+    """
+
+    def __init__(
+        self,
+        functions: t.Dict[str, Function],
+        endpoints: t.Dict[str, Endpoint],
+        endpoint_groups: t.Dict[str, t.List[str]],
+    ):
+        self.functions: t.Mapping[str, Function] = MappingProxyType(functions)
+        self.endpoints: t.Mapping[str, Endpoint] = MappingProxyType(endpoints)
+        self.endpoint_groups: t.Mapping[str, t.List[str]] = MappingProxyType(
+            endpoint_groups
+        )
+
+        # authorization outcomes are remembered for the life of the batch, since
+        # most tasks in a batch share a handful of functions and endpoints
+        self._function_auth: t.Dict[t.Tuple[t.Any, ...], bool] = {}
+        self._endpoint_auth: t.Dict[t.Tuple[t.Any, ...], bool] = {}
+
+    @classmethod
+    def load(
+        cls, function_uuids: t.Iterable[str], endpoint_uuids: t.Iterable[str]
+    ) -> "SubmitBatchLookup":
+        """Resolve the given function and endpoint uuids with a few IN queries"""
+        start = time.time()
+
+        functions = {f.function_uuid: f for f in Function.find_by_uuids(function_uuids)}
+        endpoints = {e.endpoint_uuid: e for e in Endpoint.find_by_uuids(endpoint_uuids)}
+        endpoint_groups: t.Dict[str, t.List[str]] = {uuid: [] for uuid in endpoints}
+        for group in AuthGroup.find_by_endpoint_uuids(list(endpoints)):
+            endpoint_groups[group.endpoint_id].append(group.group_id)
+
+        delta = time.time() - start
+        app.logger.info(
+            f"Time to resolve {len(functions)} functions and {len(endpoints)} "
+            f"endpoints {delta * 1000:.1f}ms"
+        )
+        return cls(functions, endpoints, endpoint_groups)
+
+    @classmethod
+    def from_tasks(cls, tasks: t.Iterable[t.Sequence[t.Any]]) -> "SubmitBatchLookup":
+        """Build a lookup for the [function_uuid, endpoint_uuid, payload] task lists
+        sent to /submit"""
+        function_uuids = set()
+        endpoint_uuids = set()
+        for task in tasks:
+            # malformed ids are left out, and fail as "not found" for their task
+            if isinstance(task[0], str):
+                function_uuids.add(task[0])
+            if isinstance(task[1], str):
+                endpoint_uuids.add(task[1])
+        return cls.load(function_uuids, endpoint_uuids)
+
+    def get_function(self, function_uuid: str) -> Function:
+        function = self.functions.get(function_uuid)
+        if function is None:
+            raise FunctionNotFound(function_uuid)
+        return function
+
+    def get_endpoint(self, endpoint_uuid: str) -> Endpoint:
+        endpoint = self.endpoints.get(endpoint_uuid)
+        if endpoint is None:
+            raise EndpointNotFound(endpoint_uuid)
+        return endpoint
+
+    def resolve_function(
+        self, function_uuid: str
+    ) -> t.Tuple[str, str, t.Optional[str]]:
+        """The batch equivalent of `resolve_function`
+
+        Returns
+        -------
+        str
+            The function code
+        str
+            The function entry point
+        str
+            The uuid of the container image to use
+        """
+        function = self.get_function(function_uuid)
+        if function.container:
+            container_uuid = function.container.container.container_uuid
+        else:
+            container_uuid = None
+        return function.function_source_code, function.entry_point, container_uuid
+
+    def authorize_function(self, user_id: int, function_uuid: str, token: str) -> bool:
+        """The batch equivalent of `authorize_function`"""
+        key = (user_id, function_uuid, token)
+        if key not in self._function_auth:
+            function = self.get_function(function_uuid)
+            function_groups = [g.group_id for g in function.auth_groups]
+            self._function_auth[key] = authorize_function_record(
+                user_id, function, function_groups, token
+            )
+        return self._function_auth[key]
+
+    def authorize_endpoint(
+        self, user_id: int, endpoint_uuid: str, function_uuid: str, token: str
+    ) -> bool:
+        """The batch equivalent of `authorize_endpoint`"""
+        key = (user_id, endpoint_uuid, function_uuid, token)
+        if key not in self._endpoint_auth:
+            endpoint = self.get_endpoint(endpoint_uuid)
+            self._endpoint_auth[key] = authorize_endpoint_record(
+                user_id,
+                endpoint,
+                self.endpoint_groups.get(endpoint_uuid, []),
+                function_uuid,
+                token,
+            )
+        return self._endpoint_auth[key]
@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Integer, String, and_
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, selectinload
 from sqlalchemy.orm.exc import NoResultFound
 
 from funcx_web_service.models import db
@@ -75,6 +75,18 @@ class Endpoint(db.Model):
         except NoResultFound:
             return None
 
+    @classmethod
+    def find_by_uuids(cls, uuids):
+        """Load many endpoints at once, eagerly fetching their restricted function
+        whitelists so that they can be used without further queries."""
+        if not uuids:
+            return []
+        return (
+            cls.query.filter(cls.endpoint_uuid.in_(list(uuids)))
+            .options(selectinload(cls.restricted_functions))
+            .all()
+        )
+
     @classmethod
     def delete_endpoint(cls, user: User, endpoint_uuid):
         """Delete a function
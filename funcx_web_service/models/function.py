@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, selectinload
 from sqlalchemy.orm.exc import NoResultFound
 
 from funcx_web_service.models import db
@@ -54,6 +54,21 @@ class Function(db.Model):
         except NoResultFound:
             return None
 
+    @classmethod
+    def find_by_uuids(cls, uuids):
+        """Load many functions at once, eagerly fetching their container and
+        auth group relationships so that they can be used without further queries."""
+        if not uuids:
+            return []
+        return (
+            cls.query.filter(cls.function_uuid.in_(list(uuids)))
+            .options(
+                selectinload(cls.container).joinedload(FunctionContainer.container),
+                selectinload(cls.auth_groups),
+            )
+            .all()
+        )
+
 
 class FunctionContainer(db.Model):
     __tablename__ = "function_containers"
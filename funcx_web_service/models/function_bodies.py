@@ -0,0 +1,97 @@
+"""
+Content-addressed storage of function bodies in Redis.
+
+Rather than storing the packed function body in front of the arguments of every
+task, a body is stored once under the sha256 of its contents. Tasks carry the id of
+the body in `function_body_id` and only the arguments as their payload, and the full
+payload is put back together with `resolve_task_payload` when it is dispatched.
+
+Bodies count the tasks which refer to them and are removed along with the last one.
+They also expire on their own, with the expiry pushed back whenever a new task
+refers to them, so a body always outlives the tasks which were created with it.
+"""
+
+import hashlib
+import typing as t
+from datetime import timedelta
+
+from funcx_common.task_storage import StorageException, TaskStorage
+from funcx_common.tasks import TaskProtocol
+from redis import Redis
+
+# matches RedisTask.TASK_TTL
+FUNCTION_BODY_TTL = timedelta(weeks=2)
+
+_RELEASE_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+local refs = redis.call("HINCRBY", KEYS[1], "refs", -1)
+if refs <= 0 then
+    redis.call("DEL", KEYS[1])
+end
+return refs
+"""
+
+
+def function_body_id(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def function_body_key(body_id: str) -> str:
+    return f"function_body_{body_id}"
+
+
+def store_function_bodies(
+    redis_client: Redis, bodies: t.Dict[str, str], refs: t.Dict[str, int]
+) -> None:
+    """
+    Store bodies (by id) and add references to them, in one round trip.
+
+    This runs as a transaction, so that a body cannot be removed by its last
+    reference being released in between being found and being referenced again.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    for body_id, body in bodies.items():
+        key = function_body_key(body_id)
+        pipe.hsetnx(key, "body", body)
+        pipe.hincrby(key, "refs", refs[body_id])
+        pipe.expire(key, FUNCTION_BODY_TTL)
+    pipe.execute()
+
+
+def get_function_body(redis_client: Redis, body_id: str) -> t.Optional[str]:
+    return redis_client.hget(function_body_key(body_id), "body")
+
+
+def release_function_body(redis_client: Redis, body_id: str) -> int:
+    """Drop a reference to a body, returning the number of references left"""
+    release = redis_client.register_script(_RELEASE_SCRIPT)
+    return int(release(keys=[function_body_key(body_id)]))
+
+
+def release_function_bodies(pipe: t.Any, body_ids: t.Iterable[str]) -> None:
+    """Queue the release of a reference to each of body_ids on a pipeline"""
+    release = pipe.register_script(_RELEASE_SCRIPT)
+    for body_id in body_ids:
+        release(keys=[function_body_key(body_id)], client=pipe)
+
+
+def resolve_task_payload(
+    redis_client: Redis, task: TaskProtocol, storage: TaskStorage
+) -> t.Optional[str]:
+    """
+    Get the full payload of a task, i.e. the packed function body followed by the
+    arguments, whether or not its function body was stored separately.
+    """
+    payload = storage.get_payload(task)
+    body_id = getattr(task, "function_body_id", None)
+    if payload is None or not body_id:
+        return payload
+
+    body = get_function_body(redis_client, body_id)
+    if body is None:
+        raise StorageException(
+            f"function body {body_id} of task {task.task_id} is missing"
+        )
+    return body + payload
@@ -0,0 +1,47 @@
+"""
+The total number of tasks ever submitted, kept as a counter split over sub-keys.
+
+Every submit used to increment the one key funcx_invocation_counter, which made it
+the hottest key in Redis and pinned it to one node. Each submit now increments one
+of INVOCATION_COUNTER_SHARDS sub-keys, picked at random, by the size of its batch,
+and the total is only summed up when it is read. The original key is still part of
+the sum, so the count carries on from where it was.
+
+The sub-keys have no routing id, so a ShardedRedis keeps them all on the REDIS_HOST
+node, where scripts/store_usage.py reads them with a plain client.
+"""
+
+import random
+import typing as t
+
+from redis import Redis
+
+INVOCATION_COUNTER_KEY = "funcx_invocation_counter"
+# must not shrink, or the counts of the sub-keys dropped would be lost
+INVOCATION_COUNTER_SHARDS = 16
+
+
+def invocation_counter_keys() -> t.List[str]:
+    """Every key which is part of the count, the original one first"""
+    return [INVOCATION_COUNTER_KEY] + [
+        f"{INVOCATION_COUNTER_KEY}_{shard}"
+        for shard in range(INVOCATION_COUNTER_SHARDS)
+    ]
+
+
+def invocation_counter_key() -> str:
+    """The sub-key for a batch of tasks to be counted in"""
+    return f"{INVOCATION_COUNTER_KEY}_{random.randrange(INVOCATION_COUNTER_SHARDS)}"
+
+
+def count_invocations(pipe: t.Any, count: int) -> None:
+    """Queue an increment of the count by count on a pipeline"""
+    pipe.incrby(invocation_counter_key(), count)
+
+
+def read_invocation_count(redis_client: Redis) -> int:
+    """Sum the count, in one round trip"""
+    pipe = redis_client.pipeline(transaction=False)
+    for key in invocation_counter_keys():
+        pipe.get(key)
+    return sum(int(value) for value in pipe.execute() if value is not None)
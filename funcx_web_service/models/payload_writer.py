@@ -0,0 +1,79 @@
+import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from funcx_common.response_errors import InternalError
+from funcx_common.task_storage import RedisS3Storage, TaskStorage
+from funcx_common.tasks import TaskProtocol
+
+from funcx_web_service.models.storage_codec import base_storage
+
+
+class PayloadWriter:
+    """Stores the payloads of a batch of tasks concurrently.
+
+    Payloads which RedisS3Storage puts in S3 are uploaded by a pool of at most
+    `max_concurrency` threads, so that a batch takes about as long as its slowest
+    upload rather than the sum of them. Every other payload is only set on its task
+    in memory, so is stored straight away.
+
+    Parameters
+    ----------
+    storage : TaskStorage
+        The storage to put each payload in
+    max_concurrency : int
+        The number of uploads of a batch which may be in progress at once
+    timeout : float
+        The number of seconds the whole batch's uploads may take
+    """
+
+    def __init__(self, storage: TaskStorage, *, max_concurrency=8, timeout=30.0):
+        self.storage = storage
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor: t.Optional[ThreadPoolExecutor] = None
+        self._uploads: t.Dict[str, Future] = {}
+
+    def _is_upload(self, payload: str) -> bool:
+        storage = base_storage(self.storage)
+        return (
+            isinstance(storage, RedisS3Storage)
+            and len(payload) > storage.redis_threshold
+        )
+
+    def store(self, task: TaskProtocol, payload: str) -> None:
+        """Store the payload of task, starting the upload if it goes to S3"""
+        if not self._is_upload(payload):
+            self.storage.store_payload(task, payload)
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix="funcx-payload-writer",
+            )
+        self._uploads[task.task_id] = self._executor.submit(
+            self.storage.store_payload, task, payload
+        )
+
+    def wait(self) -> t.Dict[str, Exception]:
+        """
+        Wait up to timeout seconds for the uploads to finish, returning the error of
+        each task whose payload was not stored, by task id
+        """
+        if self._executor is None:
+            return {}
+        # uploads which miss the deadline carry on after shutdown, but their tasks
+        # are never sent
+        self._executor.shutdown(wait=False)
+        wait(self._uploads.values(), timeout=self.timeout)
+
+        errors: t.Dict[str, Exception] = {}
+        for task_id, upload in self._uploads.items():
+            if not upload.done():
+                upload.cancel()
+                errors[task_id] = InternalError(
+                    f"storing the payload of task {task_id} timed out"
+                )
+            elif upload.exception() is not None:
+                errors[task_id] = t.cast(Exception, upload.exception())
+        return errors
@@ -0,0 +1,216 @@
+"""
+One Redis connection pool per worker, shared by every request and background thread.
+
+Requests used to build a client, and with it a new connection pool, each time they
+touched Redis, so every request paid for a fresh TCP connection. The pool here is
+created once and handed out through RedisPoolManager.client. redis-py resets a pool
+when it is first used in a forked process, so workers never share the connections
+of the process they were forked from.
+
+Connections are checked when they are taken from the pool rather than on every
+request: any unread data means the connection is reset, and a connection which has
+been idle for `health_check_interval` seconds is PINGed before it is used. The pool
+counts how long requests wait for a connection and how often connections have to
+be re-established, which RedisPoolManager logs every `stats_interval` seconds.
+
+With shards, task state is spread over several more nodes by a ShardedRedis client,
+with a pool of its own for each, and the counts cover every pool. So do the pools of
+any replicas, which are used for read-only status checks.
+"""
+
+import os
+import threading
+import time
+import typing as t
+
+import redis
+from redis.connection import BlockingConnectionPool, Connection
+
+from funcx_web_service.models.redis_shards import ShardedRedis
+
+
+class RedisPoolMetrics:
+    """Counters of a worker's connection pool, since the worker started"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.pid = os.getpid()
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.connects = 0
+            self.reconnects = 0
+
+    def checked_out(self, wait: float, failed: bool = False) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_failures += int(failed)
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    def connected(self, reconnect: bool) -> None:
+        with self._lock:
+            self.connects += 1
+            self.reconnects += int(reconnect)
+
+
+class _MeteredConnectionMixin:
+    metrics: RedisPoolMetrics
+    _sock: t.Any
+
+    def __init__(self, *, metrics: RedisPoolMetrics, **kwargs: t.Any):
+        self.metrics = metrics
+        self._connected_before = False
+        super().__init__(**kwargs)  # type: ignore[call-arg]
+
+    def connect(self) -> None:
+        if self._sock:
+            return
+        super().connect()  # type: ignore[misc]
+        self.metrics.connected(reconnect=self._connected_before)
+        self._connected_before = True
+
+
+class MeteredConnectionPool(BlockingConnectionPool):
+    """A BlockingConnectionPool which records its checkouts and connections"""
+
+    def __init__(
+        self,
+        *,
+        metrics: RedisPoolMetrics,
+        connection_class: t.Type[Connection] = Connection,
+        **kwargs: t.Any,
+    ):
+        self.metrics = metrics
+        metered_class = type(
+            f"Metered{connection_class.__name__}",
+            (_MeteredConnectionMixin, connection_class),
+            {},
+        )
+        super().__init__(connection_class=metered_class, metrics=metrics, **kwargs)
+
+    def reset(self) -> None:
+        super().reset()
+        self._opened = 0
+        # the counts of the process this one was forked from aren't this one's
+        if self.metrics.pid != os.getpid():
+            self.metrics.reset()
+
+    def get_connection(self, command_name, *keys, **options):
+        start = time.monotonic()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except Exception:
+            self.metrics.checked_out(time.monotonic() - start, failed=True)
+            raise
+        self.metrics.checked_out(time.monotonic() - start)
+        return connection
+
+    def make_connection(self) -> Connection:
+        connection = super().make_connection()
+        self._opened += 1
+        return connection
+
+    @property
+    def size(self) -> int:
+        """The number of connections the pool has opened"""
+        return self._opened
+
+
+class RedisPoolManager:
+    """Owns a worker's Redis connection pool and the client which uses it.
+
+    Parameters
+    ----------
+    host : str
+        The Redis host
+    port : int
+        The Redis port
+    max_connections : int
+        The most connections the pool opens. Requests wait for a connection to be
+        returned once they are all in use.
+    timeout : float
+        The number of seconds to wait for a connection before giving up
+    health_check_interval : int
+        The number of seconds a connection may be idle before it is checked with a
+        PING when it is next used
+    stats_interval : float
+        The number of seconds between logs of the pool's metrics
+    shards : list of (str, int)
+        The hosts and ports of the nodes to spread task state over, if any. The host
+        and port above are then only used for everything else.
+    replicas : list of (str, int)
+        The hosts and ports of replicas of the node, if any, for replica_clients
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        *,
+        max_connections=50,
+        timeout=5.0,
+        health_check_interval=30,
+        stats_interval=60.0,
+        shards=(),
+        replicas=(),
+    ):
+        self.metrics = RedisPoolMetrics()
+        pool_kwargs = dict(
+            metrics=self.metrics,
+            decode_responses=True,
+            max_connections=max_connections,
+            timeout=timeout,
+            health_check_interval=health_check_interval,
+        )
+        self.pool = MeteredConnectionPool(host=host, port=port, **pool_kwargs)
+        self.shard_pools = [
+            MeteredConnectionPool(host=shard_host, port=shard_port, **pool_kwargs)
+            for shard_host, shard_port in shards
+        ]
+        self.client = redis.StrictRedis(connection_pool=self.pool)
+        if self.shard_pools:
+            self.client = ShardedRedis(
+                self.client,
+                [redis.StrictRedis(connection_pool=pool) for pool in self.shard_pools],
+                [f"{shard_host}:{shard_port}" for shard_host, shard_port in shards],
+            )
+        self.replica_pools = [
+            MeteredConnectionPool(host=replica_host, port=replica_port, **pool_kwargs)
+            for replica_host, replica_port in replicas
+        ]
+        self.replica_clients = [
+            redis.StrictRedis(connection_pool=pool) for pool in self.replica_pools
+        ]
+        self.stats_interval = stats_interval
+        self._last_logged = time.monotonic()
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        metrics = self.metrics
+        checkouts = max(metrics.checkouts, 1)
+        return {
+            "max_connections": self.pool.max_connections,
+            "shards": len(self.shard_pools),
+            "connections": sum(pool.size for pool in [self.pool, *self.shard_pools]),
+            "checkouts": metrics.checkouts,
+            "checkout_failures": metrics.checkout_failures,
+            "mean_wait_ms": metrics.wait_seconds / checkouts * 1000,
+            "max_wait_ms": metrics.max_wait_seconds * 1000,
+            "connects": metrics.connects,
+            "reconnects": metrics.reconnects,
+        }
+
+    def log_stats(self, logger, force: bool = False) -> None:
+        """Log the pool's metrics, if stats_interval has passed since the last log"""
+        now = time.monotonic()
+        if not force and now - self._last_logged < self.stats_interval:
+            return
+        self._last_logged = now
+        logger.info(
+            "redis_pool_stats", extra={"log_type": "redis_pool", **self.stats()}
+        )
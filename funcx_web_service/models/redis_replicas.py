@@ -0,0 +1,86 @@
+"""
+Read-only status checks served by Redis replicas.
+
+Clients poll the status of their tasks far more often than the tasks change, and
+every poll reads the task hashes. With REDIS_REPLICAS set, those reads go to a
+replica, leaving the primary for writes and for fetching and deleting the results of
+completed tasks.
+
+A replica is only read from while it is in sync with the primary. With
+REDIS_REPLICA_MAX_STALENESS set, it must also have heard from the primary within
+that many seconds. The primary pings its replicas every repl-ping-replica-period
+seconds, 10 by default, so a bound lower than that only holds while the primary is
+busy. Each replica's state is checked at most every `check_interval` seconds, and
+reads go to the primary while none are fit to read from.
+"""
+
+import itertools
+import threading
+import time
+import typing as t
+
+from redis import Redis
+
+
+class ReplicaReader:
+    """Picks a replica to read from, in turn, among those which are fresh enough
+
+    Parameters
+    ----------
+    replicas : list of Redis
+        Clients for the replicas of the primary
+    max_staleness : float, optional
+        The most seconds a replica may have gone without hearing from the primary,
+        if any
+    check_interval : float
+        The number of seconds a replica's state is trusted for before it is checked
+        again
+    """
+
+    def __init__(
+        self,
+        replicas: t.List[Redis],
+        *,
+        max_staleness: t.Optional[float] = None,
+        check_interval: float = 5.0,
+    ):
+        self.replicas = replicas
+        self.max_staleness = max_staleness
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._turns = itertools.cycle(range(len(replicas)))
+        # replica index -> (whether it was fresh, when that was checked)
+        self._checked: t.Dict[int, t.Tuple[bool, float]] = {}
+
+    def client(self) -> t.Optional[Redis]:
+        """A replica to read from, or None if none are fresh enough"""
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                index = next(self._turns)
+            if self._is_usable(index):
+                return self.replicas[index]
+        return None
+
+    def _is_usable(self, index: int) -> bool:
+        now = time.monotonic()
+        fresh, checked_at = self._checked.get(index, (False, None))
+        if checked_at is None or now - checked_at >= self.check_interval:
+            fresh = self._is_fresh(self.replicas[index])
+            self._checked[index] = (fresh, now)
+        return fresh
+
+    def _is_fresh(self, replica: Redis) -> bool:
+        try:
+            info = replica.info("replication")
+        except Exception:
+            return False
+        if (
+            info.get("role") != "slave"
+            or info.get("master_link_status") != "up"
+            or info.get("master_sync_in_progress")
+        ):
+            return False
+        if self.max_staleness is None:
+            return True
+        last_io = info.get("master_last_io_seconds_ago", -1)
+        return 0 <= last_io <= self.max_staleness
@@ -0,0 +1,308 @@
+"""
+Task state spread over several Redis nodes with a client-side consistent-hash ring.
+
+Task hashes, task groups, endpoint queues and channels, and function bodies are the
+bulk of what is kept in Redis. With REDIS_SHARDS set, they are spread over the
+listed nodes, and everything else, e.g. the auth caches and every sub-key of the
+invocation counter, stays on the REDIS_HOST node, where scripts which use a plain
+client, like scripts/store_usage.py, can read it.
+
+Keys are placed by a routing id rather than by the whole key, so that the keys
+which are used together always land on the same node:
+
+- a key with a hash tag, e.g. `foo_{bar}`, is placed by its tag, as Redis Cluster
+  would place it
+- a task group's keys, `task_group_<id>`, `task_group_tasks_<id>` and so on, by the
+  group id, so its scripts only ever touch one node
+- an endpoint's queue and channel by the endpoint id
+- a task hash by the task id, and a function body by its id
+
+An id which is a UUID is placed by its last group alone. The tasks of a batch are
+given ids by colocated_uuid() which share the last group of their task group's id,
+so a batch, and its group, are written to one node, and reading back the tasks of a
+batch only touches that node.
+
+ShardedRedis has the interface of a StrictRedis client. Commands are sent to the
+node of their first key, or of their channel for PUBLISH. DELETE, UNLINK and
+EXISTS are split up by node, and scripts must only use keys on one node. Pipelines
+send one pipeline to each node they touch, and send any PUBLISH after every other
+command, so subscribers can always read what was written ahead of it.
+
+The forwarder reads and writes the same keys, so it must place them exactly as
+routing_id() and HashRing do here, with the same REDIS_SHARDS, before REDIS_SHARDS
+may be set. Until it does, it would look for tasks on the REDIS_HOST node.
+"""
+
+import bisect
+import hashlib
+import typing as t
+import uuid
+
+from redis import Redis
+
+# keys whose id follows the prefix, longest first so that e.g. task group keys are
+# not taken for task hashes
+ROUTED_PREFIXES = (
+    "task_group_change_state_",
+    "task_group_completed_",
+    "task_group_changes_",
+    "task_group_tasks_",
+    "task_group_",
+    "task_channel_",
+    "task_queue_",
+    "function_body_",
+    "task_",
+)
+
+# commands which are sent to the default node, whatever their arguments
+_DEFAULT_NODE_COMMANDS = {
+    "config_get",
+    "config_set",
+    "dbsize",
+    "info",
+    "ping",
+    "pubsub",
+    "time",
+}
+# commands which take any number of keys, and whose results are counts
+_MULTI_KEY_COMMANDS = {"delete", "exists", "touch", "unlink"}
+
+
+def uuid_node(value: str) -> t.Optional[str]:
+    """The last group of a UUID string, or None if value isn't one"""
+    groups = value.split("-")
+    if [len(group) for group in groups] != [8, 4, 4, 4, 12]:
+        return None
+    return groups[-1]
+
+
+def routing_id(key: str) -> t.Optional[str]:
+    """Get the id by which key is placed, or None if it belongs on the default node"""
+    start = key.find("{")
+    if start != -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            return key[start + 1 : end]  # noqa: E203
+    for prefix in ROUTED_PREFIXES:
+        if key.startswith(prefix):
+            # ids never contain underscores, but the suffixes after them do
+            routed = key[len(prefix) :].split("_", 1)[0]  # noqa: E203
+            return uuid_node(routed) or routed
+    return None
+
+
+def colocated_uuid(other: str) -> str:
+    """
+    Make a new random UUID which is placed on the same node as the UUID other, by
+    giving it the same last group
+    """
+    node = uuid_node(other)
+    if node is None:
+        raise ValueError(f"{other} is not a UUID")
+    return str(uuid.uuid4())[:-12] + node
+
+
+def parse_nodes(value: t.Union[str, t.List[str]]) -> t.List[t.Tuple[str, int]]:
+    """
+    Parse the REDIS_SHARDS setting, a list of host:port strings, or one string of
+    them separated by commas when it is set from the environment
+    """
+    if isinstance(value, str):
+        value = [node for node in value.split(",") if node.strip()]
+    nodes = []
+    for node in value:
+        host, _, port = node.strip().rpartition(":")
+        nodes.append((host, int(port)))
+    return nodes
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Maps routing ids onto nodes, each node having `replicas` points on the ring so
+    that ids are spread evenly, and adding a node only moves about 1/n of them
+    """
+
+    def __init__(self, node_names: t.List[str], replicas: int = 160):
+        points = []
+        for index, name in enumerate(node_names):
+            for replica in range(replicas):
+                points.append((_hash(f"{name}-{replica}"), index))
+        points.sort()
+        self._hashes = [point for point, _ in points]
+        self._nodes = [index for _, index in points]
+
+    def node_for(self, routing_key: str) -> int:
+        position = bisect.bisect(self._hashes, _hash(routing_key))
+        return self._nodes[position % len(self._nodes)]
+
+
+class ShardedRedis:
+    """A Redis client over a default node and a ring of shard nodes
+
+    Parameters
+    ----------
+    default : Redis
+        The client for the node which keys without a routing id are kept on
+    shards : list of Redis
+        The clients for the nodes of the ring
+    node_names : list of str
+        The names of the shards, e.g. host:port, which place them on the ring. These
+        must be the same everywhere the ring is used.
+    """
+
+    def __init__(self, default: Redis, shards: t.List[Redis], node_names: t.List[str]):
+        self.default = default
+        self.shards = shards
+        self.ring = HashRing(node_names)
+
+    def node_for(self, key: str) -> Redis:
+        routing_key = routing_id(key)
+        if routing_key is None:
+            return self.default
+        return self.shards[self.ring.node_for(routing_key)]
+
+    def keys_by_node(self, keys: t.Iterable[str]) -> t.List[t.Tuple[Redis, t.List]]:
+        """Group keys by the node they are on, in the order they were given"""
+        by_node: t.Dict[int, t.Tuple[Redis, t.List]] = {}
+        for key in keys:
+            node = self.node_for(key)
+            by_node.setdefault(id(node), (node, []))[1].append(key)
+        return list(by_node.values())
+
+    def register_script(self, script: str) -> "ShardedScript":
+        return ShardedScript(self, script)
+
+    def pipeline(self, transaction: bool = True) -> "ShardedPipeline":
+        return ShardedPipeline(self, transaction=transaction)
+
+    def __getattr__(self, name: str) -> t.Any:
+        attr = getattr(self.default, name)
+        if not callable(attr) or name in _DEFAULT_NODE_COMMANDS:
+            return attr
+
+        if name in _MULTI_KEY_COMMANDS:
+
+            def multi_key_command(*keys: str) -> int:
+                return sum(
+                    getattr(node, name)(*node_keys)
+                    for node, node_keys in self.keys_by_node(keys)
+                )
+
+            return multi_key_command
+
+        def command(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            node = self.node_for(args[0]) if args else self.default
+            return getattr(node, name)(*args, **kwargs)
+
+        return command
+
+
+class ShardedScript:
+    """A Lua script which runs on the node of its keys"""
+
+    def __init__(self, client: ShardedRedis, script: str):
+        self.client = client
+        self.script = script
+        self._scripts: t.Dict[int, t.Any] = {}
+
+    def _node_script(self, keys: t.List[str]) -> t.Tuple[Redis, t.Any]:
+        nodes = {id(node): node for node in map(self.client.node_for, keys)}
+        if len(nodes) > 1:
+            raise ValueError("a script's keys must all be on the same Redis node")
+        node = next(iter(nodes.values())) if nodes else self.client.default
+        if id(node) not in self._scripts:
+            self._scripts[id(node)] = node.register_script(self.script)
+        return node, self._scripts[id(node)]
+
+    def __call__(self, keys=(), args=(), client=None):
+        keys = list(keys)
+        node, script = self._node_script(keys)
+        if isinstance(client, ShardedPipeline):
+            client._queue(node, lambda pipe: script(keys=keys, args=args, client=pipe))
+            return client
+        return script(keys=keys, args=args)
+
+
+class ShardedPipeline:
+    """
+    Buffers commands like a redis-py pipeline, and sends them in one pipeline per
+    node on execute(), returning their results in the order they were queued
+    """
+
+    def __init__(self, client: ShardedRedis, *, transaction: bool = True):
+        self.client = client
+        self.transaction = transaction
+        self.reset()
+
+    def reset(self) -> None:
+        # each command is queued against a node, and results in a sum of the results
+        # of its parts when it is split over several
+        self._commands: t.List[t.List[t.Tuple[Redis, t.Callable, bool]]] = []
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __enter__(self) -> "ShardedPipeline":
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self.reset()
+
+    def _queue(self, node: Redis, call: t.Callable, publish: bool = False) -> None:
+        self._commands.append([(node, call, publish)])
+
+    def register_script(self, script: str) -> ShardedScript:
+        return self.client.register_script(script)
+
+    def __getattr__(self, name: str) -> t.Any:
+        if name in _MULTI_KEY_COMMANDS:
+
+            def multi_key_command(*keys: str) -> "ShardedPipeline":
+                parts = [
+                    (node, lambda pipe, ks=node_keys: getattr(pipe, name)(*ks), False)
+                    for node, node_keys in self.client.keys_by_node(keys)
+                ]
+                self._commands.append(parts)
+                return self
+
+            return multi_key_command
+
+        def command(*args: t.Any, **kwargs: t.Any) -> "ShardedPipeline":
+            node = self.client.node_for(args[0]) if args else self.client.default
+            self._queue(
+                node,
+                lambda pipe: getattr(pipe, name)(*args, **kwargs),
+                publish=name == "publish",
+            )
+            return self
+
+        return command
+
+    def execute(self) -> t.List[t.Any]:
+        commands, self._commands = self._commands, []
+        results: t.List[t.Any] = [0] * len(commands)
+        # publishes go out once everything else has been written
+        for publishes in (False, True):
+            pipes: t.Dict[int, t.Any] = {}
+            positions: t.Dict[int, t.List[int]] = {}
+            for position, parts in enumerate(commands):
+                for node, call, publish in parts:
+                    if publish != publishes:
+                        continue
+                    if id(node) not in pipes:
+                        pipes[id(node)] = node.pipeline(transaction=self.transaction)
+                        positions[id(node)] = []
+                    call(pipes[id(node)])
+                    positions[id(node)].append(position)
+
+            for node_id, pipe in pipes.items():
+                for position, result in zip(positions[node_id], pipe.execute()):
+                    if len(commands[position]) > 1:
+                        results[position] += result
+                    else:
+                        results[position] = result
+        return results
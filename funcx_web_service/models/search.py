@@ -1,9 +1,10 @@
 from typing import Any, Dict
 
 from flask import current_app as app
-from globus_sdk import AccessTokenAuthorizer, SearchAPIError, SearchClient
+from globus_sdk import ClientCredentialsAuthorizer, SearchAPIError, SearchClient
 
 import funcx_web_service.authentication.auth
+import funcx_web_service.authentication.globus_auth
 
 FUNCTION_SEARCH_INDEX_NAME = "funcx"
 FUNCTION_SEARCH_INDEX_ID = "673a4b58-3231-421d-9473-9df1b6fa3a9d"
@@ -35,21 +36,28 @@ def _sanitize_tokens(token_data: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def get_search_client():
-    """Creates a Globus Search Client using FuncX's client token"""
+    """Gets the worker's Globus Search Client, which uses FuncX's client token"""
+    clients = funcx_web_service.authentication.globus_auth.get_globus_clients()
+    return clients.get("search", _create_search_client)
+
+
+def _create_search_client():
     auth_client = funcx_web_service.authentication.auth.get_auth_client()
-    tokens = auth_client.oauth2_client_credentials_tokens(
-        requested_scopes=[SEARCH_SCOPE]
+    # fetches a token now, and a new one only once it is about to expire
+    authorizer = ClientCredentialsAuthorizer(
+        auth_client, SEARCH_SCOPE, on_refresh=_log_search_token
     )
-    search_token = tokens.by_scopes[SEARCH_SCOPE]
-    app.logger.debug(f"Search token: {_sanitize_tokens(search_token)}")
-    access_token = search_token["access_token"]
-    authorizer = AccessTokenAuthorizer(access_token)
-    app.logger.debug("Acquired AccessTokenAuthorizer for search")
+    app.logger.debug("Acquired ClientCredentialsAuthorizer for search")
     search_client = SearchClient(authorizer)
     app.logger.debug("Acquired SearchClient with that authorizer")
     return search_client
 
 
+def _log_search_token(tokens):
+    search_token = tokens.by_scopes[SEARCH_SCOPE]
+    app.logger.debug(f"Search token: {_sanitize_tokens(search_token)}")
+
+
 def _trim_func_data(func_data):
     """Remove unnecessary fields from FuncX function metadata for ingest
 
@@ -100,8 +108,8 @@ def _exists(client, index, func_uuid):
         raise err
 
 
-def func_ingest_or_update(func_uuid, func_data, author="", author_urn=""):
-    """Update or create a function in search index
+def function_ingest_entry(func_uuid, func_data, author="", author_urn=""):
+    """Build the search entry (a GMetaEntry) for a function
 
     Parameters
     ----------
@@ -109,9 +117,12 @@ def func_ingest_or_update(func_uuid, func_data, author="", author_urn=""):
     func_data : dict
     author : str
     author_urn : str
+
+    Returns
+    -------
+    dict
+        The entry, with the function uuid as its subject
     """
-    client = get_search_client()
-    app.logger.debug("Acquired search client")
     acl = []
     if func_data["public"]:
         acl.append("public")
@@ -132,7 +143,33 @@ def func_ingest_or_update(func_uuid, func_data, author="", author_urn=""):
     content["author"] = author
     content["version"] = "0"
 
-    ingest_data = {"subject": func_uuid, "visible_to": acl, "content": content}
+    return {"subject": func_uuid, "visible_to": acl, "content": content}
+
+
+def func_ingest_or_update(func_uuid, func_data, author="", author_urn=""):
+    """Update or create a function in search index
+
+    If the SearchIngestQueue is enabled, the entry is queued and ingested in the
+    background rather than sent to the search index before returning.
+
+    Parameters
+    ----------
+    func_uuid : str
+    func_data : dict
+    author : str
+    author_urn : str
+    """
+    ingest_data = function_ingest_entry(
+        func_uuid, func_data, author=author, author_urn=author_urn
+    )
+
+    ingest_queue = app.extensions.get("SearchIngestQueue")
+    if ingest_queue is not None:
+        ingest_queue.enqueue(FUNCTION_SEARCH_INDEX_ID, ingest_data)
+        return
+
+    client = get_search_client()
+    app.logger.debug("Acquired search client")
 
     # Since we associate only 1 entry with each subject (func_uuid), there is basically
     # no difference between creating and updating, other than the method...
@@ -146,21 +183,21 @@ def func_ingest_or_update(func_uuid, func_data, author="", author_urn=""):
         client.update_entry(FUNCTION_SEARCH_INDEX_ID, ingest_data)
 
 
-def endpoint_ingest_or_update(ep_uuid, data, owner="", owner_urn=""):
-    """
+def endpoint_ingest_entry(ep_uuid, data, owner="", owner_urn=""):
+    """Build the search entry (a GMetaEntry) for an endpoint
 
     Parameters
     ----------
-    ep_uuid
-    data
-    owner
-    owner_urn
+    ep_uuid : str
+    data : dict
+    owner : str
+    owner_urn : str
 
     Returns
     -------
-
+    dict
+        The entry, with the endpoint uuid as its subject
     """
-    client = get_search_client()
     acl = []
     if data["public"]:
         acl.append("public")
@@ -178,8 +215,30 @@ def endpoint_ingest_or_update(ep_uuid, data, owner="", owner_urn=""):
     content = data.copy()
     content["owner"] = owner_urn
 
-    ingest_data = {"subject": ep_uuid, "visible_to": acl, "content": content}
+    return {"subject": ep_uuid, "visible_to": acl, "content": content}
 
+
+def endpoint_ingest_or_update(ep_uuid, data, owner="", owner_urn=""):
+    """Update or create an endpoint in search index
+
+    If the SearchIngestQueue is enabled, the entry is queued and ingested in the
+    background rather than sent to the search index before returning.
+
+    Parameters
+    ----------
+    ep_uuid : str
+    data : dict
+    owner : str
+    owner_urn : str
+    """
+    ingest_data = endpoint_ingest_entry(ep_uuid, data, owner=owner, owner_urn=owner_urn)
+
+    ingest_queue = app.extensions.get("SearchIngestQueue")
+    if ingest_queue is not None:
+        ingest_queue.enqueue(ENDPOINT_SEARCH_INDEX_ID, ingest_data)
+        return
+
+    client = get_search_client()
     app.logger.debug(
         f"Ingesting endpoint data to {ENDPOINT_SEARCH_INDEX_NAME}: {ingest_data}"
     )
@@ -190,3 +249,21 @@ def endpoint_ingest_or_update(ep_uuid, data, owner="", owner_urn=""):
         res = client.update_entry(ENDPOINT_SEARCH_INDEX_ID, ingest_data)
 
     app.logger.debug(f"received response from Search API: {res.text}")
+
+
+def ingest_entries(index_id, entries):
+    """Create or replace several entries in a search index with one GMetaList ingest
+
+    Parameters
+    ----------
+    index_id : str
+    entries : list
+        The GMetaEntry dicts to ingest
+    """
+    client = get_search_client()
+    app.logger.debug(f"Ingesting {len(entries)} entries to {index_id}")
+    res = client.ingest(
+        index_id,
+        {"ingest_type": "GMetaList", "ingest_data": {"gmeta": entries}},
+    )
+    app.logger.debug(f"received response from Search API: {res.text}")
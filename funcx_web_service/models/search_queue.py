@@ -0,0 +1,253 @@
+"""
+A queue of Globus Search entries which are ingested in the background.
+
+Entries are kept in Redis, so they survive the worker which queued them. Each is
+stored under its index and subject, and queueing an entry for a subject which is
+already waiting replaces it, so repeated updates to one function or endpoint are
+ingested once. A thread in each worker takes batches off the queue and sends one
+GMetaList ingest per index.
+
+Taken entries are held as in flight until their ingest succeeds. If it fails they
+are queued again, unless a newer entry for the same subject has been queued in the
+meantime, and the thread backs off before trying again. Entries left in flight by a
+worker which died are queued again once they are older than `visibility_timeout`.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import typing as t
+
+from redis import Redis
+
+from funcx_web_service.models import search
+
+PENDING_KEY = "search_ingest_entries"
+QUEUE_KEY = "search_ingest_queue"
+IN_FLIGHT_KEY = "search_ingest_in_flight"
+CLAIMS_KEY = "search_ingest_claims"
+
+# KEYS: pending, queue; ARGV: field, item
+# a subject which is already waiting keeps its place in the queue
+_ENQUEUE_SCRIPT = """
+if redis.call("HSET", KEYS[1], ARGV[1], ARGV[2]) == 1 then
+    redis.call("RPUSH", KEYS[2], ARGV[1])
+end
+"""
+
+# KEYS: pending, queue, in flight, claims; ARGV: count, now
+_TAKE_SCRIPT = """
+local items = {}
+for _ = 1, tonumber(ARGV[1]) do
+    local field = redis.call("LPOP", KEYS[2])
+    if not field then
+        break
+    end
+    local item = redis.call("HGET", KEYS[1], field)
+    if item then
+        redis.call("HDEL", KEYS[1], field)
+        redis.call("HSET", KEYS[3], field, item)
+        redis.call("HSET", KEYS[4], field, ARGV[2])
+        table.insert(items, field)
+        table.insert(items, item)
+    end
+end
+return items
+"""
+
+# KEYS: pending, queue, in flight, claims; ARGV: field, item, ...
+# an item is only queued again if no newer one for its subject is waiting
+_REQUEUE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    redis.call("HDEL", KEYS[3], ARGV[i])
+    redis.call("HDEL", KEYS[4], ARGV[i])
+    if redis.call("HSETNX", KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+        redis.call("RPUSH", KEYS[2], ARGV[i])
+    end
+end
+"""
+
+# KEYS: pending, queue, in flight, claims; ARGV: claimed before
+_RECOVER_SCRIPT = """
+local claims = redis.call("HGETALL", KEYS[4])
+local recovered = 0
+for i = 1, #claims, 2 do
+    if tonumber(claims[i + 1]) < tonumber(ARGV[1]) then
+        local item = redis.call("HGET", KEYS[3], claims[i])
+        redis.call("HDEL", KEYS[3], claims[i])
+        redis.call("HDEL", KEYS[4], claims[i])
+        if item and redis.call("HSETNX", KEYS[1], claims[i], item) == 1 then
+            redis.call("RPUSH", KEYS[2], claims[i])
+        end
+        recovered = recovered + 1
+    end
+end
+return recovered
+"""
+
+_KEYS = [PENDING_KEY, QUEUE_KEY, IN_FLIGHT_KEY, CLAIMS_KEY]
+
+
+class SearchIngestQueue:
+    """
+    Queues search entries in Redis and ingests them from a background thread, so
+    that registering a function or endpoint doesn't wait on Globus Search.
+
+    The thread is started on first use in each process, like the TaskLogWriter's.
+    """
+
+    def __init__(
+        self,
+        app,
+        redis_client: Redis,
+        *,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        visibility_timeout: float = 300.0,
+    ):
+        self.app = app
+        self.redis_client = redis_client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.visibility_timeout = visibility_timeout
+
+        self._enqueue = redis_client.register_script(_ENQUEUE_SCRIPT)
+        self._take = redis_client.register_script(_TAKE_SCRIPT)
+        self._requeue = redis_client.register_script(_REQUEUE_SCRIPT)
+        self._recover = redis_client.register_script(_RECOVER_SCRIPT)
+
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+        self._pid: t.Optional[int] = None
+
+        atexit.register(self.shutdown)
+
+    def enqueue(self, index_id: str, entry: t.Dict[str, t.Any]) -> None:
+        """Queue an entry to be ingested, replacing any queued for its subject"""
+        item = json.dumps({"index_id": index_id, "entry": entry, "attempts": 0})
+        self._enqueue(keys=_KEYS, args=[f"{index_id}:{entry['subject']}", item])
+        self._ensure_started()
+
+    def __len__(self) -> int:
+        """The number of entries waiting to be ingested"""
+        return self.redis_client.hlen(PENDING_KEY)
+
+    def drain_once(self) -> int:
+        """
+        Ingest one batch of queued entries, returning the number ingested.
+
+        Raises the first error from Globus Search, after the entries which could not
+        be ingested have been queued again.
+        """
+        taken = self._take(keys=_KEYS, args=[self.batch_size, time.time()])
+        if not taken:
+            return 0
+
+        by_index: t.Dict[str, t.List[t.Tuple[str, t.Dict[str, t.Any]]]] = {}
+        for field, raw in zip(taken[::2], taken[1::2]):
+            item = json.loads(raw)
+            by_index.setdefault(item["index_id"], []).append((field, item))
+
+        ingested = 0
+        error: t.Optional[Exception] = None
+        for index_id, items in by_index.items():
+            try:
+                search.ingest_entries(index_id, [item["entry"] for _, item in items])
+            except Exception as e:
+                self.app.logger.error(
+                    f"Failed to ingest {len(items)} entries to search index "
+                    f"{index_id}: {e}"
+                )
+                self._retry(items)
+                error = error or e
+            else:
+                self._complete(items)
+                ingested += len(items)
+
+        if error is not None:
+            raise error
+        return ingested
+
+    def recover(self) -> int:
+        """Queue again any entries left in flight for longer than visibility_timeout"""
+        cutoff = time.time() - self.visibility_timeout
+        return int(self._recover(keys=_KEYS, args=[cutoff]))
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the thread. Anything still queued is left for other workers."""
+        self._stopping.set()
+        if self._is_running():
+            t.cast(threading.Thread, self._thread).join(timeout)
+
+    def _complete(self, items: t.List[t.Tuple[str, t.Dict[str, t.Any]]]) -> None:
+        fields = [field for field, _ in items]
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hdel(IN_FLIGHT_KEY, *fields)
+        pipe.hdel(CLAIMS_KEY, *fields)
+        pipe.execute()
+
+    def _retry(self, items: t.List[t.Tuple[str, t.Dict[str, t.Any]]]) -> None:
+        args = []
+        for field, item in items:
+            item["attempts"] += 1
+            if item["attempts"] >= self.max_attempts:
+                self.app.logger.error(
+                    f"Giving up on ingesting {field} after {item['attempts']} attempts"
+                )
+                self._complete([(field, item)])
+                continue
+            args += [field, json.dumps(item)]
+        if args:
+            self._requeue(keys=_KEYS, args=args)
+
+    def _backoff(self, failures: int) -> float:
+        return min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+
+    def _is_running(self) -> bool:
+        return (
+            self._thread is not None
+            and self._pid == os.getpid()
+            and self._thread.is_alive()
+        )
+
+    def _ensure_started(self) -> None:
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="funcx-search-ingest", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        failures = 0
+        next_recovery = 0.0
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    if time.monotonic() >= next_recovery:
+                        self.recover()
+                        next_recovery = time.monotonic() + self.visibility_timeout / 2
+                    ingested = self.drain_once()
+            except Exception:
+                failures += 1
+                self.app.logger.exception("Search ingest failed, backing off")
+                self._stopping.wait(self._backoff(failures))
+                continue
+
+            failures = 0
+            if not ingested:
+                self._stopping.wait(self.poll_interval)
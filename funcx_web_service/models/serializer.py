@@ -1,5 +1,148 @@
+import os
+import threading
+import time
+import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
 import requests
 from flask import current_app as app
+from requests.adapters import HTTPAdapter
+
+
+class SerializationClient:
+    """A client for the serialization service, shared by every request in a worker.
+
+    Calls go over one pooled session, so that connections to the service are kept
+    alive between calls, and each call is bounded by `timeout`. Batches of calls are
+    made concurrently by a pool of `max_concurrency` threads, and a whole batch is
+    bounded by `timeout` too.
+
+    Parameters
+    ----------
+    base_url : str
+        The address of the serialization service, e.g. http://<host>:<port>
+    timeout : float
+        The number of seconds to wait for each call, or batch of calls
+    max_concurrency : int
+        The number of calls which may be in progress at once
+    """
+
+    def __init__(self, base_url, *, timeout=10.0, max_concurrency=8):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._session: t.Optional[requests.Session] = None
+        self._executor: t.Optional[ThreadPoolExecutor] = None
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _check_pid(self) -> None:
+        # connections must not be shared with the process this one was forked from,
+        # and its threads do not survive the fork
+        if self._pid != os.getpid():
+            self._session = None
+            self._executor = None
+            self._pid = os.getpid()
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            self._check_pid()
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.max_concurrency
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            self._check_pid()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="funcx-serializer",
+                )
+            return self._executor
+
+    def serialize(self, data):
+        """Encode data, returning None if the service could not"""
+        return self._post("serialize", data)
+
+    def deserialize(self, data):
+        """Decode data, returning None if the service could not"""
+        return self._post("deserialize", data)
+
+    def serialize_many(self, items: t.List[t.Any]) -> t.List[Future]:
+        """Encode each of items, returning a finished future for each, in order"""
+        return self._post_many("serialize", items)
+
+    def deserialize_many(self, items: t.List[t.Any]) -> t.List[Future]:
+        """Decode each of items, returning a finished future for each, in order"""
+        return self._post_many("deserialize", items)
+
+    def _post(self, path, data, timeout=None):
+        res = self.session.post(
+            f"{self.base_url}/{path}",
+            json=data,
+            timeout=self.timeout if timeout is None else timeout,
+        )
+        if res.status_code == 200:
+            return res.json()
+        return None
+
+    def _post_by(self, deadline, path, data):
+        # a call queued behind others only has what is left of the batch's time
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout(
+                f"Serialization batch timed out after {self.timeout}s"
+            )
+        return self._post(path, data, timeout=remaining)
+
+    def _post_many(self, path, items):
+        if not items:
+            return []
+        deadline = time.monotonic() + self.timeout
+        executor = self.executor
+        futures = [
+            executor.submit(self._post_by, deadline, path, item) for item in items
+        ]
+        wait(futures, timeout=max(deadline - time.monotonic(), 0))
+
+        finished = []
+        for future in futures:
+            if not future.done():
+                # a call still in progress is bounded by its own timeout, but the
+                # batch does not wait for it
+                future.cancel()
+                future = Future()
+                future.set_exception(
+                    requests.Timeout(
+                        f"Serialization batch timed out after {self.timeout}s"
+                    )
+                )
+            finished.append(future)
+        return finished
+
+
+def get_serialization_client():
+    """Get the worker's SerializationClient, creating it on first use"""
+    client = app.extensions.get("SerializationClient")
+    if client is None:
+        ser_addr = app.config["SERIALIZATION_ADDR"]
+        ser_port = app.config["SERIALIZATION_PORT"]
+        client = SerializationClient(
+            f"http://{ser_addr}:{ser_port}",
+            timeout=app.config.get("SERIALIZATION_TIMEOUT", 10.0),
+            max_concurrency=app.config.get("SERIALIZATION_MAX_CONCURRENCY", 8),
+        )
+        app.extensions["SerializationClient"] = client
+    return client
 
 
 def serialize_inputs(input_data):
@@ -14,14 +157,7 @@ def serialize_inputs(input_data):
     -------
     str : The encoded data
     """
-    ser_addr = app.config["SERIALIZATION_ADDR"]
-    ser_port = app.config["SERIALIZATION_PORT"]
-
-    res = requests.post(f"http://{ser_addr}:{ser_port}/serialize", json=input_data)
-    if res.status_code == 200:
-        return res.json()
-
-    return None
+    return get_serialization_client().serialize(input_data)
 
 
 def deserialize_result(result):
@@ -36,11 +172,4 @@ def deserialize_result(result):
     -------
     str : The decoded data
     """
-    ser_addr = app.config["SERIALIZATION_ADDR"]
-    ser_port = app.config["SERIALIZATION_PORT"]
-
-    res = requests.post(f"http://{ser_addr}:{ser_port}/deserialize", json=result)
-    if res.status_code == 200:
-        return res.json()
-
-    return None
+    return get_serialization_client().deserialize(result)
@@ -0,0 +1,155 @@
+"""
+Compression of the payloads and results which tasks keep in storage.
+
+Serialized payloads and results are often very compressible, and sit in Redis for as
+long as their task does. A CompressingTaskStorage wraps the task storage, and
+compresses any payload or result longer than its threshold with zlib, or zstd if the
+`zstandard` package is installed, before storing it. The codec is recorded in the
+task's `payload_encoding` or `result_encoding`, and data is decompressed again when
+it is read, so callers get back the strings which were stored.
+
+The web service writes payloads, and the forwarder writes results, so what is
+compressed depends on who reads it:
+
+- payloads are only compressed with `compress_payloads=True`, set by
+  TASK_STORAGE_COMPRESS_PAYLOADS. The forwarder must read payloads through a
+  CompressingTaskStorage, e.g. with `resolve_task_payload`, before that is turned on,
+  as it must for DEDUPLICATE_FUNCTION_BODIES, or it would send endpoints payloads
+  they can't run.
+- results are only compressed once the forwarder stores them through a
+  CompressingTaskStorage. The web service reads them through one, so it already
+  decompresses any which are.
+
+Compressed data is base64-encoded, since task hashes are read and written as text,
+and data is stored as it is if compressing it would not make it any smaller.
+"""
+
+import base64
+import typing as t
+import zlib
+
+try:
+    import zstandard
+
+    has_zstd = True
+except ImportError:
+    has_zstd = False
+
+from funcx_common.task_storage import StorageException, TaskStorage
+from funcx_common.tasks import TaskProtocol
+
+ENCODINGS = ("zlib", "zstd")
+
+_DECODE_ERRORS: t.Tuple[t.Type[Exception], ...] = (ValueError, zlib.error)
+if has_zstd:
+    _DECODE_ERRORS += (zstandard.ZstdError,)
+
+# favour speed, since payloads are compressed while the submit request waits
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compress(data: str, encoding: str) -> str:
+    raw = data.encode("utf-8")
+    if encoding == "zlib":
+        compressed = zlib.compress(raw, ZLIB_LEVEL)
+    elif encoding == "zstd":
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        raise ValueError(f"unknown encoding: {encoding}")
+    return base64.b64encode(compressed).decode("ascii")
+
+
+def decompress(data: str, encoding: str) -> str:
+    try:
+        compressed = base64.b64decode(data)
+        if encoding == "zlib":
+            raw = zlib.decompress(compressed)
+        elif encoding == "zstd" and has_zstd:
+            raw = zstandard.ZstdDecompressor().decompress(compressed)
+        else:
+            raise StorageException(f"unsupported encoding: {encoding}")
+        return raw.decode("utf-8")
+    except _DECODE_ERRORS as err:
+        raise StorageException(f"data could not be decoded as {encoding}") from err
+
+
+class CompressingTaskStorage(TaskStorage):
+    """
+    Stores the payloads and results of tasks in another TaskStorage, compressing
+    results which are longer than threshold characters.
+
+    Payloads are only compressed with compress_payloads=True. Data which was stored
+    compressed is always decompressed when it is read, so with encoding=None nothing
+    new is compressed, but data which was compressed before, or by the forwarder, is
+    still read correctly.
+    """
+
+    def __init__(
+        self,
+        storage: TaskStorage,
+        *,
+        encoding: t.Optional[str] = "zlib",
+        threshold: int = 1024,
+        compress_payloads: bool = False,
+    ):
+        if encoding is not None and encoding not in ENCODINGS:
+            raise ValueError(f"unknown encoding: {encoding}")
+        if encoding == "zstd" and not has_zstd:
+            raise RuntimeError(
+                "Cannot compress with zstd since the zstandard package is not "
+                "available. Either install it or use zlib."
+            )
+        self.storage = storage
+        self.encoding = encoding
+        self.threshold = threshold
+        self.compress_payloads = compress_payloads
+
+    def _compress(self, data: str) -> t.Tuple[str, t.Optional[str]]:
+        if self.encoding is None or len(data) <= self.threshold:
+            return data, None
+        compressed = compress(data, self.encoding)
+        if len(compressed) >= len(data):
+            return data, None
+        return compressed, self.encoding
+
+    def store_result(self, task: TaskProtocol, result: str) -> None:
+        result, encoding = self._compress(result)
+        if encoding is not None:
+            task.result_encoding = encoding  # type: ignore[attr-defined]
+        self.storage.store_result(task, result)
+
+    def get_result(self, task: TaskProtocol) -> t.Optional[str]:
+        result = self.storage.get_result(task)
+        encoding = getattr(task, "result_encoding", None)
+        if result is None or not encoding:
+            return result
+        return decompress(result, encoding)
+
+    def get_stored_result(self, task: TaskProtocol) -> t.Optional[str]:
+        """
+        Get the result of a task as it was stored, i.e. still compressed if it was
+        compressed, with the codec in task.result_encoding
+        """
+        return self.storage.get_result(task)
+
+    def store_payload(self, task: TaskProtocol, payload: str) -> None:
+        if self.compress_payloads:
+            payload, encoding = self._compress(payload)
+            if encoding is not None:
+                task.payload_encoding = encoding  # type: ignore[attr-defined]
+        self.storage.store_payload(task, payload)
+
+    def get_payload(self, task: TaskProtocol) -> t.Optional[str]:
+        payload = self.storage.get_payload(task)
+        encoding = getattr(task, "payload_encoding", None)
+        if payload is None or not encoding:
+            return payload
+        return decompress(payload, encoding)
+
+
+def base_storage(storage: TaskStorage) -> TaskStorage:
+    """Get the storage which a CompressingTaskStorage keeps data in"""
+    while isinstance(storage, CompressingTaskStorage):
+        storage = storage.storage
+    return storage
@@ -0,0 +1,91 @@
+"""
+Presigned S3 URLs for task results and payloads, so that large objects go straight
+between clients and S3 rather than through the web service.
+
+Results which were too large for Redis are stored in S3 by the forwarder, and
+clients which ask for it are given a short-lived URL to download them from instead
+of the result itself. In the other direction, clients can ask for URLs to upload
+large inputs to, and then submit tasks which refer to the uploads. Both only apply
+when task storage is S3-backed.
+"""
+
+import typing as t
+import uuid
+
+import botocore.exceptions
+from funcx_common.response_errors import RequestMalformed
+from funcx_common.task_storage import RedisS3Storage, TaskStorage
+from funcx_common.tasks import TaskProtocol
+
+from funcx_web_service.models.storage_codec import base_storage
+
+UPLOAD_PREFIX = "payload_uploads"
+
+
+def supports_urls(storage: TaskStorage) -> bool:
+    return isinstance(base_storage(storage), RedisS3Storage)
+
+
+def result_url(
+    storage: TaskStorage, task: TaskProtocol, expires_in: int
+) -> t.Optional[str]:
+    """
+    Get a URL to download the result of task from, if it is stored in S3, valid for
+    expires_in seconds
+    """
+    reference = task.result_reference
+    if not supports_urls(storage) or not reference or reference["storage_id"] != "s3":
+        return None
+    # compressed results are only given out decompressed
+    if getattr(task, "result_encoding", None):
+        return None
+    return t.cast(RedisS3Storage, base_storage(storage)).client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": reference["s3bucket"], "Key": reference["key"]},
+        ExpiresIn=expires_in,
+    )
+
+
+def _upload_key(user_id: int, upload_id: str) -> str:
+    return f"{UPLOAD_PREFIX}/{user_id}/{upload_id}"
+
+
+def create_payload_upload(
+    storage: TaskStorage, user_id: int, expires_in: int, max_size: int
+) -> t.Dict[str, t.Any]:
+    """
+    Create a presigned POST for a user to upload a payload of at most max_size bytes
+    to, valid for expires_in seconds. Tasks refer to the upload by its upload_id.
+    """
+    s3_storage = t.cast(RedisS3Storage, base_storage(storage))
+    upload_id = str(uuid.uuid4())
+    post = s3_storage.client.generate_presigned_post(
+        s3_storage.bucket_name,
+        _upload_key(user_id, upload_id),
+        Conditions=[["content-length-range", 1, max_size]],
+        ExpiresIn=expires_in,
+    )
+    return {"upload_id": upload_id, "url": post["url"], "fields": post["fields"]}
+
+
+def uploaded_payload_reference(
+    storage: TaskStorage, user_id: int, upload_id: t.Any
+) -> t.Dict[str, str]:
+    """
+    Get the payload reference of an upload of a user's, as RedisS3Storage would
+    store for it. Raises RequestMalformed if the upload doesn't exist.
+    """
+    if not supports_urls(storage):
+        raise RequestMalformed("payload uploads are not supported")
+    try:
+        uuid.UUID(str(upload_id))
+    except ValueError:
+        raise RequestMalformed(f"invalid upload id: {upload_id}")
+
+    s3_storage = t.cast(RedisS3Storage, base_storage(storage))
+    key = _upload_key(user_id, upload_id)
+    try:
+        s3_storage.client.head_object(Bucket=s3_storage.bucket_name, Key=key)
+    except botocore.exceptions.ClientError as err:
+        raise RequestMalformed(f"upload {upload_id} was not found") from err
+    return {"storage_id": "s3", "s3bucket": s3_storage.bucket_name, "key": key}
@@ -0,0 +1,339 @@
+"""
+A change feed of the state transitions of each task group's tasks.
+
+Each task group has a Redis Stream, task_group_changes_<id>, with an entry for each
+state one of its tasks is seen in, so clients can poll for the tasks which changed
+after a cursor rather than for every task they are waiting on. Entry ids are the
+cursors.
+
+Tasks are recorded as waiting for their endpoint when they are created. Every later
+transition is written to the task hash by the forwarder, so it is picked up from the
+Redis keyspace notification for the hash by a TaskChangeRecorder. One recorder runs
+across the whole deployment, in whichever worker holds its lease.
+
+Notifications are fire-and-forget, so those sent while no worker is subscribed, e.g.
+while the lease changes hands or the recorder reconnects, are lost, and none are sent
+at all unless the server's `notify-keyspace-events` includes `Kh`. The recorder
+makes up for them by reconciling: it compares the last recorded state of each task
+group, task_group_change_state_<id>, with the task hashes, and records any task
+whose status has moved on. It does so whenever it takes the lease or reconnects, and
+every `reconcile_interval` seconds while it holds the lease, unless that is 0.
+
+Only the groups in GROUPS_KEY are reconciled, a sorted set of the groups which had
+tasks created within CHANGES_TTL, so reconciling never scans the keyspace.
+"""
+
+import atexit
+import os
+import threading
+import time
+import typing as t
+import uuid
+from datetime import timedelta
+
+from redis import Redis
+
+# the approximate number of entries kept in each task group's stream
+CHANGES_MAXLEN = 100000
+# matches TaskGroup.TASK_GROUP_TTL
+CHANGES_TTL = timedelta(weeks=1)
+
+LEASE_KEY = "task_change_recorder_lease"
+# the ids of the task groups with changes to reconcile, scored by when their last
+# tasks were created
+GROUPS_KEY = "task_change_groups"
+
+# KEYS: the changes stream and the last recorded state of a task group
+# ARGV: the stream's max length, the TTL of both in seconds, then task id and status
+#       pairs
+_RECORD_SCRIPT = """
+local recorded = 0
+for i = 3, #ARGV, 2 do
+    if redis.call("HGET", KEYS[2], ARGV[i]) ~= ARGV[i + 1] then
+        redis.call("HSET", KEYS[2], ARGV[i], ARGV[i + 1])
+        redis.call(
+            "XADD", KEYS[1], "MAXLEN", "~", ARGV[1], "*",
+            "task_id", ARGV[i], "status", ARGV[i + 1]
+        )
+        recorded = recorded + 1
+    end
+end
+if recorded > 0 then
+    redis.call("EXPIRE", KEYS[1], ARGV[2])
+    redis.call("EXPIRE", KEYS[2], ARGV[2])
+end
+return recorded
+"""
+
+# KEYS: the lease; ARGV: the holder's token, the lease TTL in milliseconds
+_RENEW_LEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def changes_key(task_group_id: str) -> str:
+    return f"task_group_changes_{task_group_id}"
+
+
+def state_key(task_group_id: str) -> str:
+    return f"task_group_change_state_{task_group_id}"
+
+
+def record_created(
+    pipe: t.Any, task_group_id: str, task_ids: t.List[str], status: str
+) -> None:
+    """Queue entries for newly created tasks on a pipeline"""
+    key = changes_key(task_group_id)
+    for task_id in task_ids:
+        pipe.xadd(
+            key,
+            {"task_id": task_id, "status": status},
+            maxlen=CHANGES_MAXLEN,
+            approximate=True,
+        )
+    pipe.hset(state_key(task_group_id), mapping=dict.fromkeys(task_ids, status))
+    pipe.expire(key, CHANGES_TTL)
+    pipe.expire(state_key(task_group_id), CHANGES_TTL)
+    pipe.zadd(GROUPS_KEY, {task_group_id: time.time()})
+
+
+def record_changes(
+    redis_client: Redis, task_group_id: str, changes: t.List[t.Tuple[str, str]]
+) -> int:
+    """
+    Add entries for tasks (id, status) whose status is not the one last recorded,
+    returning the number added
+    """
+    record = redis_client.register_script(_RECORD_SCRIPT)
+    args: t.List[t.Any] = [
+        CHANGES_MAXLEN,
+        int(CHANGES_TTL.total_seconds()),
+    ]
+    for change in changes:
+        args.extend(change)
+    return int(
+        record(keys=[changes_key(task_group_id), state_key(task_group_id)], args=args)
+    )
+
+
+def read_changes(
+    redis_client: Redis,
+    task_group_id: str,
+    since: t.Optional[str] = None,
+    count: int = 1000,
+) -> t.Tuple[t.List[t.Dict[str, str]], t.Optional[str]]:
+    """
+    Read up to count entries after the cursor since, returning the latest change of
+    each task among them, oldest first, and the cursor to read from next
+    """
+    start = "-"
+    if since is not None:
+        # stream ids are <ms>-<seq>, and XRANGE includes its start
+        ms, seq = since.split("-")
+        start = f"{ms}-{int(seq) + 1}"
+    entries = redis_client.xrange(changes_key(task_group_id), start, "+", count=count)
+
+    latest: t.Dict[str, t.Dict[str, str]] = {}
+    for entry_id, fields in entries:
+        latest.pop(fields["task_id"], None)
+        latest[fields["task_id"]] = {**fields, "cursor": entry_id}
+    cursor = entries[-1][0] if entries else since
+    return list(latest.values()), cursor
+
+
+class TaskChangeRecorder:
+    """
+    Records the transitions of tasks in task groups from Redis keyspace
+    notifications, which need `notify-keyspace-events` to include `Kh`.
+
+    Every worker runs a thread, but only the one holding the lease subscribes, so each
+    transition is looked up once. The others check every `lease_ttl / 3` seconds
+    whether the lease has lapsed, and take over if it has.
+
+    With `configure_notifications=True`, the recorder turns the notifications on
+    itself, like the TaskWaiter. Otherwise it warns if they are off, and transitions
+    are only picked up when it reconciles.
+    """
+
+    def __init__(
+        self,
+        app,
+        redis_client: Redis,
+        *,
+        lease_ttl: float = 30.0,
+        batch_size: int = 500,
+        poll_interval: float = 0.1,
+        reconcile_interval: float = 60.0,
+        configure_notifications: bool = False,
+    ):
+        self.app = app
+        self.redis_client = redis_client
+        self.lease_ttl = lease_ttl
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self.configure_notifications = configure_notifications
+        db = redis_client.connection_pool.connection_kwargs.get("db", 0)
+        self._prefix = f"__keyspace@{db}__:task_"
+
+        self._renew_lease = redis_client.register_script(_RENEW_LEASE_SCRIPT)
+        self._token = ""
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+        self._pid: t.Optional[int] = None
+
+        atexit.register(self.shutdown)
+
+    def start(self) -> None:
+        """Start the recorder's thread in this process, if it isn't running"""
+        with self._lock:
+            if (
+                self._thread is not None
+                and self._pid == os.getpid()
+                and self._thread.is_alive()
+            ):
+                return
+            self._pid = os.getpid()
+            self._token = str(uuid.uuid4())
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="funcx-task-changes", daemon=True
+            )
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the thread, giving up the lease if it is held"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            thread.join(timeout)
+
+    def record_tasks(self, task_ids: t.Iterable[str]) -> int:
+        """
+        Look up the status of tasks which changed, recording each which belongs to a
+        task group. Returns the number of entries added.
+        """
+        task_ids = list(task_ids)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hmget(f"task_{task_id}", "task_group_id", "status")
+
+        by_group: t.Dict[str, t.List[t.Tuple[str, str]]] = {}
+        for task_id, (task_group_id, status) in zip(task_ids, pipe.execute()):
+            if task_group_id and status:
+                by_group.setdefault(task_group_id, []).append((task_id, status))
+
+        return sum(
+            record_changes(self.redis_client, task_group_id, changes)
+            for task_group_id, changes in by_group.items()
+        )
+
+    def reconcile(self) -> int:
+        """
+        Record the tasks of every task group whose status has changed since it was
+        last recorded, returning the number of entries added
+        """
+        # the state of older groups has expired
+        expired_before = time.time() - CHANGES_TTL.total_seconds()
+        self.redis_client.zremrangebyscore(GROUPS_KEY, "-inf", expired_before)
+
+        recorded = 0
+        task_ids: t.List[str] = []
+        for task_group_id, _ in self.redis_client.zscan_iter(
+            GROUPS_KEY, count=self.batch_size
+        ):
+            task_ids.extend(self.redis_client.hkeys(state_key(task_group_id)))
+            if len(task_ids) >= self.batch_size:
+                recorded += self.record_tasks(task_ids)
+                task_ids = []
+        if task_ids:
+            recorded += self.record_tasks(task_ids)
+        return recorded
+
+    def _check_notifications(self) -> None:
+        try:
+            flags = self.redis_client.config_get("notify-keyspace-events")
+            current = flags.get("notify-keyspace-events", "")
+            missing = "" if "K" in current else "K"
+            # "A" is an alias for every class of event, including hash commands
+            if "h" not in current and "A" not in current:
+                missing += "h"
+            if not missing:
+                return
+            if self.configure_notifications:
+                self.redis_client.config_set(
+                    "notify-keyspace-events", current + missing
+                )
+                return
+        except Exception:
+            self.app.logger.exception("Could not check keyspace notifications")
+        self.app.logger.warning(
+            "Keyspace notifications for task hashes are off, task changes will only "
+            "be recorded every reconcile_interval"
+        )
+
+    def _acquire_lease(self) -> bool:
+        lease_ms = int(self.lease_ttl * 1000)
+        if self.redis_client.set(LEASE_KEY, self._token, nx=True, px=lease_ms):
+            return True
+        return bool(self._renew_lease(keys=[LEASE_KEY], args=[self._token, lease_ms]))
+
+    def _release_lease(self) -> None:
+        # lets the lease lapse at once, if this worker still holds it
+        self._renew_lease(keys=[LEASE_KEY], args=[self._token, 1])
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                if self._acquire_lease():
+                    self._record_while_leased()
+                else:
+                    self._stopping.wait(self.lease_ttl / 3)
+            except Exception:
+                self.app.logger.exception("Task change recorder failed, backing off")
+                self._stopping.wait(self.lease_ttl / 3)
+
+    def _record_while_leased(self) -> None:
+        self._check_notifications()
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f"{self._prefix}*")
+        try:
+            # once subscribed, so that nothing is missed between the two
+            reconcile_at: t.Optional[float] = time.monotonic()
+            renew_at = time.monotonic() + self.lease_ttl / 3
+            while not self._stopping.is_set():
+                if time.monotonic() >= renew_at:
+                    if not self._acquire_lease():
+                        # another worker holds the lease now
+                        return
+                    renew_at = time.monotonic() + self.lease_ttl / 3
+                if reconcile_at is not None and time.monotonic() >= reconcile_at:
+                    self.reconcile()
+                    reconcile_at = None
+                    if self.reconcile_interval > 0:
+                        reconcile_at = time.monotonic() + self.reconcile_interval
+
+                changed = self._collect(pubsub)
+                if changed:
+                    self.record_tasks(changed)
+        finally:
+            pubsub.close()
+            if self._stopping.is_set():
+                self._release_lease()
+
+    def _collect(self, pubsub: t.Any) -> t.List[str]:
+        changed: t.Dict[str, None] = {}
+        prefix_length = len(self._prefix)
+        message = pubsub.get_message(timeout=self.poll_interval)
+        while message is not None and len(changed) < self.batch_size:
+            if message["type"] == "pmessage" and message["data"] == "hset":
+                key = message["channel"][prefix_length:]
+                # the other keys named task_*, which aren't task hashes
+                if not key.startswith(("group_", "queue_", "channel_")):
+                    changed[key] = None
+            message = pubsub.get_message()
+        return list(changed)
@@ -0,0 +1,197 @@
+import atexit
+import os
+import queue
+import threading
+import typing as t
+
+from funcx_web_service.models import db
+from funcx_web_service.models.tasks import DBTask
+
+
+def write_task_log_rows(rows: t.List[t.Dict[str, t.Any]]) -> None:
+    """Insert rows into the tasks table with a single multi-row INSERT and commit"""
+    try:
+        db.session.bulk_insert_mappings(DBTask, rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class TaskLogWriter:
+    """
+    Writes task log rows to the database from a background thread, so that requests
+    only have to put rows onto a queue rather than wait on the database.
+
+    The queue is bounded. If the database falls so far behind that the queue fills,
+    new rows are dropped and counted rather than blocking the request which logged
+    them.
+
+    The thread is started on first use in each process, so that a writer created
+    before uwsgi forks its workers still gets a thread in every worker. Anything left
+    on the queue is written when the process exits.
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        max_queue_size: int = 10000,
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        shutdown_timeout: float = 10.0,
+    ):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.shutdown_timeout = shutdown_timeout
+        # the number of rows dropped because the queue was full
+        self.dropped = 0
+
+        self._queue: "queue.Queue[t.Any]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread: t.Optional[threading.Thread] = None
+        self._pid: t.Optional[int] = None
+
+        atexit.register(self.shutdown)
+
+    def submit(self, rows: t.List[t.Dict[str, t.Any]]) -> int:
+        """Queue rows to be written, returning the number which were accepted"""
+        self._ensure_started()
+
+        accepted = 0
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                break
+            accepted += 1
+
+        dropped = len(rows) - accepted
+        if dropped:
+            with self._lock:
+                self.dropped += dropped
+            self.app.logger.error(
+                f"Task log queue is full, dropped {dropped} rows "
+                f"({self.dropped} in total)"
+            )
+        return accepted
+
+    def flush(self, timeout: t.Optional[float] = None) -> bool:
+        """
+        Wait until every row queued so far has been written, returning False if that
+        did not happen within the timeout.
+        """
+        if not self._is_running():
+            return self._queue.empty()
+        done = threading.Event()
+        # markers are allowed to block briefly, unlike rows, so that a full queue
+        # can still be flushed
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: t.Optional[float] = None) -> None:
+        """Write out anything still queued and stop the thread"""
+        if timeout is None:
+            timeout = self.shutdown_timeout
+        if not self._is_running():
+            # e.g. a process which never logged anything, or rows were queued before
+            # a fork; write them from this thread instead
+            self._drain_inline()
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.app.logger.error(
+                "Task log queue did not drain before shutdown, rows were lost"
+            )
+            return
+        t.cast(threading.Thread, self._thread).join(timeout)
+
+    def _is_running(self) -> bool:
+        return (
+            self._thread is not None
+            and self._pid == os.getpid()
+            and self._thread.is_alive()
+        )
+
+    def _ensure_started(self) -> None:
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="funcx-task-log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            rows = []
+            markers = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # gather whatever else is already waiting, up to a batch
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    rows.append(item)
+                if stopping or len(rows) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if stopping:
+                remaining_rows, remaining_markers = self._take_remaining()
+                rows += remaining_rows
+                markers += remaining_markers
+            if rows:
+                self._write(rows)
+            for marker in markers:
+                marker.set()
+
+    def _take_remaining(
+        self,
+    ) -> t.Tuple[t.List[t.Dict[str, t.Any]], t.List[threading.Event]]:
+        rows: t.List[t.Dict[str, t.Any]] = []
+        markers: t.List[threading.Event] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows, markers
+            if isinstance(item, threading.Event):
+                markers.append(item)
+            elif item is not None:
+                rows.append(item)
+
+    def _drain_inline(self) -> None:
+        rows, markers = self._take_remaining()
+        if rows:
+            self._write(rows)
+        for marker in markers:
+            marker.set()
+
+    def _write(self, rows: t.List[t.Dict[str, t.Any]]) -> None:
+        for start in range(0, len(rows), self.batch_size):
+            end = start + self.batch_size
+            chunk = rows[start:end]
+            try:
+                with self.app.app_context():
+                    write_task_log_rows(chunk)
+            except Exception:
+                self.app.logger.exception(f"Failed to write {len(chunk)} task log rows")
@@ -0,0 +1,233 @@
+"""
+Waiting on tasks to complete, for long-polling status requests.
+
+Task hashes are written by the forwarder, so the web service only learns that a task
+has changed from the Redis keyspace notification on its hash. That needs the server's
+`notify-keyspace-events` to include `Kh`, which the waiter turns on itself when
+TASK_WAIT_CONFIGURE_NOTIFICATIONS is set. Waiters also check their tasks again every
+`recheck_interval` seconds, so a missed notification, or a server which sends none,
+only delays a response rather than losing it.
+
+All of the waiting requests in a worker share one pub/sub connection, read by one
+thread, which subscribes to the hashes of the tasks being waited on and wakes their
+waiters. A waiting request only holds an Event, and makes no Redis calls until one
+of its tasks changes. Under uwsgi's gevent loop, the thread is a greenlet and the
+Events are gevent's, so a waiting request yields its worker to other requests.
+"""
+
+import atexit
+import os
+import threading
+import time
+import typing as t
+
+from redis import Redis
+
+
+class TaskWaiter:
+    """
+    Wakes requests which are waiting on tasks whenever one of those tasks changes.
+
+    The thread is started on first use in each process, like the TaskLogWriter's.
+    """
+
+    def __init__(
+        self,
+        app,
+        redis_client: Redis,
+        *,
+        recheck_interval: float = 5.0,
+        poll_interval: float = 0.1,
+        configure_notifications: bool = False,
+    ):
+        self.app = app
+        self.redis_client = redis_client
+        self.recheck_interval = recheck_interval
+        self.poll_interval = poll_interval
+        self.configure_notifications = configure_notifications
+        self._db = redis_client.connection_pool.connection_kwargs.get("db", 0)
+
+        self._lock = threading.Lock()
+        # waiting requests and whether the thread is subscribed, by channel
+        self._waiters: t.Dict[str, t.Set[threading.Event]] = {}
+        self._ready: t.Dict[str, threading.Event] = {}
+        self._changed = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+        self._pid: t.Optional[int] = None
+
+        atexit.register(self.shutdown)
+
+    def channel(self, task_id: str) -> str:
+        return f"__keyspace@{self._db}__:task_{task_id}"
+
+    def wait(
+        self, task_ids: t.Iterable[str], is_done: t.Callable[[], bool], timeout: float
+    ) -> bool:
+        """
+        Block until is_done() is true or timeout seconds pass, returning the last
+        result of is_done(). It is called again whenever one of task_ids changes.
+        """
+        if timeout <= 0:
+            return is_done()
+        self._ensure_started()
+
+        deadline = time.monotonic() + timeout
+        event = threading.Event()
+        channels = [self.channel(task_id) for task_id in task_ids]
+        ready = self._register(channels, event)
+        try:
+            # the tasks are only checked once the subscriptions are in place, so that
+            # a change in between is not missed
+            for subscribed in ready:
+                subscribed.wait(max(0.0, deadline - time.monotonic()))
+            while True:
+                if is_done():
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                event.wait(min(remaining, self.recheck_interval))
+                event.clear()
+        finally:
+            self._unregister(channels, event)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the thread, waking any requests still waiting"""
+        self._stopping.set()
+        self._changed.set()
+        self._wake_all()
+        if self._is_running():
+            t.cast(threading.Thread, self._thread).join(timeout)
+
+    def _register(
+        self, channels: t.List[str], event: threading.Event
+    ) -> t.List[threading.Event]:
+        with self._lock:
+            for channel in channels:
+                self._waiters.setdefault(channel, set()).add(event)
+                self._ready.setdefault(channel, threading.Event())
+            ready = [self._ready[channel] for channel in channels]
+        self._changed.set()
+        return ready
+
+    def _unregister(self, channels: t.List[str], event: threading.Event) -> None:
+        with self._lock:
+            for channel in channels:
+                waiters = self._waiters.get(channel)
+                if waiters is None:
+                    continue
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[channel]
+                    del self._ready[channel]
+        self._changed.set()
+
+    def _wake(self, channel: str) -> None:
+        with self._lock:
+            waiters = list(self._waiters.get(channel, ()))
+        for event in waiters:
+            event.set()
+
+    def _wake_all(self) -> None:
+        with self._lock:
+            waiters = [event for events in self._waiters.values() for event in events]
+        for event in waiters:
+            event.set()
+
+    def _enable_notifications(self) -> None:
+        try:
+            flags = self.redis_client.config_get("notify-keyspace-events")
+            current = flags.get("notify-keyspace-events", "")
+            missing = "" if "K" in current else "K"
+            # "A" is an alias for every class of event, including hash commands
+            if "h" not in current and "A" not in current:
+                missing += "h"
+            if missing:
+                self.redis_client.config_set(
+                    "notify-keyspace-events", current + missing
+                )
+        except Exception:
+            self.app.logger.exception(
+                "Could not enable keyspace notifications, task waits will fall back "
+                "to checking every recheck_interval"
+            )
+
+    def _is_running(self) -> bool:
+        return (
+            self._thread is not None
+            and self._pid == os.getpid()
+            and self._thread.is_alive()
+        )
+
+    def _ensure_started(self) -> None:
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            # subscriptions made by the process this one was forked from are gone
+            for ready in self._ready.values():
+                ready.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="funcx-task-waiter", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        if self.configure_notifications:
+            self._enable_notifications()
+
+        while not self._stopping.is_set():
+            pubsub = self.redis_client.pubsub()
+            try:
+                self._listen(pubsub)
+            except Exception:
+                self.app.logger.exception("Task waiter lost its subscriptions")
+                # waiters check their tasks every recheck_interval until the thread
+                # is back
+                with self._lock:
+                    for ready in self._ready.values():
+                        ready.set()
+                self._wake_all()
+                self._stopping.wait(self.recheck_interval)
+            finally:
+                pubsub.close()
+
+    def _listen(self, pubsub: t.Any) -> None:
+        subscribed: t.Set[str] = set()
+        while not self._stopping.is_set():
+            self._changed.clear()
+            with self._lock:
+                wanted = set(self._waiters)
+                # channels waited on again before they were unsubscribed from
+                for channel in wanted & subscribed:
+                    self._ready[channel].set()
+            if wanted - subscribed:
+                pubsub.subscribe(*(wanted - subscribed))
+            if subscribed - wanted:
+                pubsub.unsubscribe(*(subscribed - wanted))
+            subscribed = wanted
+
+            if not subscribed:
+                self._changed.wait(self.recheck_interval)
+                continue
+
+            message = pubsub.get_message(timeout=self.poll_interval)
+            while message is not None:
+                self._handle(message)
+                message = pubsub.get_message()
+
+    def _handle(self, message: t.Dict[str, t.Any]) -> None:
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode("utf-8")
+        if message["type"] == "subscribe":
+            with self._lock:
+                ready = self._ready.get(channel)
+            if ready is not None:
+                ready.set()
+        elif message["type"] == "message":
+            self._wake(channel)
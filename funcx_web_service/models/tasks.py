@@ -1,4 +1,5 @@
 import typing as t
+import uuid
 from datetime import datetime, timedelta
 from enum import Enum
 
@@ -9,12 +10,39 @@ from funcx_common.redis import (
     HasRedisFieldsMeta,
     RedisField,
 )
+
+# the channel and queue naming of FuncxRedisPubSub, which batched task creation must
+# match exactly
+from funcx_common.redis.pubsub import _channel_name, _queue_name
 from funcx_common.tasks import TaskProtocol, TaskState
 from redis import Redis
 from sqlalchemy import DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
 from funcx_web_service.models import db
+from funcx_web_service.models.function_bodies import (
+    function_body_id,
+    release_function_bodies,
+    release_function_body,
+    store_function_bodies,
+)
+from funcx_web_service.models.invocation_counter import (
+    count_invocations,
+    invocation_counter_key,
+)
+from funcx_web_service.models.redis_shards import (
+    ShardedRedis,
+    colocated_uuid,
+    uuid_node,
+)
+from funcx_web_service.models.task_changes import record_created
+
+# the type of mapping redis-py takes for the fields of a hash
+_HashFields = t.Mapping[t.Union[str, bytes], t.Union[bytes, float, int, str]]
+
+
+# the fields which are set once a task is complete
+_COMPLETION_FIELDS = ("result", "result_reference", "exception")
 
 
 # This internal state is never shown to the user and is meant to track whether
@@ -70,6 +98,11 @@ class RedisTask(TaskProtocol, metaclass=HasRedisFieldsMeta):
     exception = RedisField()
     completion_time = RedisField()
     task_group_id = RedisField()
+    # set when the function body is stored separately from the payload
+    function_body_id = RedisField()
+    # set when the payload or result is stored compressed, see storage_codec
+    payload_encoding = RedisField()
+    result_encoding = RedisField()
 
     # must keep ttl and _set_expire in merge
     # tasks expire in 1 week, we are giving some grace period for
@@ -133,18 +166,619 @@ class RedisTask(TaskProtocol, metaclass=HasRedisFieldsMeta):
 
     def delete(self):
         """Removes this task from Redis, to be used after the result is gotten"""
+        body_id = self.function_body_id
         self.redis_client.delete(self.hname)
+        if body_id:
+            release_function_body(self.redis_client, body_id)
 
     @classmethod
     def exists(cls, redis_client: Redis, task_id: str) -> bool:
         """Check if a given task_id exists in Redis"""
         return bool(redis_client.exists(f"task_{task_id}"))
 
+    @classmethod
+    def delete_many(
+        cls,
+        redis_client: Redis,
+        tasks: t.Iterable[t.Union["RedisTask", "TaskSnapshot"]],
+    ) -> None:
+        """
+        Remove many tasks from Redis in one round trip, along with their references to
+        function bodies
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.unlink(*[task.hname for task in tasks])
+        release_function_bodies(
+            pipe, [task.function_body_id for task in tasks if task.function_body_id]
+        )
+        pipe.execute()
+
+    @classmethod
+    def restore_many(cls, redis_client: Redis, tasks: t.Iterable["TaskSnapshot"]):
+        """
+        Put back tasks which were fetched and deleted but whose results could not be
+        returned. Their function bodies were already released, so the restored tasks
+        no longer refer to them.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        for task in tasks:
+            fields: _HashFields = {
+                k: v for k, v in task._fields.items() if k != "function_body_id"
+            }
+            pipe.hset(task.hname, mapping=fields)
+            pipe.expire(task.hname, RedisTask.TASK_TTL)
+        pipe.execute()
+
+
+# KEYS: the hash name of each task; ARGV: the id of the user fetching them
+# Returns the fields of each task, or none for a task which doesn't exist or belongs
+# to someone else. Tasks with a result or an exception are deleted as they are read,
+# so only one fetch of a task ever gets its result.
+_FETCH_TASKS_SCRIPT = """
+local tasks = {}
+for i = 1, #KEYS do
+    local fields = redis.call("HGETALL", KEYS[i])
+    local owned, complete = false, false
+    for j = 1, #fields, 2 do
+        local name, value = fields[j], fields[j + 1]
+        if name == "user_id" then
+            owned = value == ARGV[1]
+        elseif value ~= "" and (
+            name == "result" or name == "result_reference" or name == "exception"
+        ) then
+            complete = true
+        end
+    end
+    if not owned then
+        fields = {}
+    elseif complete then
+        redis.call("UNLINK", KEYS[i])
+    end
+    tasks[i] = fields
+end
+return tasks
+"""
+
+
+# the fields of a task, by name, and the values RedisTask gives them when they are
+# missing
+_TASK_FIELDS: t.Dict[str, RedisField] = {
+    name: field
+    for name, field in vars(RedisTask).items()
+    if isinstance(field, RedisField)
+}
+_TASK_FIELD_DEFAULTS = {
+    "status": TaskState.WAITING_FOR_EP,
+    "internal_status": InternalTaskState.INCOMPLETE,
+}
+
+
+def _snapshot_field(name: str, field: RedisField) -> property:
+    def get(self: "TaskSnapshot") -> t.Any:
+        value = self._fields.get(name)
+        if value is None:
+            return _TASK_FIELD_DEFAULTS.get(name)
+        return field.serde.deserialize(value)
+
+    return property(get)
+
+
+# TaskProtocol is a plain class rather than a typing.Protocol, so a snapshot only
+# passes for one where task storage expects it by subclassing it, and it can't at
+# runtime without losing its __slots__
+if t.TYPE_CHECKING:
+    _TaskSnapshotBase = TaskProtocol
+else:
+    _TaskSnapshotBase = object
+
+
+class TaskSnapshot(_TaskSnapshotBase):
+    """
+    A read-only view of a task, as it was when it was read.
+
+    The whole task hash is read with one HGETALL, and the task's expiry is left
+    alone, so looking up a task costs one round trip however many of its fields are
+    used. Fields are deserialized when they are accessed, and have the same names
+    and types as on RedisTask, which is still what tasks are created and updated
+    with.
+    """
+
+    __slots__ = ("task_id", "hname", "_fields")
+
+    # set up as read-only properties below
+    status: TaskState
+    internal_status: InternalTaskState
+    user_id: t.Optional[int]
+    function_id: t.Optional[str]
+    endpoint: t.Optional[str]
+    container: t.Optional[str]
+    payload: t.Any
+    payload_reference: t.Optional[t.Dict[str, t.Any]]
+    result: t.Optional[str]
+    result_reference: t.Optional[t.Dict[str, t.Any]]
+    exception: t.Optional[str]
+    completion_time: t.Optional[str]
+    task_group_id: t.Optional[str]
+    function_body_id: t.Optional[str]
+    payload_encoding: t.Optional[str]
+    result_encoding: t.Optional[str]
+
+    def __init__(self, task_id: str, fields: t.Dict[str, str]):
+        self.task_id = task_id
+        self.hname = f"task_{task_id}"
+        self._fields = fields
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the task has a result or an exception"""
+        return any(self._fields.get(name) for name in _COMPLETION_FIELDS)
+
+    @classmethod
+    def read(cls, redis_client: Redis, task_id: str) -> t.Optional["TaskSnapshot"]:
+        """Read a task, returning None if it doesn't exist"""
+        fields = redis_client.hgetall(f"task_{task_id}")
+        return cls(task_id, fields) if fields else None
+
+    @classmethod
+    def read_many(
+        cls, redis_client: Redis, task_ids: t.Iterable[str]
+    ) -> t.Dict[str, t.Optional["TaskSnapshot"]]:
+        """
+        Read many tasks in one round trip, returning them by id, with None for the
+        ids of tasks which don't exist
+        """
+        task_ids = list(task_ids)
+        pipe = redis_client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(f"task_{task_id}")
+        return {
+            task_id: cls(task_id, fields) if fields else None
+            for task_id, fields in zip(task_ids, pipe.execute())
+        }
+
+    @staticmethod
+    def done_ids(redis_client: Redis, task_ids: t.Iterable[str]) -> t.List[str]:
+        """
+        Find the tasks among task_ids which are complete or no longer exist, in one
+        round trip. Only the lengths of the completion fields are read, not the
+        tasks' payloads and results.
+        """
+        task_ids = list(task_ids)
+        pipe = redis_client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.exists(f"task_{task_id}")
+            for name in _COMPLETION_FIELDS:
+                pipe.hstrlen(f"task_{task_id}", name)
+        results = iter(pipe.execute())
+        done = []
+        for task_id in task_ids:
+            exists = next(results)
+            lengths = [next(results) for _ in _COMPLETION_FIELDS]
+            if not exists or any(lengths):
+                done.append(task_id)
+        return done
+
+    @classmethod
+    def fetch_many(
+        cls, redis_client: Redis, task_ids: t.Iterable[str], user_id: int
+    ) -> t.Dict[str, t.Optional["TaskSnapshot"]]:
+        """
+        Read the user's tasks among task_ids, returning them by id, with None for the
+        ids of tasks which don't exist or belong to another user. Completed tasks are
+        deleted as they are read, by a script which runs atomically, so two requests
+        for the same task can't both fetch its result.
+
+        The script runs in one round trip, or one per node of a ShardedRedis, plus
+        one more to release the function bodies of the deleted tasks, if any.
+        """
+        task_ids = list(dict.fromkeys(task_ids))
+        hnames = [f"task_{task_id}" for task_id in task_ids]
+        if isinstance(redis_client, ShardedRedis):
+            by_node = redis_client.keys_by_node(hnames)
+        else:
+            by_node = [(redis_client, hnames)]
+
+        fields_by_hname = {}
+        for node, node_hnames in by_node:
+            fetch = node.register_script(_FETCH_TASKS_SCRIPT)
+            for hname, flat in zip(
+                node_hnames, fetch(keys=node_hnames, args=[str(user_id)])
+            ):
+                fields_by_hname[hname] = dict(zip(flat[::2], flat[1::2]))
+
+        tasks: t.Dict[str, t.Optional["TaskSnapshot"]] = {}
+        for task_id, hname in zip(task_ids, hnames):
+            fields = fields_by_hname[hname]
+            tasks[task_id] = cls(task_id, fields) if fields else None
+        body_ids = [
+            task.function_body_id
+            for task in tasks.values()
+            if task is not None and task.is_complete and task.function_body_id
+        ]
+        if body_ids:
+            pipe = redis_client.pipeline(transaction=False)
+            release_function_bodies(pipe, body_ids)
+            pipe.execute()
+        return tasks
+
+
+for _name, _field in _TASK_FIELDS.items():
+    setattr(TaskSnapshot, _name, _snapshot_field(_name, _field))
+
+
+class _PendingTaskFields:
+    """
+    Stands in for the Redis client of a task which is being created as part of a
+    RedisTaskBatch, so that field reads and writes stay in memory until the batch is
+    written out.
+    """
+
+    def __init__(self):
+        self.fields: t.Dict[str, str] = {}
+
+    def hget(self, name: str, key: str) -> t.Optional[str]:
+        return self.fields.get(key)
+
+    def hset(self, name: str, key: str, value: str) -> int:
+        self.fields[key] = value
+        return 1
+
+    def ttl(self, name: str) -> int:
+        # the key does not exist yet, the batch sets its expiry when writing it
+        return -2
+
+    def expire(self, name: str, time: t.Any) -> bool:
+        return True
+
+
+# KEYS: the hash name of each task, followed by an invocation counter sub-key
+# ARGV: the task TTL in seconds, then for each task its id, endpoint channel, endpoint
+#       queue, number of fields and the field/value pairs
+_CREATE_TASKS_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local pos = 2
+for i = 1, #KEYS - 1 do
+    local task_id, channel, queue = ARGV[pos], ARGV[pos + 1], ARGV[pos + 2]
+    local num_fields = tonumber(ARGV[pos + 3])
+    pos = pos + 4
+    for _ = 1, num_fields do
+        redis.call("HSET", KEYS[i], ARGV[pos], ARGV[pos + 1])
+        pos = pos + 2
+    end
+    redis.call("EXPIRE", KEYS[i], ttl)
+    if redis.call("PUBLISH", channel, task_id) == 0 then
+        redis.call("RPUSH", queue, task_id)
+    end
+end
+redis.call("INCRBY", KEYS[#KEYS], #KEYS - 1)
+return #KEYS - 1
+"""
+
+
+class TaskBatchError(Exception):
+    """
+    Raised by RedisTaskBatch.execute when the batch could not be written in full.
+    The tasks of committed_task_ids were written and sent to their endpoints. Those
+    of unqueued_task_ids were written and counted, but no one received them and they
+    could not be queued for their endpoints, so they will never run. The rest of the
+    batch was not sent.
+    """
+
+    def __init__(
+        self,
+        committed_task_ids: t.List[str],
+        cause: Exception,
+        unqueued_task_ids: t.Sequence[str] = (),
+    ):
+        super().__init__(str(cause))
+        self.committed_task_ids = committed_task_ids
+        self.unqueued_task_ids = list(unqueued_task_ids)
+        self.cause = cause
+
+
+class RedisTaskBatch:
+    """
+    Creates many RedisTasks in a few round trips to Redis, rather than several per
+    task.
+
+    Tasks are built in memory by `add()` and handed to an endpoint with `put()`, which
+    behaves like FuncxRedisPubSub.put. Nothing is sent to Redis until `execute()`,
+    which writes every task hash and its expiry, publishes or queues the task for its
+    endpoint and increments the invocation counter. Tasks which are added but never
+    put, or which are put and then passed to `discard()`, are not sent.
+
+    By default each chunk of the batch is sent as one transaction, plus one more
+    pipeline for any tasks which need to be queued because no one was subscribed to
+    their endpoint. With `use_lua=True` each chunk is instead written by a server-side
+    script in a single round trip. Function bodies added with `add_function_body()`
+    are written ahead of the tasks, in one more round trip, and tasks which belong to
+    task groups are added to the groups' member lists after them, in another. With
+    `record_changes=True` their creation is also added to the groups' change feeds.
+
+    The script needs every key of a chunk on one node, so batches written to a
+    ShardedRedis always use pipelines. Tasks with ids from `new_task_id()` are all
+    written to one node of a ShardedRedis, with their task group.
+
+    A chunk counts as committed once its transaction or script succeeds. If queueing
+    its unreceived tasks then fails, those tasks are reported apart from the rest,
+    since they exist but were never sent. When a chunk fails, the chunks before it
+    have already been sent, so execute() raises a TaskBatchError with the ids of
+    their tasks. Only those tasks are added to their groups, and the function body
+    references of the tasks which were never written are released.
+
+    Against one Redis server, a chunk's transaction is written in full or not at
+    all. A ShardedPipeline runs one transaction per node and its publishes after
+    them, so a chunk which fails there may be partly written. Its tasks are reported
+    as failed, but keep their function body references, and expire with TASK_TTL.
+    """
+
+    # the number of tasks sent to Redis per pipeline or script call
+    CHUNK_SIZE = 1000
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        *,
+        use_lua: bool = False,
+        record_changes: bool = False,
+        task_group_id: t.Optional[str] = None,
+    ):
+        self.redis_client = redis_client
+        self.use_lua = use_lua and not isinstance(redis_client, ShardedRedis)
+        self.record_changes = record_changes
+        # the UUID which new_task_id() places tasks alongside
+        self._placement = str(uuid.uuid4())
+        if task_group_id is not None and uuid_node(task_group_id) is not None:
+            self._placement = task_group_id
+        # the number of round trips made to Redis by execute()
+        self.round_trips = 0
+        self._queued: t.List[t.Tuple[str, RedisTask]] = []
+        self._function_bodies: t.Dict[str, str] = {}
+        self._function_body_refs: t.Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def new_task_id(self) -> str:
+        """
+        Make an id for a new task. With a ShardedRedis, the tasks of the batch are all
+        placed on one node, that of its task group if it was given one.
+        """
+        if isinstance(self.redis_client, ShardedRedis):
+            return colocated_uuid(self._placement)
+        return str(uuid.uuid4())
+
+    def add(self, task_id: str, **kwargs: t.Any) -> RedisTask:
+        """Build a new task in memory. Takes the same arguments as RedisTask."""
+        return RedisTask(t.cast(Redis, _PendingTaskFields()), task_id, **kwargs)
+
+    def add_function_body(self, body: str) -> str:
+        """
+        Store a function body once for the batch, returning the id which tasks should
+        refer to it by.
+        """
+        body_id = function_body_id(body)
+        self._function_bodies.setdefault(body_id, body)
+        return body_id
+
+    @staticmethod
+    def _fields(task: RedisTask) -> t.Dict[str, str]:
+        return t.cast(_PendingTaskFields, task.redis_client).fields
+
+    def put(self, endpoint_id: str, task: RedisTask) -> None:
+        """Send the task to the endpoint once the batch is executed"""
+        task.endpoint = endpoint_id
+        task.status = TaskState.WAITING_FOR_EP
+        self._queued.append((endpoint_id, task))
+
+        body_id = task.function_body_id
+        if body_id:
+            refs = self._function_body_refs.get(body_id, 0)
+            self._function_body_refs[body_id] = refs + 1
+
+    def discard(self, task_ids: t.Iterable[str]) -> None:
+        """Stop tasks which were put from being sent when the batch is executed"""
+        task_ids = set(task_ids)
+        queued = []
+        for endpoint_id, task in self._queued:
+            if task.task_id not in task_ids:
+                queued.append((endpoint_id, task))
+                continue
+            body_id = task.function_body_id
+            if body_id:
+                self._function_body_refs[body_id] -= 1
+                if not self._function_body_refs[body_id]:
+                    del self._function_body_refs[body_id]
+        self._queued = queued
+
+    def execute(self) -> t.List[str]:
+        """
+        Write the batch, returning the ids of the tasks written, or raising a
+        TaskBatchError with those of the tasks which were written before a failure
+        """
+        # the tasks of the chunks whose transaction or script succeeded
+        written: t.List[RedisTask] = []
+        unqueued: t.List[RedisTask] = []
+        attempted = 0
+        try:
+            # bodies are only written for the tasks which are actually being sent
+            if self._function_body_refs:
+                store_function_bodies(
+                    self.redis_client,
+                    {
+                        body_id: self._function_bodies[body_id]
+                        for body_id in self._function_body_refs
+                    },
+                    self._function_body_refs,
+                )
+                self.round_trips += 1
+
+            create_tasks = None
+            if self.use_lua:
+                create_tasks = self.redis_client.register_script(_CREATE_TASKS_SCRIPT)
+
+            for start in range(0, len(self._queued), self.CHUNK_SIZE):
+                end = start + self.CHUNK_SIZE
+                chunk = self._queued[start:end]
+                attempted = end
+                unreceived: t.List[t.Tuple[str, RedisTask]] = []
+                if create_tasks is not None:
+                    self._execute_script(create_tasks, chunk)
+                else:
+                    unreceived = self._execute_pipeline(chunk)
+                written.extend(task for _, task in chunk)
+                if unreceived:
+                    try:
+                        self._queue_unreceived(unreceived)
+                    except Exception:
+                        unqueued.extend(task for _, task in unreceived)
+                        raise
+        except Exception as e:
+            # a failed chunk is only known to be unwritten on a single server
+            unwritten = len(written)
+            if isinstance(self.redis_client, ShardedRedis):
+                unwritten = max(unwritten, attempted)
+            self._release_function_bodies(self._queued[unwritten:])
+            unqueued_ids = {task.task_id for task in unqueued}
+            committed = [task for task in written if task.task_id not in unqueued_ids]
+            self._finish(committed)
+            raise TaskBatchError(
+                [task.task_id for task in committed],
+                e,
+                [task.task_id for task in unqueued],
+            ) from e
+
+        self._finish(written)
+        return [task.task_id for task in written]
+
+    def _finish(self, committed: t.List[RedisTask]) -> None:
+        try:
+            self._add_to_task_groups(committed)
+        except Exception as e:
+            # the tasks have been sent, whether or not their groups list them
+            raise TaskBatchError([task.task_id for task in committed], e) from e
+        finally:
+            # from here on, the tasks read and write Redis like any other RedisTask
+            for task in committed:
+                task.redis_client = self.redis_client
+
+    def _release_function_bodies(self, unsent: t.List[t.Tuple[str, RedisTask]]) -> None:
+        """Drop the references which were added for tasks that were never sent"""
+        body_ids = [
+            task.function_body_id for _, task in unsent if task.function_body_id
+        ]
+        if not body_ids:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            release_function_bodies(pipe, body_ids)
+            pipe.execute()
+        except Exception:
+            # if Redis can't be reached, the bodies are left to expire with
+            # FUNCTION_BODY_TTL
+            pass
+
+    def _add_to_task_groups(self, tasks: t.List[RedisTask]) -> None:
+        members: t.Dict[str, t.List[str]] = {}
+        for task in tasks:
+            if task.task_group_id:
+                members.setdefault(task.task_group_id, []).append(task.task_id)
+        if not members:
+            return
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for task_group_id, task_ids in members.items():
+            key = TaskGroup.members_key(task_group_id)
+            pipe.rpush(key, *task_ids)
+            pipe.expire(key, TaskGroup.TASK_GROUP_TTL)
+            if self.record_changes:
+                record_created(
+                    pipe, task_group_id, task_ids, TaskState.WAITING_FOR_EP.value
+                )
+        pipe.execute()
+        self.round_trips += 1
+
+    def _execute_pipeline(
+        self, chunk: t.List[t.Tuple[str, RedisTask]]
+    ) -> t.List[t.Tuple[str, RedisTask]]:
+        """Write a chunk in a transaction, returning the tasks no one received"""
+        pipe = self.redis_client.pipeline(transaction=True)
+        for endpoint_id, task in chunk:
+            pipe.hset(task.hname, mapping=t.cast(_HashFields, self._fields(task)))
+            pipe.expire(task.hname, RedisTask.TASK_TTL)
+            # the hash is written before this runs, so receivers can always read it
+            pipe.publish(_channel_name(endpoint_id), task.task_id)
+        count_invocations(pipe, len(chunk))
+        results = pipe.execute()
+        self.round_trips += 1
+
+        recipients = results[2::3]
+        return [
+            (endpoint_id, task)
+            for (endpoint_id, task), received in zip(chunk, recipients)
+            if received == 0
+        ]
+
+    def _queue_unreceived(self, unreceived: t.List[t.Tuple[str, RedisTask]]) -> None:
+        # as with FuncxRedisPubSub, tasks which no one received are queued for the
+        # endpoint to pick up when it subscribes. This isn't retried, since an RPUSH
+        # which was applied but whose reply was lost would queue a task twice.
+        pipe = self.redis_client.pipeline(transaction=False)
+        for endpoint_id, task in unreceived:
+            pipe.rpush(_queue_name(endpoint_id), task.task_id)
+        pipe.execute()
+        self.round_trips += 1
+
+    def _execute_script(
+        self, create_tasks: t.Any, chunk: t.List[t.Tuple[str, RedisTask]]
+    ) -> None:
+        keys = [task.hname for _, task in chunk] + [invocation_counter_key()]
+        args: t.List[t.Any] = [int(RedisTask.TASK_TTL.total_seconds())]
+        for endpoint_id, task in chunk:
+            fields = self._fields(task)
+            args += [
+                task.task_id,
+                _channel_name(endpoint_id),
+                _queue_name(endpoint_id),
+                len(fields),
+            ]
+            for item in fields.items():
+                args.extend(item)
+
+        # EVALSHA, which only falls back to loading the script the first time it is
+        # used against a Redis server
+        create_tasks(keys=keys, args=args)
+        self.round_trips += 1
+
+
+# KEYS: the completed list and completed set of a task group; ARGV: their TTL in
+# seconds, followed by task ids
+_RECORD_COMPLETED_SCRIPT = """
+for i = 2, #ARGV do
+    if redis.call("SADD", KEYS[2], ARGV[i]) == 1 then
+        redis.call("RPUSH", KEYS[1], ARGV[i])
+    end
+end
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+redis.call("EXPIRE", KEYS[2], ARGV[1])
+"""
+
 
 class TaskGroup(metaclass=HasRedisFieldsMeta):
     """
     ORM-esque class to wrap access to properties of batches for better style and
     encapsulation
+
+    Alongside its hash, a task group has a list of its tasks, in the order they were
+    submitted, and a list of the tasks which have been seen to complete, in the order
+    they were seen. The position of a task in the completed list is stable, so it can
+    be used as a cursor by clients following the group's completions.
     """
 
     user_id = RedisField(serde=INT_SERDE)
@@ -175,6 +809,33 @@ class TaskGroup(metaclass=HasRedisFieldsMeta):
             # expire was not already set
             self.redis_client.expire(self.hname, TaskGroup.TASK_GROUP_TTL)
 
+    @staticmethod
+    def members_key(task_group_id: str) -> str:
+        return f"task_group_tasks_{task_group_id}"
+
+    @staticmethod
+    def completed_key(task_group_id: str) -> str:
+        return f"task_group_completed_{task_group_id}"
+
+    def task_ids(self, start: int = 0) -> t.List[str]:
+        """The ids of the group's tasks, from position start on"""
+        return self.redis_client.lrange(self.members_key(self.task_group_id), start, -1)
+
+    def completed_task_ids(self, start: int = 0) -> t.List[str]:
+        """The ids of the group's completed tasks, from position start on"""
+        return self.redis_client.lrange(
+            self.completed_key(self.task_group_id), start, -1
+        )
+
+    def record_completed(self, task_ids: t.Iterable[str]) -> None:
+        """Add tasks to the end of the completed list, unless they are already on it"""
+        record = self.redis_client.register_script(_RECORD_COMPLETED_SCRIPT)
+        completed_key = self.completed_key(self.task_group_id)
+        record(
+            keys=[completed_key, f"{completed_key}_set"],
+            args=[int(TaskGroup.TASK_GROUP_TTL.total_seconds()), *task_ids],
+        )
+
     def delete(self):
         """Removes this task group from Redis, to be used after the result is gotten"""
         self.redis_client.delete(self.hname)
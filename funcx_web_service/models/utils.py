@@ -1,5 +1,6 @@
 import time
 import uuid
+from datetime import datetime
 
 import redis
 from flask import current_app as app
@@ -8,26 +9,70 @@ from funcx_common.response_errors import EndpointAlreadyRegistered, FunctionNotF
 from funcx_web_service.models import search
 from funcx_web_service.models.endpoint import Endpoint
 from funcx_web_service.models.function import Function
+from funcx_web_service.models.task_log import write_task_log_rows
 from funcx_web_service.models.tasks import DBTask
 from funcx_web_service.models.user import User
 
 
 class db_invocation_logger:
+    """
+    Records submitted tasks in the tasks table.
+
+    Deferred rows are held until `commit()`, which writes them all with one multi-row
+    INSERT, or hands them to the worker's TaskLogWriter when background writes are
+    enabled with TASK_LOG_BACKGROUND_WRITES.
+    """
+
+    def __init__(self):
+        self._deferred_rows = []
+
     def log(self, user_id, task_id, function_id, endpoint_id, deferred=False):
+        now = datetime.utcnow()
+        row = {
+            "user_id": user_id,
+            "task_uuid": task_id,
+            "function_id": function_id,
+            "endpoint_id": endpoint_id,
+            "status": "CREATED",
+            "created_at": now,
+            "modified_at": now,
+        }
+        if deferred:
+            self._deferred_rows.append(row)
+            return
+
         try:
-            status = "CREATED"
-            task_record = DBTask(
-                user_id=user_id,
-                function_id=function_id,
-                endpoint_id=endpoint_id,
-                status=status,
-            )
-            task_record.save_to_db()
+            DBTask(**row).save_to_db()
         except Exception:
             app.logger.exception("Caught error while writing log update to db")
 
+    def discard(self, task_ids=None):
+        """
+        Drop any deferred rows which have not been committed yet, or only those of
+        task_ids if given
+        """
+        if task_ids is None:
+            self._deferred_rows = []
+            return
+        task_ids = set(task_ids)
+        self._deferred_rows = [
+            row for row in self._deferred_rows if row["task_uuid"] not in task_ids
+        ]
+
     def commit(self):
-        pass
+        rows, self._deferred_rows = self._deferred_rows, []
+        if not rows:
+            return
+
+        writer = app.extensions.get("TaskLogWriter")
+        if writer is not None:
+            writer.submit(rows)
+            return
+
+        try:
+            write_task_log_rows(rows)
+        except Exception:
+            app.logger.exception("Caught error while writing log update to db")
 
 
 def add_ep_whitelist(user: User, endpoint_uuid, functions):
@@ -304,13 +349,16 @@ def resolve_function(user_id, function_uuid):
 
 
 def get_redis_client():
-    """Return a redis client
+    """Return a redis client, which uses the worker's connection pool if there is one
 
     Returns
     -------
     redis.StrictRedis
         A client for redis
     """
+    manager = app.extensions.get("RedisPoolManager")
+    if manager is not None:
+        return manager.client
     try:
         redis_client = redis.StrictRedis(
             host=app.config["REDIS_HOST"],
@@ -1,13 +1,14 @@
 import json
+import re
 import time
 import typing as t
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from flask import Blueprint
 from flask import current_app as app
-from flask import g, jsonify, request
-from funcx_common.redis import FuncxRedisPubSub, default_redis_connection_factory
+from flask import g, jsonify, request, stream_with_context
 from funcx_common.response_errors import (
     ContainerNotFound,
     EndpointAccessForbidden,
@@ -31,10 +32,27 @@ from funcx_web_service.authentication.auth import (
     authenticated,
     authenticated_w_uuid,
     authorize_endpoint,
-    authorize_function,
 )
 from funcx_web_service.error_responses import create_error_response
-from funcx_web_service.models.tasks import RedisTask, TaskGroup
+from funcx_web_service.models import db
+from funcx_web_service.models.batch import SubmitBatchLookup
+from funcx_web_service.models.invocation_counter import read_invocation_count
+from funcx_web_service.models.payload_writer import PayloadWriter
+from funcx_web_service.models.storage_codec import CompressingTaskStorage
+from funcx_web_service.models.storage_urls import (
+    create_payload_upload,
+    result_url,
+    supports_urls,
+    uploaded_payload_reference,
+)
+from funcx_web_service.models.task_changes import read_changes
+from funcx_web_service.models.tasks import (
+    RedisTask,
+    RedisTaskBatch,
+    TaskBatchError,
+    TaskGroup,
+    TaskSnapshot,
+)
 from funcx_web_service.models.utils import (
     add_ep_whitelist,
     db_invocation_logger,
@@ -45,15 +63,15 @@ from funcx_web_service.models.utils import (
     ingest_endpoint,
     ingest_function,
     register_endpoint,
-    resolve_function,
     update_function,
 )
 from funcx_web_service.version import MIN_SDK_VERSION, VERSION
+from funcx_web_service.wire_format import body_response, request_body
 
 from ..models.container import Container
 from ..models.endpoint import Endpoint
 from ..models.function import Function, FunctionAuthGroup, FunctionContainer
-from ..models.serializer import deserialize_result, serialize_inputs
+from ..models.serializer import deserialize_result, get_serialization_client
 from ..models.user import User
 
 funcx_api = Blueprint("routes", __name__)
@@ -71,25 +89,29 @@ def g_redis_client():
     return g.redis_client
 
 
-def g_redis_pubsub():
-    if "redis_pubsub" not in g:
-        # TODO: remove support for REDIS_HOST and REDIS_PORT
-        # instead, allow configuration via FUNCX_COMMON_REDIS_URL and instantiate
-        # FuncxRedisPubSub with no arguments
-        if "REDIS_HOST" in app.config and "REDIS_PORT" in app.config:
-            redis_client = default_redis_connection_factory(
-                f"redis://{app.config['REDIS_HOST']}:{app.config['REDIS_PORT']}"
-            )
-        else:
-            redis_client = None
-        g.redis_pubsub = FuncxRedisPubSub(redis_client=redis_client)
-        g.redis_pubsub.redis_client.ping()
-    return g.redis_pubsub
+def g_redis_reader():
+    """
+    The client for read-only status checks: a replica when there is one fresh enough
+    to read from, and otherwise the primary
+    """
+    if "redis_reader" not in g:
+        reader = app.extensions.get("RedisReplicaReader")
+        replica = reader.client() if reader is not None else None
+        g.redis_reader = replica if replica is not None else g_redis_client()
+    return g.redis_reader
 
 
-def get_task_storage() -> TaskStorage:
+def get_task_storage() -> CompressingTaskStorage:
     if not hasattr(g, "task_storage"):
-        g.task_storage = get_default_task_storage()
+        # compressed data is always decompressed when it is read, whether or not
+        # new data is compressed
+        g.task_storage = CompressingTaskStorage(
+            get_default_task_storage(),
+            encoding=app.config.get("TASK_STORAGE_COMPRESSION"),
+            threshold=app.config.get("TASK_STORAGE_COMPRESSION_THRESHOLD", 1024),
+            # only once the forwarder decodes payload_encoding
+            compress_payloads=app.config.get("TASK_STORAGE_COMPRESS_PAYLOADS", False),
+        )
     return g.task_storage
 
 
@@ -101,7 +123,10 @@ def auth_and_launch(
     app,
     token,
     task_group_id,
-    serialize=None,
+    lookup,
+    task_batch,
+    payload_writer,
+    serialized_input=None,
 ):
     """Here we do basic auth for (user, fn, endpoint) and launch the function.
 
@@ -115,28 +140,39 @@ def auth_and_launch(
     endpoint_uuid : str
        endpoint uuid
     input_data : string_buffer
-       input payload data
+       input payload data, or {"upload_id": <id>} for a payload the user uploaded
+       to S3 through /payload_uploads
     app : app object
     token : globus token
-    serialize : bool
-        Whether or not to serialize the input using the serialization service. This is
-        used when the input is not already serialized by the SDK.
+    task_group_id : str
+        uuid of the task group this task belongs to
+    lookup : SubmitBatchLookup
+        the functions and endpoints of the batch this task was submitted in
+    task_batch : RedisTaskBatch
+        the batch which will write this task to Redis
+    payload_writer : PayloadWriter
+        stores the payloads of the batch, the task is only sent once its payload is
+        stored
+    serialized_input : Future
+        The input as encoded by the serialization service, if the input needs to be
+        serialized because the SDK has not done so. The whole batch is serialized
+        before its tasks are launched.
 
     Returns:
        JSON response object, containing task_uuid, http_status_code, and success or
        error info
     """
 
-    task_uuid = str(uuid.uuid4())
+    task_uuid = task_batch.new_task_id()
     try:
         # Check if the user is allowed to access the function
-        if not authorize_function(user_id, function_uuid, token):
+        if not lookup.authorize_function(user_id, function_uuid, token):
             raise FunctionAccessForbidden(function_uuid)
 
-        fn_code, fn_entry, container_uuid = resolve_function(user_id, function_uuid)
+        fn_code, fn_entry, container_uuid = lookup.resolve_function(function_uuid)
 
         # Make sure the user is allowed to use the function on this endpoint
-        if not authorize_endpoint(user_id, endpoint_uuid, function_uuid, token):
+        if not lookup.authorize_endpoint(user_id, endpoint_uuid, function_uuid, token):
             raise EndpointAccessForbidden(endpoint_uuid)
 
         app.logger.info(f"Got function container_uuid :{container_uuid}")
@@ -145,28 +181,45 @@ def auth_and_launch(
         if not container_uuid:
             container_uuid = "RAW"
 
-        rc = g_redis_client()
-        task_channel = g_redis_pubsub()
-
         db_logger = get_db_logger()
 
-        if serialize:
-            serialize_res = serialize_inputs(input_data)
+        payload_reference = None
+        if isinstance(input_data, dict):
+            if not app.config.get("DEDUPLICATE_FUNCTION_BODIES", False):
+                # the upload only holds the args, so the function body has to be
+                # stored apart from it
+                raise RequestMalformed("payload uploads are not supported")
+            payload_reference = uploaded_payload_reference(
+                get_task_storage(), user_id, input_data.get("upload_id")
+            )
+
+        if serialized_input is not None:
+            serialize_res = serialized_input.result()
             if serialize_res:
                 input_data = serialize_res
 
-        # At this point the packed function body and the args are concatable strings
-        payload = fn_code + input_data
-        task = RedisTask(
-            rc,
+        task = task_batch.add(
             task_uuid,
             user_id=user_id,
             function_id=function_uuid,
             container=container_uuid,
             task_group_id=task_group_id,
         )
-        get_task_storage().store_payload(task, payload)
-        task_channel.put(endpoint_uuid, task)
+        if payload_reference is not None:
+            # the args are already in S3, and are read from there when the task is
+            # dispatched
+            task.function_body_id = task_batch.add_function_body(fn_code)
+            task.payload_reference = payload_reference
+        elif app.config.get("DEDUPLICATE_FUNCTION_BODIES", False):
+            # the function body is stored once, rather than with every payload, and
+            # is put back in front of the args when the task is dispatched
+            task.function_body_id = task_batch.add_function_body(fn_code)
+            payload_writer.store(task, input_data)
+        else:
+            # At this point the packed function body and the args are concatable
+            # strings
+            payload_writer.store(task, fn_code + input_data)
+        task_batch.put(endpoint_uuid, task)
 
         extra_logging = {
             "user_id": user_id,
@@ -179,14 +232,10 @@ def auth_and_launch(
         }
         app.logger.info("received", extra=extra_logging)
 
-        # increment the counter
-        rc.incr("funcx_invocation_counter")
-        # add an invocation to the database
-        # log_invocation(user_id, task_uuid, function_uuid, ep)
+        # add an invocation to the database, this is written once the whole batch
+        # has been launched
         db_logger.log(user_id, task_uuid, function_uuid, endpoint_uuid, deferred=True)
 
-        db_logger.commit()
-
         return {"status": "Success", "task_uuid": task_uuid, "http_status_code": 200}
     except Exception as e:
         app.logger.exception(e)
@@ -213,6 +262,14 @@ def submit(user: User):
     -------
     json
         The task document
+
+    With `Accept: application/x-ndjson`, the response is streamed as a line of JSON
+    for the batch, followed by a line for each task once it is launched. Tasks are
+    then written to Redis in chunks, and the status is always 200, with failures
+    reported in the lines of the tasks which failed.
+
+    The body may be sent as `application/msgpack` rather than JSON, and with
+    `Accept: application/msgpack` the response is encoded the same way.
     """
 
     app.logger.info(f"batch_run invoked by user:{user.username}")
@@ -227,7 +284,7 @@ def submit(user: User):
     tasks = []
     task_group_id = None
     try:
-        post_req = request.json
+        post_req = request_body()
         if "tasks" in post_req:
             # new client is being used
             # TODO: validate that this tasks list is formatted correctly so
@@ -262,16 +319,107 @@ def submit(user: User):
         if task_group.user_id != user_id:
             raise TaskGroupAccessForbidden(task_group_id)
 
+    if wants_ndjson():
+        return ndjson_response(
+            stream_submit(
+                rc, user_id, token, tasks, task_group_id, task_group, serialize
+            )
+        )
+
     # this is a breaking change for old funcx sdk versions
     results: t.Dict[str, t.Any] = {
         "response": "batch",
         "task_group_id": task_group_id,
         "results": [],
     }
+    for launched in launch_tasks(
+        rc, user_id, token, tasks, task_group_id, serialize, chunk_size=len(tasks)
+    ):
+        results["results"].extend(launched)
 
-    final_http_status = 200
-    success_count = 0
-    for task in tasks:
+    success_count = sum(
+        1 for res in results["results"] if res.get("status", "Failed") == "Success"
+    )
+    # the response code is a 207 if some tasks failed to submit
+    final_http_status = 200 if success_count == len(results["results"]) else 207
+
+    # create a TaskGroup if there are actually tasks with results to wait on and
+    # a TaskGroup with the provided ID doesn't already exist
+    if success_count > 0 and task_group_id and not task_group:
+        app.logger.debug(f"Creating new Task Group {task_group_id} for user {user_id}")
+        TaskGroup(rc, task_group_id, user_id)
+
+    return body_response(results), final_http_status
+
+
+def stream_submit(rc, user_id, token, tasks, task_group_id, task_group, serialize):
+    """
+    Generate the lines of a streamed submit response: the task group, and then the
+    result of each task, once each chunk of SUBMIT_STREAM_CHUNK_SIZE tasks is written
+    """
+    yield {"response": "batch", "task_group_id": task_group_id}
+    chunk_size = app.config.get("SUBMIT_STREAM_CHUNK_SIZE", 500)
+    for launched in launch_tasks(
+        rc, user_id, token, tasks, task_group_id, serialize, chunk_size=chunk_size
+    ):
+        if task_group_id and not task_group:
+            if any(res.get("status", "Failed") == "Success" for res in launched):
+                app.logger.debug(
+                    f"Creating new Task Group {task_group_id} for user {user_id}"
+                )
+                task_group = TaskGroup(rc, task_group_id, user_id)
+        yield from launched
+
+
+def launch_tasks(rc, user_id, token, tasks, task_group_id, serialize, *, chunk_size):
+    """
+    Launch tasks chunk_size at a time, generating the results of each chunk once its
+    tasks have been written to Redis
+    """
+    # resolve every function and endpoint of the batch up front, rather than once
+    # per task
+    lookup = SubmitBatchLookup.from_tasks(tasks)
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(tasks), chunk_size):
+        end = start + chunk_size
+        chunk = tasks[start:end]
+        yield launch_task_chunk(
+            rc, user_id, token, chunk, task_group_id, serialize, lookup
+        )
+
+
+def launch_task_chunk(rc, user_id, token, tasks, task_group_id, serialize, lookup):
+    # all of the tasks are written to redis together once they are launched
+    task_batch = RedisTaskBatch(
+        rc,
+        use_lua=app.config.get("REDIS_TASK_BATCH_LUA", False),
+        # only while a recorder is keeping the feed up to date, which it isn't e.g.
+        # with REDIS_SHARDS
+        record_changes=app.extensions.get("TaskChangeRecorder") is not None,
+        task_group_id=task_group_id,
+    )
+    # payloads which go to S3 are uploaded concurrently, rather than one at a time
+    payload_writer = PayloadWriter(
+        get_task_storage(),
+        max_concurrency=app.config.get("SUBMIT_PAYLOAD_CONCURRENCY", 8),
+        timeout=app.config.get("SUBMIT_PAYLOAD_TIMEOUT", 30.0),
+    )
+
+    # serialize every input of the batch concurrently, rather than one at a time
+    serialized_inputs: t.List[t.Any] = [None] * len(tasks)
+    if serialize:
+        # uploaded payloads are never serialized here
+        to_serialize = [
+            i for i, task in enumerate(tasks) if not isinstance(task[2], dict)
+        ]
+        futures = get_serialization_client().serialize_many(
+            [tasks[i][2] for i in to_serialize]
+        )
+        for i, future in zip(to_serialize, futures):
+            serialized_inputs[i] = future
+
+    results = []
+    for task, serialized_input in zip(tasks, serialized_inputs):
         res = auth_and_launch(
             user_id,
             function_uuid=task[0],
@@ -280,61 +428,182 @@ def submit(user: User):
             app=app,
             token=token,
             task_group_id=task_group_id,
-            serialize=serialize,
+            lookup=lookup,
+            task_batch=task_batch,
+            payload_writer=payload_writer,
+            serialized_input=serialized_input,
         )
+        results.append(res)
+
+    db_logger = get_db_logger()
+    # tasks whose payload could not be stored are never sent
+    payload_errors = payload_writer.wait()
+    if payload_errors:
+        task_batch.discard(payload_errors)
+        db_logger.discard(payload_errors)
+        for i, res in enumerate(results):
+            error = payload_errors.get(res["task_uuid"])
+            if error is not None:
+                app.logger.error(
+                    f"Storing the payload of task {res['task_uuid']} failed: {error}"
+                )
+                results[i] = {
+                    **create_error_response(error)[0],
+                    "task_uuid": res["task_uuid"],
+                }
 
-        if res.get("status", "Failed") == "Success":
-            success_count += 1
-        else:
-            # the response code is a 207 if some tasks failed to submit
-            final_http_status = 207
+    try:
+        task_batch.execute()
+    except Exception as e:
+        # the tasks which the batch wrote before it failed have been launched, and
+        # the rest have not
+        app.logger.exception(e)
+        committed = set()
+        if isinstance(e, TaskBatchError):
+            committed = set(e.committed_task_ids)
+            if e.unqueued_task_ids:
+                # written and counted, but never sent to their endpoints
+                app.logger.error(
+                    "Tasks could not be queued for their endpoints",
+                    extra={
+                        "log_type": "task_batch_unqueued",
+                        "task_group_id": task_group_id,
+                        "task_ids": e.unqueued_task_ids,
+                    },
+                )
+            e = e.cause
+        error_res = create_error_response(e)[0]
+        failed = []
+        for i, res in enumerate(results):
+            if res.get("status") == "Success" and res["task_uuid"] not in committed:
+                failed.append(res["task_uuid"])
+                results[i] = {**error_res, "task_uuid": res["task_uuid"]}
+        db_logger.discard(failed)
+    db_logger.commit()
+    app.logger.info(
+        "task_batch_written",
+        extra={
+            "log_type": "task_batch",
+            "task_group_id": task_group_id,
+            "task_count": len(task_batch),
+            "redis_round_trips": task_batch.round_trips,
+        },
+    )
+    return results
 
-        results["results"].append(res)
 
-    # create a TaskGroup if there are actually tasks with results to wait on and
-    # a TaskGroup with the provided ID doesn't already exist
-    if success_count > 0 and task_group_id and not task_group:
-        app.logger.debug(f"Creating new Task Group {task_group_id} for user {user_id}")
-        TaskGroup(rc, task_group_id, user_id)
+def wants_ndjson() -> bool:
+    """Whether the client asked for a response streamed as newline-delimited JSON"""
+    best = request.accept_mimetypes.best_match(
+        ["application/json", "application/x-ndjson"]
+    )
+    return best == "application/x-ndjson"
+
+
+def ndjson_response(lines: t.Iterable[t.Any]):
+    """Stream each of lines as a line of JSON, as it is generated"""
+
+    def generate():
+        for line in lines:
+            yield json.dumps(line) + "\n"
 
-    return jsonify(results), final_http_status
+    return app.response_class(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
 
 
-def get_tasks_from_redis(task_ids, user: User):
+def get_tasks_from_redis(
+    task_ids, user: User, *, result_urls: bool = False, compressed: bool = False
+):
     all_tasks = {}
+    for chunk in iter_task_chunks_from_redis(
+        task_ids,
+        user,
+        chunk_size=len(task_ids),
+        result_urls=result_urls,
+        compressed=compressed,
+    ):
+        all_tasks.update(chunk)
+    return all_tasks
+
 
+def iter_task_chunks_from_redis(
+    task_ids,
+    user: User,
+    *,
+    chunk_size: int,
+    result_urls: bool = False,
+    compressed: bool = False,
+):
+    """
+    Generate the statuses of task_ids, by id, fetching chunk_size tasks at a time.
+    With result_urls, results stored in S3 are given as a URL to download them from.
+    With compressed, results stored compressed are given as they were stored, along
+    with their result_encoding.
+    """
     rc = g_redis_client()
-    for task_id in task_ids:
-        # Get the task from redis
-        if not RedisTask.exists(rc, task_id):
-            all_tasks[task_id] = {
-                "task_id": task_id,
-                "status": "Failed",
-                "reason": "Unknown task id",
-            }
-            continue
+    # a task asked for twice is only fetched, and deleted, once
+    task_ids = list(dict.fromkeys(task_ids))
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(task_ids), chunk_size):
+        end = start + chunk_size
+        chunk = task_ids[start:end]
+        yield get_task_chunk_from_redis(
+            rc, chunk, user, result_urls=result_urls, compressed=compressed
+        )
 
-        task = RedisTask(rc, task_id)
-        if task.user_id != user.id:
+
+def get_task_chunk_from_redis(
+    rc: Redis,
+    task_ids,
+    user: User,
+    *,
+    result_urls: bool = False,
+    compressed: bool = False,
+):
+    all_tasks = {}
+
+    # every task is read in one round trip, rather than a few per task, and the
+    # completed ones are deleted as they are read
+    tasks = fetch_task_snapshots(rc, task_ids, user)
+    owned_tasks = []
+    for task_id in task_ids:
+        task = tasks[task_id]
+        if task is None or task.user_id != user.id:
             all_tasks[task_id] = {
                 "task_id": task_id,
                 "status": "Failed",
                 "reason": "Unknown task id",
             }
-            continue
+        else:
+            owned_tasks.append(task)
 
-        task_status = task.status
-        task_result = get_task_storage().get_result(task)
+    # results given as URLs aren't fetched
+    try:
+        urls = get_result_urls(owned_tasks) if result_urls else {}
+        fetched = [task for task in owned_tasks if task.task_id not in urls]
+        task_results = dict(
+            zip(
+                [task.task_id for task in fetched],
+                get_task_results(fetched, compressed=compressed),
+            )
+        )
+    except Exception:
+        # so that the results can be fetched again
+        RedisTask.restore_many(rc, [task for task in owned_tasks if task.is_complete])
+        raise
+
+    for task in owned_tasks:
+        task_id = task.task_id
+        task_url = urls.get(task_id)
+        task_result = task_results.get(task_id)
         task_exception = task.exception
-        task_completion_t = task.completion_time
-        if task_result or task_exception:
-            task.delete()
 
         all_tasks[task_id] = {
             "task_id": task_id,
-            "status": task_status,
+            "status": task.status,
             "result": task_result,
-            "completion_t": task_completion_t,
+            "completion_t": task.completion_time,
             "exception": task_exception,
         }
 
@@ -349,20 +618,156 @@ def get_tasks_from_redis(task_ids, user: User):
         # complete.
         if task_exception is None:
             del all_tasks[task_id]["exception"]
-    return all_tasks
+
+        if task_url:
+            all_tasks[task_id]["result_url"] = task_url
+        elif compressed and task_result is not None and task.result_encoding:
+            all_tasks[task_id]["result_encoding"] = task.result_encoding
+
+    # in the order they were asked for
+    return {task_id: all_tasks[task_id] for task_id in task_ids}
+
+
+def get_task_results(
+    tasks: t.List[TaskSnapshot], *, compressed: bool = False
+) -> t.List[t.Any]:
+    """
+    Get the result of each of tasks, in order. Results which were stored outside of
+    Redis are fetched concurrently, at most BATCH_STATUS_STORAGE_CONCURRENCY at a time.
+    With compressed, results are left as they were stored.
+    """
+    storage = get_task_storage()
+    get_result = storage.get_stored_result if compressed else storage.get_result
+    stored = [task for task in tasks if task.result_reference]
+    if not stored:
+        return [get_result(task) for task in tasks]
+
+    max_workers = min(
+        app.config.get("BATCH_STATUS_STORAGE_CONCURRENCY", 8), len(stored)
+    )
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="funcx-task-storage"
+    ) as executor:
+        futures = {task.task_id: executor.submit(get_result, task) for task in stored}
+        return [
+            (
+                futures[task.task_id].result()
+                if task.task_id in futures
+                else get_result(task)
+            )
+            for task in tasks
+        ]
 
 
-def get_task_or_404(rc: Redis, task_id: str) -> RedisTask:
-    if not RedisTask.exists(rc, task_id):
+def get_result_urls(tasks: t.List[TaskSnapshot]) -> t.Dict[str, str]:
+    """
+    Get a URL to download the result of each of tasks whose result is stored in S3,
+    by task id, valid for RESULT_URL_EXPIRES_IN seconds
+    """
+    storage = get_task_storage()
+    expires_in = app.config.get("RESULT_URL_EXPIRES_IN", 300)
+    urls = {}
+    for task in tasks:
+        url = result_url(storage, task, expires_in)
+        if url:
+            urls[task.task_id] = url
+    return urls
+
+
+def read_task_snapshots(
+    rc: Redis, task_ids: t.List[str]
+) -> t.Dict[str, t.Optional[TaskSnapshot]]:
+    """
+    Read tasks for a status check, from a replica if there is one. Tasks which the
+    replica doesn't have yet, or which are complete on it, are read again from the
+    primary rc, so only the status of an incomplete task can be stale, and a result
+    is only ever fetched, and then deleted, from the primary.
+    """
+    reader = g_redis_reader()
+    if reader is rc:
+        return TaskSnapshot.read_many(rc, task_ids)
+
+    tasks = TaskSnapshot.read_many(reader, task_ids)
+    recheck = [
+        task_id for task_id, task in tasks.items() if task is None or task.is_complete
+    ]
+    if recheck:
+        tasks.update(TaskSnapshot.read_many(rc, recheck))
+    return tasks
+
+
+def fetch_task_snapshots(
+    rc: Redis, task_ids: t.List[str], user: User
+) -> t.Dict[str, t.Optional[TaskSnapshot]]:
+    """
+    Read tasks for a status check as read_task_snapshots does, deleting the user's
+    completed tasks from the primary rc as they are read. Each completed task is
+    only ever returned to one request.
+    """
+    reader = g_redis_reader()
+    if reader is rc:
+        return TaskSnapshot.fetch_many(rc, task_ids, user.id)
+
+    tasks = TaskSnapshot.read_many(reader, task_ids)
+    refetch = [
+        task_id for task_id, task in tasks.items() if task is None or task.is_complete
+    ]
+    if refetch:
+        tasks.update(TaskSnapshot.fetch_many(rc, refetch, user.id))
+    return tasks
+
+
+def get_task_or_404(rc: Redis, task_id: str, user: User) -> TaskSnapshot:
+    task = fetch_task_snapshots(rc, [task_id], user)[task_id]
+    if task is None:
         raise TaskNotFound(task_id)
-    return RedisTask(rc, task_id)
+    authorize_task_or_404(task, user)
+    return task
 
 
-def authorize_task_or_404(task: RedisTask, user: User):
+def authorize_task_or_404(task: TaskSnapshot, user: User):
     if task.user_id != user.id:
         raise TaskNotFound(task.task_id)
 
 
+def get_wait_timeout(wait) -> float:
+    """
+    Get the number of seconds a request may wait on its tasks, from the number it asked
+    for, capped at TASK_WAIT_MAX. Requests never wait if there is no TaskWaiter.
+    """
+    if wait is None or app.extensions.get("TaskWaiter") is None:
+        return 0.0
+    try:
+        wait = float(wait)
+    except (TypeError, ValueError):
+        raise RequestMalformed("wait must be a number of seconds")
+    return max(0.0, min(wait, app.config.get("TASK_WAIT_MAX", 30)))
+
+
+def wait_for_tasks(rc: Redis, user: User, task_ids: t.List[str], timeout: float):
+    """
+    Wait up to timeout seconds for any of the user's tasks among task_ids to complete,
+    returning straight away if one already has. Other users' tasks are never waited on.
+    """
+    tasks = read_task_snapshots(rc, task_ids)
+    owned = {
+        task_id: task
+        for task_id, task in tasks.items()
+        if task is not None and task.user_id == user.id
+    }
+    if not owned or any(task.is_complete for task in owned.values()):
+        return
+
+    def is_done():
+        latest = read_task_snapshots(rc, list(owned))
+        # a task which has gone was fetched by another request
+        return any(task is None or task.is_complete for task in latest.values())
+
+    # don't hold a database connection while waiting
+    db.session.close()
+    app.extensions["TaskWaiter"].wait(list(owned), is_done, timeout)
+
+
 # TODO: Old APIs look at "/<task_id>/status" for status and result, when that's changed,
 # we should remove this route
 @funcx_api.route("/<task_id>/status", methods=["GET"])
@@ -374,6 +779,15 @@ def status_and_result(user: User, task_id):
     If the query param deserialize=True is passed, then we deserialize the result
     object.
 
+    If the query param wait=<seconds> is passed, then the response is held until the
+    task completes or that many seconds pass, whichever is first.
+
+    If the query param result_url=True is passed, then a result which is stored in S3
+    is given as result_url, a short-lived URL to download it from, instead of result.
+
+    If the query param compressed=True is passed, then a result which is stored
+    compressed is returned as it is stored, with its codec as result_encoding.
+
     Parameters
     ----------
     user : User
@@ -387,14 +801,34 @@ def status_and_result(user: User, task_id):
         The status of the task
     """
     rc = g_redis_client()
-    task = get_task_or_404(rc, task_id)
-    authorize_task_or_404(task, user)
+    timeout = get_wait_timeout(request.args.get("wait"))
+    if timeout:
+        wait_for_tasks(rc, user, [task_id], timeout)
+
+    task = get_task_or_404(rc, task_id, user)
 
     task_status = task.status
-    task_result = get_task_storage().get_result(task)
+    task_url = None
+    task_encoding = None
+    try:
+        if request.args.get("result_url", False):
+            task_url = get_result_urls([task]).get(task_id)
+        if task_url:
+            task_result = None
+        elif request.args.get("compressed", False) and task.result_encoding:
+            task_result = get_task_storage().get_stored_result(task)
+            task_encoding = task.result_encoding
+        else:
+            task_result = get_task_storage().get_result(task)
+    except Exception:
+        # so that the result can be fetched again
+        if task.is_complete:
+            RedisTask.restore_many(rc, [task])
+        raise
     task_exception = task.exception
     task_completion_t = task.completion_time
-    if task_result or task_exception:
+    # the task was deleted when it was fetched
+    if task.is_complete:
         extra_logging = {
             "user_id": task.user_id,
             "task_id": task_id,
@@ -406,10 +840,8 @@ def status_and_result(user: User, task_id):
         }
         app.logger.info("user_fetched", extra=extra_logging)
 
-        task.delete()
-
     deserialize = request.args.get("deserialize", False)
-    if deserialize and task_result:
+    if deserialize and task_result and not task_encoding:
         task_result = deserialize_result(task_result)
 
     # TODO: change client to have better naming conventions
@@ -431,7 +863,12 @@ def status_and_result(user: User, task_id):
     if task_exception is None:
         del response["exception"]
 
-    return jsonify(response)
+    if task_url:
+        response["result_url"] = task_url
+    elif task_encoding and task_result is not None:
+        response["result_encoding"] = task_encoding
+
+    return body_response(response)
 
 
 @funcx_api.route("/batch_status", methods=["POST"])
@@ -439,6 +876,23 @@ def status_and_result(user: User, task_id):
 def batch_status(user: User):
     """Check the status of a task.
 
+    If deserialize=True is passed in the body, then the results are deserialized,
+    with all of the batch's results sent to the serialization service concurrently.
+
+    If wait=<seconds> is passed in the body, then the response is held until any of
+    the tasks completes or that many seconds pass, whichever is first.
+
+    If result_url=True is passed in the body, then results which are stored in S3 are
+    given as result_url, a short-lived URL to download each from, instead of result.
+
+    If compressed=True is passed in the body, then results which are stored
+    compressed are returned as they are stored, each with its result_encoding.
+
+    With `Accept: application/x-ndjson`, the response is streamed as a line of JSON
+    for the batch, followed by a line for each task as it is fetched.
+
+    As with submit, the body and the response may be msgpack rather than JSON.
+
     Parameters
     ----------
     user : User
@@ -451,10 +905,109 @@ def batch_status(user: User):
     json
         The status of the task
     """
-    app.logger.debug("batch_status_request", extra=request.json)
-    results = get_tasks_from_redis(request.json["task_ids"], user)
+    body = request_body()
+    app.logger.debug("batch_status_request", extra=body)
+    timeout = get_wait_timeout(body.get("wait"))
+    if timeout:
+        wait_for_tasks(g_redis_client(), user, body["task_ids"], timeout)
+
+    deserialize = body.get("deserialize", False)
+    result_urls = bool(body.get("result_url", False))
+    compressed = bool(body.get("compressed", False))
+    if wants_ndjson():
+        return ndjson_response(
+            stream_batch_status(
+                body["task_ids"], user, deserialize, result_urls, compressed
+            )
+        )
+
+    results = get_tasks_from_redis(
+        body["task_ids"], user, result_urls=result_urls, compressed=compressed
+    )
+    if deserialize:
+        deserialize_results(results.values())
 
-    return jsonify({"response": "batch", "results": results})
+    return body_response({"response": "batch", "results": results})
+
+
+def stream_batch_status(
+    task_ids, user: User, deserialize: bool, result_urls: bool, compressed: bool
+):
+    """
+    Generate the lines of a streamed batch_status response, one for the status of
+    each task, fetching BATCH_STATUS_STREAM_CHUNK_SIZE tasks at a time
+    """
+    yield {"response": "batch"}
+    chunk_size = app.config.get("BATCH_STATUS_STREAM_CHUNK_SIZE", 500)
+    for results in iter_task_chunks_from_redis(
+        task_ids,
+        user,
+        chunk_size=chunk_size,
+        result_urls=result_urls,
+        compressed=compressed,
+    ):
+        if deserialize:
+            deserialize_results(results.values())
+        yield from results.values()
+
+
+def deserialize_results(results: t.Iterable[t.Dict[str, t.Any]]):
+    """Deserialize the results of batch_status entries, all concurrently"""
+    # results left compressed are passed through as they are
+    with_results = [
+        res for res in results if res.get("result") and "result_encoding" not in res
+    ]
+    deserialized = get_serialization_client().deserialize_many(
+        [res["result"] for res in with_results]
+    )
+    for res, deserialized_result in zip(with_results, deserialized):
+        # the tasks have already been fetched and deleted, so a result which can't
+        # be decoded is passed back serialized rather than lost with the batch
+        try:
+            res["result"] = deserialized_result.result()
+        except Exception as e:
+            app.logger.warning(
+                f"Deserializing the result of task {res.get('task_id')} failed: {e}"
+            )
+
+
+@funcx_api.route("/payload_uploads", methods=["POST"])
+@authenticated
+def payload_uploads(user: User):
+    """Create presigned S3 uploads for task payloads, so that large payloads go
+    straight to S3 rather than through the web service.
+
+    A task is then submitted with {"upload_id": <id>} in place of its payload. Each
+    upload is only valid for PAYLOAD_UPLOAD_EXPIRES_IN seconds, and may be at most
+    PAYLOAD_UPLOAD_MAX_SIZE bytes.
+
+    POST payload
+    ------------
+    {
+        count: int
+    }
+
+    Returns
+    -------
+    json
+        The url and form fields to POST each payload to, with its upload_id
+    """
+    storage = get_task_storage()
+    if not supports_urls(storage):
+        raise RequestMalformed("payload uploads are not supported")
+
+    count = (request.json or {}).get("count", 1)
+    max_count = app.config.get("PAYLOAD_UPLOAD_MAX_COUNT", 100)
+    if not isinstance(count, int) or not 0 < count <= max_count:
+        raise RequestMalformed(f"count must be between 1 and {max_count}")
+
+    expires_in = app.config.get("PAYLOAD_UPLOAD_EXPIRES_IN", 300)
+    max_size = app.config.get("PAYLOAD_UPLOAD_MAX_SIZE", 100 * 1024 * 1024)
+    uploads = [
+        create_payload_upload(storage, user.id, expires_in, max_size)
+        for _ in range(count)
+    ]
+    return jsonify({"uploads": uploads, "expires_in": expires_in})
 
 
 def register_with_hub(address, endpoint_id, endpoint_address):
@@ -644,7 +1197,7 @@ def get_ep_stats(user: User, endpoint_id):
     if not authorize_endpoint(user_id, endpoint_id, None, token):
         raise EndpointAccessForbidden(endpoint_id)
 
-    rc = g_redis_client()
+    rc = g_redis_reader()
 
     status: str = "offline"
     status_logs: t.List[t.Dict[str, t.Any]] = []
@@ -971,7 +1524,7 @@ def funcx_stats():
     app.logger.debug("Getting stats")
     try:
         rc = g_redis_client()
-        result = int(rc.get("funcx_invocation_counter"))
+        result = read_invocation_count(rc)
         return jsonify({"total_function_invocations": result}), 200
     except Exception as e:
         app.logger.exception(e)
@@ -1000,3 +1553,178 @@ def get_batch_info(user: User, task_group_id):
         raise TaskGroupAccessForbidden(task_group_id)
 
     return jsonify({"authorized": True})
+
+
+@funcx_api.route("/task_groups/<task_group_id>/events", methods=["GET"])
+@authenticated
+def get_task_group_events(user: User, task_group_id):
+    """Stream the completions of a task group's tasks as server-sent events.
+
+    Each event carries the id, status, completion time and result or exception of a
+    task, like the entries of batch_status, with the task's position in the group's
+    completed list as its event id. A client which reconnects with the Last-Event-ID
+    header is sent the completions after that one. Tasks are not deleted once their
+    events are sent, so a stream can always be resumed. A task whose result was
+    fetched some other way before its event was sent has the status "fetched", and
+    no result.
+
+    The stream ends after TASK_GROUP_EVENTS_DURATION seconds, and clients are expected
+    to reconnect. A comment is sent every TASK_GROUP_EVENTS_HEARTBEAT seconds while
+    nothing completes, to keep the connection open through proxies. Under uwsgi's
+    gevent loop, an open stream only holds a greenlet, not a worker.
+
+    Parameters
+    ----------
+    user : User
+        The primary identity of the user
+    task_group_id : str
+        The task group uuid to follow
+
+    Returns
+    -------
+    text/event-stream
+        The completions of the group's tasks
+    """
+    rc = g_redis_client()
+
+    if not TaskGroup.exists(rc, task_group_id):
+        raise TaskGroupNotFound(task_group_id)
+
+    task_group = TaskGroup(rc, task_group_id)
+
+    if task_group.user_id != user.id:
+        raise TaskGroupAccessForbidden(task_group_id)
+
+    last_event_id = request.headers.get("Last-Event-ID")
+    try:
+        cursor = 0 if last_event_id is None else int(last_event_id) + 1
+    except ValueError:
+        raise RequestMalformed("Last-Event-ID must be an event id from this stream")
+
+    # don't hold a database connection for the length of the stream
+    db.session.close()
+    return app.response_class(
+        stream_with_context(task_group_events(rc, task_group, cursor)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@funcx_api.route("/task_groups/<task_group_id>/changes", methods=["GET"])
+@authenticated
+def get_task_group_changes(user: User, task_group_id):
+    """Get the tasks of a task group which changed state after a cursor.
+
+    Each change has the id and status of a task, and the cursor of the change. Only
+    the latest change of each task is returned, oldest first. Passing the returned
+    cursor as `since` gets the changes after these. At most `limit` changes are read
+    at once, capped at TASK_CHANGE_FEED_PAGE_SIZE.
+
+    Parameters
+    ----------
+    user : User
+        The primary identity of the user
+    task_group_id : str
+        The task group uuid to look up
+
+    Returns
+    -------
+    json
+        The changes, and the cursor to pass next time
+    """
+    rc = g_redis_client()
+
+    if not TaskGroup.exists(rc, task_group_id):
+        raise TaskGroupNotFound(task_group_id)
+
+    task_group = TaskGroup(rc, task_group_id)
+
+    if task_group.user_id != user.id:
+        raise TaskGroupAccessForbidden(task_group_id)
+
+    since = request.args.get("since")
+    if since is not None and not re.fullmatch(r"\d+-\d+", since):
+        raise RequestMalformed("since must be a cursor returned by this route")
+    page_size = app.config.get("TASK_CHANGE_FEED_PAGE_SIZE", 1000)
+    limit = request.args.get("limit", page_size, type=int)
+
+    changes, cursor = read_changes(
+        rc, task_group_id, since, count=max(1, min(limit, page_size))
+    )
+    return jsonify(
+        {"task_group_id": task_group_id, "changes": changes, "cursor": cursor}
+    )
+
+
+def task_group_events(rc: Redis, task_group: TaskGroup, cursor: int):
+    """Generate the server-sent events of a task group, from position cursor on"""
+    storage = get_task_storage()
+    waiter = app.extensions.get("TaskWaiter")
+    heartbeat = app.config.get("TASK_GROUP_EVENTS_HEARTBEAT", 15)
+    deadline = time.monotonic() + app.config.get("TASK_GROUP_EVENTS_DURATION", 300)
+
+    # the group's tasks which haven't been seen to complete, in submission order
+    pending: t.Dict[str, None] = {}
+    members_seen = 0
+    while True:
+        new_members = task_group.task_ids(members_seen)
+        members_seen += len(new_members)
+        pending.update(dict.fromkeys(new_members))
+
+        # a task which has gone was fetched by batch_status or status_and_result.
+        # Only the tasks to send are read in full.
+        completed = TaskSnapshot.done_ids(rc, pending)
+        if completed:
+            task_group.record_completed(completed)
+            for task_id in completed:
+                del pending[task_id]
+
+        # including e.g. the completions before a client reconnected
+        to_send = task_group.completed_task_ids(cursor)
+        tasks = TaskSnapshot.read_many(rc, to_send)
+        for task_id in to_send:
+            yield _task_event(cursor, task_id, tasks[task_id], storage)
+            cursor += 1
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+
+        timeout = min(heartbeat, remaining)
+        if waiter is not None and pending:
+            task_ids = list(pending)
+
+            def is_done():
+                return bool(TaskSnapshot.done_ids(rc, task_ids))
+
+            waiter.wait(task_ids, is_done, timeout)
+        elif pending:
+            time.sleep(min(timeout, app.config.get("TASK_WAIT_RECHECK_INTERVAL", 5.0)))
+        else:
+            time.sleep(timeout)
+        yield ": keep-alive\n\n"
+
+
+def _task_event(
+    event_id: int,
+    task_id: str,
+    task: t.Optional[TaskSnapshot],
+    storage: TaskStorage,
+) -> str:
+    data: t.Dict[str, t.Any]
+    if task is None:
+        # the task completed, and was deleted when its result was fetched, or when it
+        # expired
+        data = {"task_id": task_id, "status": "fetched"}
+    else:
+        data = {
+            "task_id": task_id,
+            "status": task.status,
+            "completion_t": task.completion_time,
+        }
+        result = storage.get_result(task)
+        if result is not None:
+            data["result"] = result
+        if task.exception is not None:
+            data["exception"] = task.exception
+    return f"id: {event_id}\nevent: task\ndata: {json.dumps(data)}\n\n"
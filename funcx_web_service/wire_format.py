@@ -0,0 +1,57 @@
+"""
+msgpack as an alternative to JSON for the bodies of the task routes.
+
+Batches of tasks and their results are mostly long serialized strings, which JSON
+has to scan and escape character by character in both directions. Clients which
+send `Content-Type: application/msgpack` have their body decoded from msgpack, and
+clients which send `Accept: application/msgpack` get their response encoded in it.
+The documents are the same as the JSON ones either way. msgpack is only offered if
+the `msgpack` package is installed.
+"""
+
+import typing as t
+
+try:
+    import msgpack
+
+    has_msgpack = True
+except ImportError:
+    has_msgpack = False
+
+from flask import current_app as app
+from flask import g, jsonify, request
+from funcx_common.response_errors import RequestMalformed
+
+MSGPACK_MIMETYPE = "application/msgpack"
+
+
+def request_body() -> t.Any:
+    """Get the decoded body of the request, whether it was sent as JSON or msgpack"""
+    if request.mimetype != MSGPACK_MIMETYPE:
+        return request.json
+    if not has_msgpack:
+        raise RequestMalformed(f"unsupported Content-Type: {MSGPACK_MIMETYPE}")
+
+    if "msgpack_body" not in g:
+        try:
+            g.msgpack_body = msgpack.unpackb(request.get_data(), raw=False)
+        except Exception:
+            raise RequestMalformed("request body is not valid msgpack")
+    return g.msgpack_body
+
+
+def wants_msgpack() -> bool:
+    """Whether the client asked for a msgpack response"""
+    if not has_msgpack:
+        return False
+    best = request.accept_mimetypes.best_match(["application/json", MSGPACK_MIMETYPE])
+    return best == MSGPACK_MIMETYPE
+
+
+def body_response(data: t.Any):
+    """Encode data as msgpack if the client asked for it, and as JSON otherwise"""
+    if wants_msgpack():
+        return app.response_class(
+            msgpack.packb(data, use_bin_type=True), mimetype=MSGPACK_MIMETYPE
+        )
+    return jsonify(data)
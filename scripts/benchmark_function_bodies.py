@@ -0,0 +1,86 @@
+"""Compare Redis memory used by a large map with and without function body dedup.
+
+Launches the same map of tasks twice through RedisTaskBatch, once with the function
+body in every payload and once with the body stored separately, and reports the
+growth of the server's used_memory for each. Point it at a scratch Redis database;
+the keys it creates are removed afterwards.
+
+    python scripts/benchmark_function_bodies.py --tasks 100000 --body-size 50000
+"""
+
+import argparse
+import uuid
+
+import redis
+from funcx_common.task_storage import ImplicitRedisStorage
+
+from funcx_web_service.models.invocation_counter import count_invocations
+from funcx_web_service.models.tasks import RedisTaskBatch
+
+
+def used_memory(rc):
+    return int(rc.info("memory")["used_memory"])
+
+
+def launch_map(rc, num_tasks, body, deduplicate):
+    storage = ImplicitRedisStorage()
+    endpoint_id = f"benchmark-{uuid.uuid4()}"
+    task_ids = []
+
+    batch = RedisTaskBatch(rc)
+    for i in range(num_tasks):
+        task_id = str(uuid.uuid4())
+        task = batch.add(task_id, user_id=0, function_id="benchmark", container="RAW")
+        args = f"benchmark-args-{i}"
+        if deduplicate:
+            task.function_body_id = batch.add_function_body(body)
+            storage.store_payload(task, args)
+        else:
+            storage.store_payload(task, body + args)
+        batch.put(endpoint_id, task)
+        task_ids.append(task_id)
+    batch.execute()
+    return endpoint_id, task_ids
+
+
+def cleanup(rc, endpoint_id, task_ids):
+    pipe = rc.pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.delete(f"task_{task_id}")
+    pipe.delete(f"task_queue_{endpoint_id}")
+    count_invocations(pipe, -len(task_ids))
+    pipe.execute()
+    for key in rc.scan_iter("function_body_*"):
+        rc.delete(key)
+
+
+def measure(rc, num_tasks, body, deduplicate):
+    before = used_memory(rc)
+    endpoint_id, task_ids = launch_map(rc, num_tasks, body, deduplicate)
+    after = used_memory(rc)
+    cleanup(rc, endpoint_id, task_ids)
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--body-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    rc = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    body = "x" * args.body_size
+
+    inline = measure(rc, args.tasks, body, deduplicate=False)
+    deduplicated = measure(rc, args.tasks, body, deduplicate=True)
+
+    print(f"{args.tasks} tasks, {args.body_size} byte function body")
+    print(f"  body in every payload: {inline / 2**20:10.1f} MiB")
+    print(f"  body stored once:      {deduplicated / 2**20:10.1f} MiB")
+    if deduplicated > 0:
+        print(f"  reduction:             {inline / deduplicated:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare Redis memory and CPU time used by task payloads with and without compression.
+
+Launches the same map of tasks through RedisTaskBatch with payloads stored as they
+are and compressed with each available codec, as they are stored with
+TASK_STORAGE_COMPRESS_PAYLOADS set, and reports the growth of the server's
+used_memory and the time spent compressing and decompressing for each. Payloads are
+made from a sample file if one is given, e.g. a pickled or JSON-serialized payload
+captured from a real task, or else from a repetitive placeholder. Point it at a
+scratch Redis database; the keys it creates are removed afterwards.
+
+    python scripts/benchmark_storage_compression.py --tasks 10000 --sample args.txt
+"""
+
+import argparse
+import time
+import uuid
+
+import redis
+from funcx_common.task_storage import ImplicitRedisStorage
+
+from funcx_web_service.models.invocation_counter import count_invocations
+from funcx_web_service.models.storage_codec import (
+    ENCODINGS,
+    CompressingTaskStorage,
+    has_zstd,
+)
+from funcx_web_service.models.tasks import RedisTask, RedisTaskBatch
+
+
+def used_memory(rc):
+    return int(rc.info("memory")["used_memory"])
+
+
+def launch_map(rc, storage, payloads):
+    endpoint_id = f"benchmark-{uuid.uuid4()}"
+    task_ids = []
+
+    batch = RedisTaskBatch(rc)
+    store_time = 0.0
+    for payload in payloads:
+        task_id = str(uuid.uuid4())
+        task = batch.add(task_id, user_id=0, function_id="benchmark", container="RAW")
+        start = time.perf_counter()
+        storage.store_payload(task, payload)
+        store_time += time.perf_counter() - start
+        batch.put(endpoint_id, task)
+        task_ids.append(task_id)
+    batch.execute()
+    return endpoint_id, task_ids, store_time
+
+
+def read_payloads(rc, storage, task_ids):
+    read_time = 0.0
+    for task_id in task_ids:
+        task = RedisTask(rc, task_id)
+        start = time.perf_counter()
+        storage.get_payload(task)
+        read_time += time.perf_counter() - start
+    return read_time
+
+
+def cleanup(rc, endpoint_id, task_ids):
+    pipe = rc.pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.delete(f"task_{task_id}")
+    pipe.delete(f"task_queue_{endpoint_id}")
+    count_invocations(pipe, -len(task_ids))
+    pipe.execute()
+
+
+def measure(rc, payloads, encoding):
+    storage = CompressingTaskStorage(
+        ImplicitRedisStorage(), encoding=encoding, compress_payloads=True
+    )
+    before = used_memory(rc)
+    endpoint_id, task_ids, store_time = launch_map(rc, storage, payloads)
+    after = used_memory(rc)
+    read_time = read_payloads(rc, storage, task_ids)
+    cleanup(rc, endpoint_id, task_ids)
+    return after - before, store_time, read_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--payload-size", type=int, default=20000)
+    parser.add_argument("--sample", help="a file to build each payload from")
+    args = parser.parse_args()
+
+    rc = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    if args.sample:
+        with open(args.sample) as f:
+            sample = f.read()
+    else:
+        sample = "00\ngASVKAAAAAAAAACMCGJ1aWx0aW5zlIwFcmFuZ2WUk5RLAEsKSwGHlFKULg==\n"
+    base = (sample * (args.payload_size // len(sample) + 1))[: args.payload_size]
+    payloads = [f"{base}{i}" for i in range(args.tasks)]
+
+    encodings = [None] + [e for e in ENCODINGS if e != "zstd" or has_zstd]
+    print(f"{args.tasks} tasks, {args.payload_size} character payloads")
+    print(f"  {'codec':<6} {'memory':>12} {'store cpu':>12} {'read cpu':>12}")
+    for encoding in encodings:
+        memory, store_time, read_time = measure(rc, payloads, encoding)
+        print(
+            f"  {encoding or 'none':<6} {memory / 2**20:8.1f} MiB "
+            f"{store_time * 1000:9.1f} ms {read_time * 1000:9.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
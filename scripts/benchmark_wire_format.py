@@ -0,0 +1,93 @@
+"""Compare JSON and msgpack for encoding typical submit and batch_status bodies.
+
+Builds a submit body of tasks with serialized arguments of the given size, and the
+batch_status response for the same number of results, then times decoding and
+encoding each with JSON, as request.json and jsonify do, and with msgpack, and
+reports the bytes each puts on the wire.
+
+    python scripts/benchmark_wire_format.py --tasks 1000 --payload-size 10000
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+import msgpack
+
+# the shape of the strings the SDK sends, a serializer header and base64-ish data
+SERIALIZED = "01\ngASVKAAAAAAAAACMCGJ1aWx0aW5zlIwFcmFuZ2WUk5RLAEsKSwGHlFKULg==\n"
+
+
+def serialized(size):
+    return (SERIALIZED * (size // len(SERIALIZED) + 1))[:size]
+
+
+def submit_body(num_tasks, payload_size):
+    function_id = str(uuid.uuid4())
+    endpoint_id = str(uuid.uuid4())
+    return {
+        "tasks": [
+            [function_id, endpoint_id, serialized(payload_size)]
+            for _ in range(num_tasks)
+        ],
+        "task_group_id": str(uuid.uuid4()),
+    }
+
+
+def batch_status_body(num_tasks, payload_size):
+    results = {}
+    for _ in range(num_tasks):
+        task_id = str(uuid.uuid4())
+        results[task_id] = {
+            "task_id": task_id,
+            "status": "success",
+            "result": serialized(payload_size),
+            "completion_t": str(time.time()),
+        }
+    return {"response": "batch", "results": results}
+
+
+def timed(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = fn(arg)
+    return value, (time.perf_counter() - start) / repeat
+
+
+def measure(body, repeat):
+    formats = {
+        "json": (lambda b: json.dumps(b).encode("utf-8"), json.loads),
+        "msgpack": (
+            lambda b: msgpack.packb(b, use_bin_type=True),
+            lambda d: msgpack.unpackb(d, raw=False),
+        ),
+    }
+    for name, (encode, decode) in formats.items():
+        data, encode_time = timed(encode, body, repeat)
+        _, decode_time = timed(decode, data, repeat)
+        print(
+            f"  {name:<8} {len(data) / 2**20:8.2f} MiB "
+            f"{decode_time * 1000:9.1f} ms {encode_time * 1000:9.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--payload-size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.tasks} tasks, {args.payload_size} character payloads")
+    for name, body in [
+        ("submit", submit_body(args.tasks, args.payload_size)),
+        ("batch_status", batch_status_body(args.tasks, args.payload_size)),
+    ]:
+        print(f"{name}")
+        print(f"  {'format':<8} {'size':>12} {'decode':>12} {'encode':>12}")
+        measure(body, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import psycopg2
 import psycopg2.extras
 import redis
 
+from funcx_web_service.models.invocation_counter import read_invocation_count
+
 
 def rds_usage(conn, cur):
     """Connect to the database and pull out usage info"""
@@ -85,7 +87,7 @@ def redis_usage():
     # Total core hours
     redis_data["core_hours"] = rc.get("funcx_worldwide_counter")
     # Total function invocations
-    redis_data["invocations"] = rc.get("funcx_invocation_counter")
+    redis_data["invocations"] = read_invocation_count(rc)
     return redis_data
 
 
@@ -1,4 +1,5 @@
 import contextlib
+import json
 import typing as t
 import uuid
 
@@ -14,6 +15,7 @@ from funcx_web_service.models import db
 from funcx_web_service.models.user import User
 
 TEST_FORWARDER_IP = "192.162.3.5"
+TEST_SERIALIZATION_ADDR = "serialization-service"
 DEFAULT_FUNCX_SCOPE = (
     "https://auth.globus.org/scopes/facd7ccc-c5f4-42aa-916b-a0e270e2c2a9/all"
 )
@@ -68,16 +70,6 @@ def mock_redis_server():
     return fakeredis.FakeServer()
 
 
-@pytest.fixture
-def mock_redis_pubsub(mocker):
-    mock_pubsub = mocker.Mock()
-
-    mocker.patch(
-        "funcx_web_service.routes.funcx.g_redis_pubsub", return_value=mock_pubsub
-    )
-    return mock_pubsub
-
-
 @pytest.fixture
 def mock_redis(mocker, mock_redis_server):
     mock_redis_client = fakeredis.FakeStrictRedis(
@@ -105,7 +97,11 @@ def flask_app():
             "HOSTNAME": "http://testhost",
             "FORWARDER_IP": TEST_FORWARDER_IP,
             "ADVERTISED_REDIS_HOST": "my-redis.com",
+            "SERIALIZATION_ADDR": TEST_SERIALIZATION_ADDR,
+            "SERIALIZATION_PORT": 8000,
             "CONTAINER_SERVICE_ENABLED": False,
+            "TOKEN_INTROSPECTION_CACHE_SHARED": False,
+            "GROUP_MEMBERSHIP_CACHE_SHARED": False,
         }
     )
     app.secret_key = "Shhhhh"
@@ -224,3 +220,24 @@ def default_forwarder_responses(mocked_responses):
         body="{}",
         status=200,
     )
+
+
+@pytest.fixture
+def mock_serialization_service(mocked_responses):
+    """Imitates the serialization service, which tags what it encodes or decodes"""
+
+    def _callback(prefix):
+        def callback(request):
+            return 200, {}, json.dumps(f"{prefix}:{json.loads(request.body)}")
+
+        return callback
+
+    # tests may only need one of the two
+    mocked_responses.assert_all_requests_are_fired = False
+    for path in ("serialize", "deserialize"):
+        mocked_responses.add_callback(
+            responses.POST,
+            f"http://{TEST_SERIALIZATION_ADDR}:8000/{path}",
+            callback=_callback(path),
+        )
+    return mocked_responses
@@ -1,4 +1,8 @@
+import time
+
+import fakeredis
 import pytest
+import redis
 import responses
 from werkzeug.exceptions import Forbidden, Unauthorized
 
@@ -6,6 +10,7 @@ from funcx_web_service.authentication.auth_state import (
     AuthenticationState,
     get_auth_state,
 )
+from funcx_web_service.authentication.globus_auth import TokenIntrospectionCache
 from funcx_web_service.models.user import User
 
 INTROSPECT_RESPONSE = {
@@ -25,6 +30,25 @@ INTROSPECT_RESPONSE = {
 }
 
 
+INTROSPECT_URL = "https://auth.globus.org/v2/oauth2/token/introspect"
+
+
+def _make_introspection_cache(redis_server):
+    return TokenIntrospectionCache(
+        fakeredis.FakeStrictRedis(server=redis_server, decode_responses=True)
+    )
+
+
+@pytest.fixture(autouse=True)
+def introspection_cache(flask_app, mock_redis_server):
+    # give each test an empty cache, so that no test sees another's introspections
+    cache = _make_introspection_cache(mock_redis_server)
+    old_cache = flask_app.extensions["TokenIntrospectionCache"]
+    flask_app.extensions["TokenIntrospectionCache"] = cache
+    yield cache
+    flask_app.extensions["TokenIntrospectionCache"] = old_cache
+
+
 @pytest.fixture
 def good_introspect(mocked_responses):
     mocked_responses.add(
@@ -98,3 +122,80 @@ def test_auth_state_user_object(flask_request_ctx, good_introspect):
     assert userobj is not None
     assert isinstance(userobj, User)
     assert userobj.username == state.username
+
+
+def test_introspection_is_cached(flask_request_ctx, good_introspect, mocked_responses):
+    AuthenticationState("foo")
+    state = AuthenticationState("foo")
+
+    assert state.identity_id == INTROSPECT_RESPONSE["sub"]
+    assert len(mocked_responses.calls) == 1
+
+
+def test_introspection_is_shared_between_workers(
+    flask_app, flask_request_ctx, good_introspect, mocked_responses, mock_redis_server
+):
+    AuthenticationState("foo")
+
+    # a second cache over the same redis, as another worker would have
+    flask_app.extensions["TokenIntrospectionCache"] = other_worker_cache = (
+        _make_introspection_cache(mock_redis_server)
+    )
+    state = AuthenticationState("foo")
+
+    assert state.identity_id == INTROSPECT_RESPONSE["sub"]
+    assert len(mocked_responses.calls) == 1
+    assert other_worker_cache.stats["shared_hits"] == 1
+
+
+def test_introspection_cache_does_not_store_tokens(
+    flask_request_ctx, good_introspect, mock_redis_server
+):
+    AuthenticationState("foo")
+
+    redis_client = fakeredis.FakeStrictRedis(server=mock_redis_server)
+    keys = redis_client.keys("*")
+    assert len(keys) == 1
+    assert b"foo" not in keys[0]
+    assert b"foo" not in redis_client.get(keys[0])
+
+
+def test_inactive_introspection_is_cached_briefly(
+    flask_request_ctx, introspection_cache, mocked_responses
+):
+    mocked_responses.add(
+        responses.POST, INTROSPECT_URL, json={"active": False}, status=200
+    )
+
+    for _ in range(2):
+        with pytest.raises(Unauthorized):
+            AuthenticationState("foo")
+    assert len(mocked_responses.calls) == 1
+
+    key = introspection_cache.token_key("foo")
+    ttl = introspection_cache.redis_client.pttl(f"token_introspection_{key}")
+    assert 0 < ttl <= introspection_cache.negative_ttl * 1000
+
+
+def test_introspection_cache_ttl_respects_token_expiry(introspection_cache):
+    now = time.time()
+    assert introspection_cache.ttl_for({"active": True, "exp": now + 3600}) == 60
+    assert 9 <= introspection_cache.ttl_for({"active": True, "exp": now + 10}) <= 10
+    assert introspection_cache.ttl_for({"active": True, "exp": now - 10}) <= 0
+    assert introspection_cache.ttl_for({"active": False}) == 5
+
+
+def test_introspection_cache_tolerates_redis_failure(
+    flask_request_ctx, introspection_cache, good_introspect, mocker
+):
+    mocker.patch.object(
+        introspection_cache.redis_client,
+        "get",
+        side_effect=redis.ConnectionError("redis is down"),
+    )
+
+    state = AuthenticationState("foo")
+
+    assert state.identity_id == INTROSPECT_RESPONSE["sub"]
+    assert introspection_cache.stats["errors"] == 1
+    assert introspection_cache.stats["misses"] == 1
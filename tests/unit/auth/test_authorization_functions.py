@@ -1,7 +1,12 @@
 import pytest
 
 import funcx_web_service.authentication
-from funcx_web_service.authentication.auth import authorize_endpoint, authorize_function
+from funcx_web_service.authentication.auth import (
+    GroupMembershipCache,
+    authorize_endpoint,
+    authorize_function,
+    check_group_membership,
+)
 from funcx_web_service.models.auth_groups import AuthGroup
 from funcx_web_service.models.endpoint import Endpoint
 from funcx_web_service.models.function import Function, FunctionAuthGroup
@@ -19,7 +24,6 @@ def test_authorize_endpoint_restricted_whitelist(mocker):
     requested function is in the whitelist
     """
 
-    authorize_endpoint.cache_clear()
     mock_endpoint_find = mocker.patch.object(
         Endpoint,
         "find_by_uuid",
@@ -45,8 +49,6 @@ def test_authorize_endpoint_restricted_not_whitelist(mocker):
     Test to see that we are authorized if the endpoint is restricted, and the
     requested function is not in the whitelist
     """
-    authorize_endpoint.cache_clear()
-
     mock_endpoint_find = mocker.patch.object(
         Endpoint,
         "find_by_uuid",
@@ -69,8 +71,6 @@ def test_authorize_endpoint_restricted_not_whitelist(mocker):
 
 
 def test_authorize_endpoint_public(mocker):
-    authorize_endpoint.cache_clear()
-
     mock_endpoint_find = mocker.patch.object(
         Endpoint,
         "find_by_uuid",
@@ -87,8 +87,6 @@ def test_authorize_endpoint_public(mocker):
 
 
 def test_authorize_endpoint_user(mocker):
-    authorize_endpoint.cache_clear()
-
     mock_endpoint_find = mocker.patch.object(
         Endpoint,
         "find_by_uuid",
@@ -103,8 +101,6 @@ def test_authorize_endpoint_user(mocker):
 
 def test_authorize_endpoint_group(mocker):
 
-    authorize_endpoint.cache_clear()
-
     mock_endpoint_find = mocker.patch.object(
         Endpoint,
         "find_by_uuid",
@@ -128,12 +124,10 @@ def test_authorize_endpoint_group(mocker):
     assert result
     mock_endpoint_find.assert_called_with("123-45-566")
     mock_auth_group_find.assert_called_with("123-45-566")
-    mock_check_group_membership.assert_called_with("ttttt", ["my-group"])
+    mock_check_group_membership.assert_called_with("ttttt", ["my-group"], user_id=42)
 
 
 def test_authorize_endpoint_no_group(mocker):
-    authorize_endpoint.cache_clear()
-
     mock_endpoint_find = mocker.patch.object(
         Endpoint,
         "find_by_uuid",
@@ -159,8 +153,6 @@ def test_authorize_endpoint_no_group(mocker):
 
 
 def test_authorize_function_user_owns(mocker):
-    authorize_function.cache_clear()
-
     mock_function_find = mocker.patch.object(
         Function, "find_by_uuid", return_value=Function(public=False, user_id=44)
     )
@@ -170,8 +162,6 @@ def test_authorize_function_user_owns(mocker):
 
 
 def test_authorize_function_public(mocker):
-    authorize_function.cache_clear()
-
     mock_function_find = mocker.patch.object(
         Function, "find_by_uuid", return_value=Function(public=True, user_id=1)
     )
@@ -181,8 +171,6 @@ def test_authorize_function_public(mocker):
 
 
 def test_authorize_function_auth_group(mocker):
-    authorize_function.cache_clear()
-
     mock_function_find = mocker.patch.object(
         Function, "find_by_uuid", return_value=Function(public=False, user_id=1)
     )
@@ -202,4 +190,45 @@ def test_authorize_function_auth_group(mocker):
     result = authorize_function(user_id=44, function_uuid="123", token="ttttt")
     assert result
     mock_function_find.assert_called_with("123")
-    mock_check_group_membership.assert_called_with("ttttt", ["my-group"])
+    mock_check_group_membership.assert_called_with("ttttt", ["my-group"], user_id=44)
+
+
+@pytest.fixture
+def group_membership_cache(flask_app):
+    cache = GroupMembershipCache(None)
+    old_cache = flask_app.extensions["GroupMembershipCache"]
+    flask_app.extensions["GroupMembershipCache"] = cache
+    yield cache
+    flask_app.extensions["GroupMembershipCache"] = old_cache
+
+
+def test_check_group_membership_cached_by_user(group_membership_cache, mocker):
+    mock_get_group_ids = mocker.patch.object(
+        funcx_web_service.authentication.auth,
+        "_get_user_group_ids",
+        return_value={"my-group", "other-group"},
+    )
+
+    assert check_group_membership("t1", ["my-group"], user_id=42)
+    # a different token for the same user doesn't need another Groups call
+    assert not check_group_membership("t2", ["not-my-group"], user_id=42)
+    assert mock_get_group_ids.call_count == 1
+
+    assert check_group_membership("t3", ["my-group"], user_id=43)
+    assert mock_get_group_ids.call_count == 2
+    assert group_membership_cache.stats["local_hits"] == 1
+
+
+def test_check_group_membership_without_user_is_not_cached(
+    group_membership_cache, mocker
+):
+    mock_get_group_ids = mocker.patch.object(
+        funcx_web_service.authentication.auth,
+        "_get_user_group_ids",
+        return_value={"my-group"},
+    )
+
+    assert check_group_membership("t1", ["my-group"])
+    assert check_group_membership("t1", ["my-group"])
+    assert mock_get_group_ids.call_count == 2
+    assert len(group_membership_cache.local) == 0
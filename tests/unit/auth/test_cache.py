@@ -0,0 +1,90 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from funcx_web_service.authentication.cache import LocalTTLCache, TwoTierCache
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalTTLCache(maxsize=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3, ttl=60)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_local_cache_expires_entries(mocker):
+    clock = mocker.patch("time.monotonic", return_value=1000.0)
+    cache = LocalTTLCache(maxsize=10)
+    cache.set("a", 1, ttl=5)
+
+    clock.return_value = 1004.0
+    assert cache.get("a") == 1
+    clock.return_value = 1005.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_two_tier_cache_fills_local_tier_from_redis(mock_redis_server):
+    def _redis():
+        return fakeredis.FakeStrictRedis(server=mock_redis_server)
+
+    TwoTierCache("test", _redis()).set("k", {"v": 1}, ttl=60)
+    cache = TwoTierCache("test", _redis())
+
+    assert cache.get("k") == {"v": 1}
+    assert cache.get("k") == {"v": 1}
+    assert cache.stats == {"local_hits": 1, "shared_hits": 1, "misses": 0, "errors": 0}
+    assert cache.get("other") is None
+    assert cache.stats["misses"] == 1
+
+
+@pytest.mark.parametrize("shared_redis", [False, True])
+def test_get_or_load_single_flight(mock_redis_server, shared_redis):
+    # with shared_redis, each thread has its own cache over the same redis, as
+    # separate workers would; otherwise the threads share one in-process cache
+    def _cache():
+        return TwoTierCache("test", fakeredis.FakeStrictRedis(server=mock_redis_server))
+
+    shared_cache = _cache()
+    calls = []
+    start = threading.Barrier(8)
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return ["g1", "g2"]
+
+    def worker(results):
+        cache = _cache() if shared_redis else shared_cache
+        start.wait()
+        results.append(cache.get_or_load("user", loader, ttl=60))
+
+    results = []
+    threads = [threading.Thread(target=worker, args=(results,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [["g1", "g2"]] * 8
+    assert len(calls) == 1
+
+
+def test_get_or_load_does_not_cache_errors():
+    cache = TwoTierCache("test", None)
+
+    def failing_loader():
+        raise ValueError("groups api is down")
+
+    with pytest.raises(ValueError):
+        cache.get_or_load("user", failing_loader, ttl=60)
+    assert cache.get_or_load("user", lambda: ["g1"], ttl=60) == ["g1"]
+    assert cache._key_locks == {}
@@ -0,0 +1,55 @@
+import pytest
+import responses
+
+from funcx_web_service.authentication.globus_auth import (
+    GlobusClients,
+    get_auth_client,
+)
+from funcx_web_service.models.search import SEARCH_SCOPE, get_search_client
+
+TOKEN_URL = "https://auth.globus.org/v2/oauth2/token"
+
+
+@pytest.fixture
+def globus_clients(flask_app, flask_app_ctx):
+    # start each test without clients created by another
+    clients = GlobusClients(flask_app)
+    old_clients = flask_app.extensions["GlobusClients"]
+    flask_app.extensions["GlobusClients"] = clients
+    yield clients
+    flask_app.extensions["GlobusClients"] = old_clients
+
+
+def test_auth_client_is_reused(globus_clients):
+    assert get_auth_client() is get_auth_client()
+
+
+def test_auth_client_is_recreated_after_fork(globus_clients, mocker):
+    client = get_auth_client()
+
+    mocker.patch("os.getpid", return_value=-1)
+    forked_client = get_auth_client()
+
+    assert forked_client is not client
+    assert get_auth_client() is forked_client
+
+
+def test_search_token_is_reused(globus_clients, mocked_responses):
+    mocked_responses.add(
+        responses.POST,
+        TOKEN_URL,
+        json={
+            "access_token": "search-token",
+            "scope": SEARCH_SCOPE,
+            "expires_in": 172800,
+            "token_type": "Bearer",
+            "resource_server": "search.api.globus.org",
+            "other_tokens": [],
+        },
+    )
+
+    search_client = get_search_client()
+
+    assert get_search_client() is search_client
+    assert len(mocked_responses.calls) == 1
+    assert search_client.authorizer.access_token == "search-token"
@@ -42,22 +42,25 @@ def test_version(
 
 
 def test_stats(flask_test_client, mocker, mock_redis):
-    mock_redis.set("funcx_invocation_counter", 1024)
-    spy = mocker.spy(mock_redis, "get")
+    # counted before the counter was split, and since
+    mock_redis.set("funcx_invocation_counter", 1000)
+    mock_redis.set("funcx_invocation_counter_3", 20)
+    mock_redis.set("funcx_invocation_counter_15", 4)
+    spy = mocker.spy(mock_redis, "pipeline")
 
     result = flask_test_client.get("/api/v1/stats")
     assert result.status_code == 200
     assert result.json["total_function_invocations"] == 1024
 
-    spy.assert_called_once_with("funcx_invocation_counter")
+    spy.assert_called_once()
 
 
 def test_stats_malformed_underlying_data(flask_test_client, mocker, mock_redis):
     mock_redis.set("funcx_invocation_counter", "foo")
-    spy = mocker.spy(mock_redis, "get")
+    spy = mocker.spy(mock_redis, "pipeline")
 
     result = flask_test_client.get("/api/v1/stats")
     assert result.status_code == 500
     assert b"Unable to get invocation count" in result.data
 
-    spy.assert_called_once_with("funcx_invocation_counter")
+    spy.assert_called_once()
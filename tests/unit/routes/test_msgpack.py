@@ -0,0 +1,70 @@
+import pytest
+
+from funcx_web_service.models.batch import SubmitBatchLookup
+from funcx_web_service.models.tasks import RedisTask
+
+msgpack = pytest.importorskip("msgpack")
+
+MSGPACK_HEADERS = {
+    "Authorization": "my_token",
+    "Content-Type": "application/msgpack",
+    "Accept": "application/msgpack",
+}
+
+
+def test_submit_msgpack(flask_test_client, mocker, in_mock_auth_state, mock_redis):
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        data=msgpack.packb({"tasks": [["12", "13", "00\nmy_data"]]}),
+        headers=MSGPACK_HEADERS,
+    )
+
+    assert result.status_code == 200
+    assert result.mimetype == "application/msgpack"
+    submit_result = msgpack.unpackb(result.get_data())
+    assert submit_result["response"] == "batch"
+    (res,) = submit_result["results"]
+    assert res["status"] == "Success"
+    assert RedisTask(mock_redis, res["task_uuid"]).payload == "codecode00\nmy_data"
+
+
+def test_batch_status_msgpack(
+    flask_test_client, in_mock_auth_state, mock_redis_task_factory
+):
+    task = mock_redis_task_factory("1")
+    task.result = "00\nresult"
+
+    result = flask_test_client.post(
+        "/api/v1/batch_status",
+        data=msgpack.packb({"task_ids": ["1", "2"]}),
+        headers=MSGPACK_HEADERS,
+    )
+
+    results = msgpack.unpackb(result.get_data())["results"]
+    assert results["1"]["result"] == "00\nresult"
+    assert results["2"]["reason"] == "Unknown task id"
+
+    # the same request, answered in JSON
+    result = flask_test_client.post(
+        "/api/v1/batch_status",
+        data=msgpack.packb({"task_ids": ["2"]}),
+        headers={**MSGPACK_HEADERS, "Accept": "application/json"},
+    )
+    assert result.json["results"]["2"]["reason"] == "Unknown task id"
+
+
+def test_invalid_msgpack(flask_test_client, in_mock_auth_state, mock_redis):
+    result = flask_test_client.post(
+        "/api/v1/batch_status", data=b"\xc1", headers=MSGPACK_HEADERS
+    )
+
+    assert result.status_code == 400
+    assert "msgpack" in result.json["reason"]
@@ -1,7 +1,19 @@
-from unittest import mock
+import json
+import threading
+import time
 
-from funcx_web_service.models.tasks import RedisTask
+import fakeredis
+import pytest
+import requests
+import responses
+from funcx_common.task_storage import get_default_task_storage
+
+from funcx_web_service.models.redis_replicas import ReplicaReader
+from funcx_web_service.models.storage_codec import compress
+from funcx_web_service.models.task_waiter import TaskWaiter
+from funcx_web_service.models.tasks import TaskSnapshot
 from funcx_web_service.models.user import User
+from tests.conftest import TEST_SERIALIZATION_ADDR
 
 
 def test_get_status(
@@ -58,7 +70,12 @@ def test_get_batch_status(
 
 
 def test_unauthorized_get_batch_status(
-    flask_test_client, mocker, in_mock_auth_state, mock_redis_task_factory, mock_redis
+    flask_test_client,
+    mocker,
+    in_mock_auth_state,
+    mock_redis_task_factory,
+    mock_redis,
+    mock_user: User,
 ):
     """
     Verify that a user cannot retrieve a status for a Batch which is not theirs
@@ -66,7 +83,7 @@ def test_unauthorized_get_batch_status(
     mock_redis_task_factory("1", user_id=123)
     mock_redis_task_factory("2", user_id=123)
 
-    exists_spy = mocker.spy(RedisTask, "exists")
+    fetch_many_spy = mocker.spy(TaskSnapshot, "fetch_many")
 
     result = flask_test_client.post(
         "/api/v1/batch_status",
@@ -82,6 +99,393 @@ def test_unauthorized_get_batch_status(
         assert result.json["results"][task_id]["reason"] == "Unknown task id"
         assert result.json["results"][task_id]["status"] == "Failed"
 
-    exists_spy.assert_has_calls(
-        [mock.call(mock_redis, "1"), mock.call(mock_redis, "2")]
+    fetch_many_spy.assert_called_once_with(mock_redis, ["1", "2"], mock_user.id)
+    # tasks which are not the user's are left alone
+    assert mock_redis.exists("task_1", "task_2") == 2
+
+
+def test_get_batch_status_deserialize(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    mock_serialization_service,
+):
+    for task_id in ("1", "2", "3"):
+        mock_redis_task_factory(task_id)
+    mock_redis.hset("task_1", "result", "result-1")
+    mock_redis.hset("task_3", "result", "result-3")
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["1", "2", "3"], "deserialize": True},
+    )
+
+    results = response.json["results"]
+    assert results["1"]["result"] == "deserialize:result-1"
+    assert "result" not in results["2"]
+    assert results["3"]["result"] == "deserialize:result-3"
+    assert len(mock_serialization_service.calls) == 2
+
+
+def test_get_batch_status_deserialize_failure(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    mocked_responses,
+):
+    def callback(request):
+        if json.loads(request.body) == "result-1":
+            raise requests.ConnectionError("serializer is down")
+        return 200, {}, json.dumps(f"deserialize:{json.loads(request.body)}")
+
+    mocked_responses.add_callback(
+        responses.POST,
+        f"http://{TEST_SERIALIZATION_ADDR}:8000/deserialize",
+        callback=callback,
+    )
+    for task_id in ("1", "2"):
+        mock_redis_task_factory(task_id)
+        mock_redis.hset(f"task_{task_id}", "result", f"result-{task_id}")
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["1", "2"], "deserialize": True},
+    )
+
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert results["1"]["result"] == "result-1"
+    assert results["2"]["result"] == "deserialize:result-2"
+
+
+def test_get_batch_status_reads_tasks_in_one_round_trip(
+    flask_test_client, in_mock_auth_state, mock_redis, mock_redis_task_factory, mocker
+):
+    for task_id in ("1", "2", "3"):
+        mock_redis_task_factory(task_id)
+    mock_redis.hset("task_1", "result", "result-1")
+    mock_redis.hset("task_3", "exception", "exception-3")
+
+    # the script is loaded into Redis by the first request to use it
+    flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["unknown"]},
+    )
+    pipeline_spy = mocker.spy(mock_redis, "pipeline")
+    evalsha_spy = mocker.spy(mock_redis, "evalsha")
+    ttl_spy = mocker.spy(mock_redis, "ttl")
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["1", "2", "3", "unknown"]},
+    )
+
+    results = response.json["results"]
+    assert results["1"]["result"] == "result-1"
+    assert "result" not in results["2"] and "exception" not in results["2"]
+    assert results["3"]["exception"] == "exception-3"
+    assert results["unknown"]["reason"] == "Unknown task id"
+
+    # one script call reads the tasks and deletes the completed ones
+    assert evalsha_spy.call_count == 1
+    pipeline_spy.assert_not_called()
+    ttl_spy.assert_not_called()
+    assert mock_redis.exists("task_1") == 0
+    assert mock_redis.exists("task_2") == 1
+    assert mock_redis.exists("task_3") == 0
+
+
+def test_get_batch_status_fetches_stored_results(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    mock_s3_bucket,
+    monkeypatch,
+):
+    monkeypatch.setenv("FUNCX_REDIS_STORAGE_THRESHOLD", "10")
+    storage = get_default_task_storage()
+    for task_id in ("1", "2", "3"):
+        task = mock_redis_task_factory(task_id)
+        storage.store_result(task, f"result-{task_id}" * (10 if task_id != "2" else 1))
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["1", "2", "3"]},
+    )
+
+    results = response.json["results"]
+    assert results["1"]["result"] == "result-1" * 10
+    assert results["2"]["result"] == "result-2"
+    assert results["3"]["result"] == "result-3" * 10
+    assert mock_redis.exists("task_1", "task_2", "task_3") == 0
+
+
+def test_get_status_result_url(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    mock_s3_bucket,
+    monkeypatch,
+):
+    monkeypatch.setenv("FUNCX_REDIS_STORAGE_THRESHOLD", "10")
+    storage = get_default_task_storage()
+    for task_id in ("1", "2"):
+        task = mock_redis_task_factory(task_id)
+        storage.store_result(task, f"result-{task_id}" * (10 if task_id == "1" else 1))
+
+    response = flask_test_client.get(
+        "/api/v1/tasks/1?result_url=True", headers={"Authorization": "my_token"}
+    )
+    assert "result" not in response.json
+    assert mock_s3_bucket in response.json["result_url"]
+    assert "1.result_reference" in response.json["result_url"]
+    assert mock_redis.exists("task_1") == 0
+
+    # results small enough to be kept in Redis are still returned inline
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["2"], "result_url": True},
+    )
+    assert response.json["results"]["2"]["result"] == "result-2"
+    assert "result_url" not in response.json["results"]["2"]
+
+
+def test_get_status_compressed_result(
+    flask_test_client, in_mock_auth_state, mock_redis_task_factory
+):
+    for task_id in ("1", "2"):
+        task = mock_redis_task_factory(task_id)
+        task.result = compress("result-" * 100, "zlib")
+        task.result_encoding = "zlib"
+
+    response = flask_test_client.get(
+        "/api/v1/tasks/1", headers={"Authorization": "my_token"}
+    )
+    assert response.json["result"] == "result-" * 100
+    assert "result_encoding" not in response.json
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["2"], "compressed": True},
+    )
+    result = response.json["results"]["2"]
+    assert result["result_encoding"] == "zlib"
+    assert result["result"] == compress("result-" * 100, "zlib")
+
+
+@pytest.fixture
+def task_waiter(flask_app, mock_redis, mocker):
+    task_waiter = TaskWaiter(flask_app, mock_redis, recheck_interval=10)
+    mocker.patch.dict(flask_app.extensions, {"TaskWaiter": task_waiter})
+    yield task_waiter
+    task_waiter.shutdown()
+
+
+def _complete_later(mock_redis, task_waiter, task_id, delay=0.2):
+    def complete():
+        mock_redis.hset(f"task_{task_id}", "result", f"result-{task_id}")
+        mock_redis.publish(task_waiter.channel(task_id), "hset")
+
+    threading.Timer(delay, complete).start()
+
+
+def test_get_status_waits_for_result(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    task_waiter,
+):
+    mock_redis_task_factory("42")
+    _complete_later(mock_redis, task_waiter, "42")
+
+    result = flask_test_client.get(
+        "/api/v1/tasks/42?wait=5", headers={"Authorization": "my_token"}
+    )
+
+    assert result.status_code == 200
+    assert result.json["result"] == "result-42"
+    assert not mock_redis.exists("task_42")
+
+
+def test_get_status_wait_times_out(
+    flask_test_client, in_mock_auth_state, mock_redis_task_factory, task_waiter
+):
+    mock_redis_task_factory("42")
+
+    start = time.monotonic()
+    result = flask_test_client.get(
+        "/api/v1/tasks/42?wait=0.3", headers={"Authorization": "my_token"}
+    )
+
+    assert time.monotonic() - start >= 0.3
+    assert result.status_code == 200
+    assert "result" not in result.json
+
+
+def test_get_status_does_not_wait_on_other_users_tasks(
+    flask_test_client, in_mock_auth_state, mock_redis_task_factory, task_waiter
+):
+    mock_redis_task_factory("42", user_id=123)
+
+    start = time.monotonic()
+    result = flask_test_client.get(
+        "/api/v1/tasks/42?wait=5", headers={"Authorization": "my_token"}
+    )
+
+    assert time.monotonic() - start < 1
+    assert result.status_code == 404
+
+
+def test_get_status_rejects_bad_wait(
+    flask_test_client, in_mock_auth_state, mock_redis_task_factory, task_waiter
+):
+    mock_redis_task_factory("42")
+    result = flask_test_client.get(
+        "/api/v1/tasks/42?wait=soon", headers={"Authorization": "my_token"}
+    )
+    assert result.status_code == 400
+
+
+def test_get_batch_status_waits_for_any_result(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    task_waiter,
+):
+    mock_redis_task_factory("1")
+    mock_redis_task_factory("2")
+    _complete_later(mock_redis, task_waiter, "2")
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["1", "2"], "wait": 5},
+    )
+
+    results = response.json["results"]
+    assert "result" not in results["1"]
+    assert results["2"]["result"] == "result-2"
+
+
+def test_get_batch_status_ndjson(
+    flask_app,
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    mocker,
+):
+    mocker.patch.dict(flask_app.config, {"BATCH_STATUS_STREAM_CHUNK_SIZE": 2})
+    for task_id in ("1", "2", "3"):
+        mock_redis_task_factory(task_id)
+    mock_redis.hset("task_3", "result", "result-3")
+    fetch_many_spy = mocker.spy(TaskSnapshot, "fetch_many")
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token", "Accept": "application/x-ndjson"},
+        json={"task_ids": ["1", "2", "3", "unknown"]},
     )
+
+    assert response.mimetype == "application/x-ndjson"
+    header, *lines = [json.loads(line) for line in response.data.splitlines()]
+    assert header == {"response": "batch"}
+    assert [line["task_id"] for line in lines] == ["1", "2", "3", "unknown"]
+    assert lines[2]["result"] == "result-3"
+    assert lines[3]["reason"] == "Unknown task id"
+    assert fetch_many_spy.call_count == 2
+    assert not mock_redis.exists("task_3")
+
+
+def test_get_batch_status_restores_tasks_when_results_fail(
+    flask_test_client, in_mock_auth_state, mock_redis, mock_redis_task_factory, mocker
+):
+    mock_redis_task_factory("1")
+    mock_redis.hset("task_1", "result", "result-1")
+    mocker.patch(
+        "funcx_web_service.routes.funcx.get_task_results",
+        side_effect=RuntimeError("storage is down"),
+    )
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["1"]},
+    )
+
+    assert response.status_code == 500
+    assert mock_redis.hget("task_1", "result") == "result-1"
+
+
+@pytest.fixture
+def mock_replica(flask_app, mocker):
+    replica = fakeredis.FakeStrictRedis(
+        server=fakeredis.FakeServer(), decode_responses=True
+    )
+    reader = ReplicaReader([replica])
+    mocker.patch.object(reader, "_is_fresh", return_value=True)
+    mocker.patch.dict(flask_app.extensions, {"RedisReplicaReader": reader})
+    return replica
+
+
+def _replicate(mock_redis, replica, task_id):
+    replica.hset(f"task_{task_id}", mapping=mock_redis.hgetall(f"task_{task_id}"))
+
+
+def test_get_status_reads_incomplete_tasks_from_replica(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    mock_replica,
+):
+    mock_redis_task_factory("42")
+    _replicate(mock_redis, mock_replica, "42")
+    mock_replica.hset("task_42", "status", "running")
+
+    result = flask_test_client.get(
+        "/api/v1/tasks/42", headers={"Authorization": "my_token"}
+    )
+
+    assert result.json["status"] == "running"
+    assert mock_redis.exists("task_42")
+
+
+def test_get_batch_status_fetches_completed_tasks_from_primary(
+    flask_test_client,
+    in_mock_auth_state,
+    mock_redis,
+    mock_redis_task_factory,
+    mock_replica,
+):
+    mock_redis_task_factory("42")
+    mock_redis.hset("task_42", "result", "result-42")
+    _replicate(mock_redis, mock_replica, "42")
+    # not yet replicated
+    mock_redis_task_factory("43")
+
+    response = flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token"},
+        json={"task_ids": ["42", "43"]},
+    )
+
+    results = response.json["results"]
+    assert results["42"]["result"] == "result-42"
+    assert results["43"]["status"] == "waiting-for-ep"
+    # the primary's copy is deleted, and the replica's goes once it replicates that
+    assert not mock_redis.exists("task_42")
+    assert mock_replica.exists("task_42")
@@ -1,13 +1,28 @@
+import json
+
+import boto3
+import pytest
 from funcx_common.response_errors import ResponseErrorCode
+from funcx_common.task_storage import (
+    RedisS3Storage,
+    StorageException,
+    get_default_task_storage,
+)
 
-from funcx_web_service.models.tasks import TaskGroup
+from funcx_web_service.models.batch import SubmitBatchLookup
+from funcx_web_service.models.endpoint import Endpoint
+from funcx_web_service.models.function import Function
+from funcx_web_service.models.function_bodies import resolve_task_payload
+from funcx_web_service.models.invocation_counter import read_invocation_count
+from funcx_web_service.models.storage_codec import CompressingTaskStorage
+from funcx_web_service.models.tasks import RedisTask, RedisTaskBatch, TaskGroup
 
 
 def test_submit_function_access_forbidden(
     flask_test_client, mocker, in_mock_auth_state
 ):
-    mock_authorize_function = mocker.patch(
-        "funcx_web_service.routes.funcx.authorize_function", return_value=False
+    mock_authorize_function = mocker.patch.object(
+        SubmitBatchLookup, "authorize_function", return_value=False
     )
 
     mocker.patch.object(TaskGroup, attribute="exists", return_value=False)
@@ -30,9 +45,10 @@ def test_submit_function_access_forbidden(
 
 def test_submit_function_not_found(flask_test_client, mocker, in_mock_auth_state):
 
-    mock_find_function = mocker.patch(
-        "funcx_web_service.authentication.auth.Function.find_by_uuid",
-        return_value=None,
+    mock_find_function = mocker.patch.object(
+        Function,
+        "find_by_uuids",
+        return_value=[],
     )
 
     mocker.patch.object(TaskGroup, attribute="exists", return_value=False)
@@ -56,17 +72,18 @@ def test_submit_function_not_found(flask_test_client, mocker, in_mock_auth_state
 def test_submit_endpoint_access_forbidden(
     flask_test_client, mocker, in_mock_auth_state
 ):
-    mock_authorize_function = mocker.patch(
-        "funcx_web_service.routes.funcx.authorize_function", return_value=True
+    mock_authorize_function = mocker.patch.object(
+        SubmitBatchLookup, "authorize_function", return_value=True
     )
 
-    mock_resolve_function = mocker.patch(
-        "funcx_web_service.routes.funcx.resolve_function",
+    mock_resolve_function = mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
         return_value=("1", "2", "3"),
     )
 
-    mock_authorize_endpoint = mocker.patch(
-        "funcx_web_service.routes.funcx.authorize_endpoint", return_value=False
+    mock_authorize_endpoint = mocker.patch.object(
+        SubmitBatchLookup, "authorize_endpoint", return_value=False
     )
 
     mocker.patch.object(TaskGroup, attribute="exists", return_value=False)
@@ -90,18 +107,20 @@ def test_submit_endpoint_access_forbidden(
 
 
 def test_submit_endpoint_not_found(flask_test_client, mocker, in_mock_auth_state):
-    mock_authorize_function = mocker.patch(
-        "funcx_web_service.routes.funcx.authorize_function", return_value=True
+    mock_authorize_function = mocker.patch.object(
+        SubmitBatchLookup, "authorize_function", return_value=True
     )
 
-    mock_resolve_function = mocker.patch(
-        "funcx_web_service.routes.funcx.resolve_function",
+    mock_resolve_function = mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
         return_value=("1", "2", "3"),
     )
 
-    mock_find_endpoint = mocker.patch(
-        "funcx_web_service.authentication.auth.Endpoint.find_by_uuid",
-        return_value=None,
+    mock_find_endpoint = mocker.patch.object(
+        Endpoint,
+        "find_by_uuids",
+        return_value=[],
     )
 
     mocker.patch.object(TaskGroup, attribute="exists", return_value=False)
@@ -127,25 +146,27 @@ def test_submit_endpoint_not_found(flask_test_client, mocker, in_mock_auth_state
 def test_submit_function_not_permitted(
     flask_test_client, mocker, in_mock_auth_state, mock_endpoint
 ):
-    mock_authorize_function = mocker.patch(
-        "funcx_web_service.routes.funcx.authorize_function", return_value=True
+    mock_authorize_function = mocker.patch.object(
+        SubmitBatchLookup, "authorize_function", return_value=True
     )
 
-    mock_resolve_function = mocker.patch(
-        "funcx_web_service.routes.funcx.resolve_function",
+    mock_resolve_function = mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
         return_value=("1", "2", "3"),
     )
 
-    mock_find_endpoint = mocker.patch(
-        "funcx_web_service.authentication.auth.Endpoint.find_by_uuid",
-        return_value=mock_endpoint,
+    mock_find_endpoint = mocker.patch.object(
+        Endpoint,
+        "find_by_uuids",
+        return_value=[mock_endpoint],
     )
 
     mocker.patch.object(TaskGroup, attribute="exists", return_value=False)
 
     result = flask_test_client.post(
         "api/v1/submit",
-        json={"tasks": [("1111", "2222", "")]},
+        json={"tasks": [("1111", mock_endpoint.endpoint_uuid, "")]},
         headers={"Authorization": "my_token"},
     )
 
@@ -158,20 +179,21 @@ def test_submit_function_not_permitted(
     assert res["http_status_code"] == 403
     assert res["status"] == "Failed"
     assert res["code"] == int(ResponseErrorCode.FUNCTION_NOT_PERMITTED)
-    assert res["reason"] == "Function 1111 not permitted on endpoint 2222"
+    assert res["reason"] == (
+        f"Function 1111 not permitted on endpoint {mock_endpoint.endpoint_uuid}"
+    )
 
 
-def test_submit_function(
-    flask_test_client, mocker, in_mock_auth_state, mock_redis_pubsub, mock_redis
-):
-    mock_function_auth = mocker.patch(
-        "funcx_web_service.routes.funcx.authorize_function", return_value=True
+def test_submit_function(flask_test_client, mocker, in_mock_auth_state, mock_redis):
+    mock_function_auth = mocker.patch.object(
+        SubmitBatchLookup, "authorize_function", return_value=True
     )
-    mock_endpoint_auth = mocker.patch(
-        "funcx_web_service.routes.funcx.authorize_endpoint", return_value=True
+    mock_endpoint_auth = mocker.patch.object(
+        SubmitBatchLookup, "authorize_endpoint", return_value=True
     )
-    mock_resolve = mocker.patch(
-        "funcx_web_service.routes.funcx.resolve_function",
+    mock_resolve = mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
         return_value=("codecode", "entry", "123-45"),
     )
 
@@ -189,7 +211,358 @@ def test_submit_function(
 
     mock_function_auth.assert_called_with(22, "12", "my_token")
     mock_endpoint_auth.assert_called_with(22, "13", "12", "my_token")
-    mock_resolve.assert_called_with(22, "12")
+    mock_resolve.assert_called_with("12")
+
+    # with no endpoint subscribed, the task is queued for endpoint "13"
+    task_uuid = submit_result["results"][0]["task_uuid"]
+    assert mock_redis.lrange("task_queue_13", 0, -1) == [task_uuid]
+    assert mock_redis.hget(f"task_{task_uuid}", "endpoint") == "13"
+    assert read_invocation_count(mock_redis) == 1
+
+
+def test_submit_batch_write_failure(
+    flask_test_client, mocker, in_mock_auth_state, mock_redis
+):
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+    mocker.patch.object(
+        RedisTaskBatch, "execute", side_effect=ConnectionError("redis is down")
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={"tasks": [["12", "13", "my_data"], ["12", "13", "more_data"]]},
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 207
+    for res in result.json["results"]:
+        assert res["status"] == "Failed"
+        assert res["http_status_code"] == 500
+        assert "redis is down" in res["reason"]
+        assert not mock_redis.exists(f"task_{res['task_uuid']}")
+    assert read_invocation_count(mock_redis) == 0
+
+
+def test_submit_batch_partial_write_failure(
+    flask_test_client, mocker, in_mock_auth_state, mock_redis
+):
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+    mocker.patch.object(RedisTaskBatch, "CHUNK_SIZE", 2)
+    write_chunk = RedisTaskBatch._execute_pipeline
+    calls = []
+
+    def fail_second_chunk(batch, chunk):
+        calls.append(chunk)
+        if len(calls) == 2:
+            raise ConnectionError("redis is down")
+        return write_chunk(batch, chunk)
+
+    mocker.patch.object(RedisTaskBatch, "_execute_pipeline", fail_second_chunk)
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={"tasks": [["12", "13", f"data-{i}"] for i in range(5)]},
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 207
+    results = result.json["results"]
+    # the first chunk was sent before the second failed, and the third never was
+    for res in results[:2]:
+        assert res["status"] == "Success"
+        assert mock_redis.exists(f"task_{res['task_uuid']}")
+    for res in results[2:]:
+        assert res["status"] == "Failed"
+        assert "redis is down" in res["reason"]
+        assert not mock_redis.exists(f"task_{res['task_uuid']}")
+    assert len(calls) == 2
+    assert read_invocation_count(mock_redis) == 2
+    assert mock_redis.lrange("task_queue_13", 0, -1) == [
+        res["task_uuid"] for res in results[:2]
+    ]
+
+
+def test_submit_function_deduplicates_function_bodies(
+    flask_app, flask_test_client, mocker, in_mock_auth_state, mock_redis, monkeypatch
+):
+    monkeypatch.setitem(flask_app.config, "DEDUPLICATE_FUNCTION_BODIES", True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={"tasks": [["12", "13", f"data-{i}"] for i in range(3)]},
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 200
+    (body_key,) = mock_redis.keys("function_body_*")
+    assert mock_redis.hgetall(body_key) == {"body": "codecode", "refs": "3"}
+    for i, res in enumerate(result.json["results"]):
+        task = RedisTask(mock_redis, res["task_uuid"])
+        assert task.payload == f"data-{i}"
+        assert body_key == f"function_body_{task.function_body_id}"
+
+
+def test_submit_uploaded_payloads(
+    flask_app,
+    flask_test_client,
+    mocker,
+    in_mock_auth_state,
+    mock_redis,
+    mock_s3_bucket,
+    monkeypatch,
+):
+    monkeypatch.setitem(flask_app.config, "DEDUPLICATE_FUNCTION_BODIES", True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/payload_uploads",
+        json={"count": 1},
+        headers={"Authorization": "my_token"},
+    )
+    assert result.status_code == 200
+    (upload,) = result.json["uploads"]
+    assert upload["fields"]["key"] == f"payload_uploads/22/{upload['upload_id']}"
+    # as the client would with the presigned POST
+    boto3.client("s3").put_object(
+        Bucket=mock_s3_bucket, Key=upload["fields"]["key"], Body=b"uploaded-data"
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={
+            "tasks": [
+                ["12", "13", {"upload_id": upload["upload_id"]}],
+                ["12", "13", {"upload_id": "not-an-upload"}],
+                ["12", "13", {"upload_id": "2a0e2ad3-08b3-4d3a-9b3b-94b3e2b8e1ae"}],
+            ]
+        },
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 207
+    uploaded, invalid, missing = result.json["results"]
+    assert uploaded["status"] == "Success"
+    task = RedisTask(mock_redis, uploaded["task_uuid"])
+    assert task.payload is None
+    storage = get_default_task_storage()
+    assert resolve_task_payload(mock_redis, task, storage) == "codecodeuploaded-data"
+    for res in (invalid, missing):
+        assert res["status"] == "Failed"
+        assert res["http_status_code"] == 400
+        assert not mock_redis.exists(f"task_{res['task_uuid']}")
+
+
+def test_submit_payload_storage_failures(
+    flask_test_client,
+    mocker,
+    in_mock_auth_state,
+    mock_redis,
+    mock_s3_bucket,
+    monkeypatch,
+):
+    monkeypatch.setenv("FUNCX_REDIS_STORAGE_THRESHOLD", "10")
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+    store_payload = RedisS3Storage.store_payload
+
+    def _store_payload(storage, task, payload):
+        if "bad" in payload:
+            raise StorageException("s3 is down")
+        store_payload(storage, task, payload)
+
+    mocker.patch.object(RedisS3Storage, "store_payload", _store_payload)
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={
+            "tasks": [
+                ["12", "13", "good-data-0"],
+                ["12", "13", "bad-data"],
+                ["12", "13", "good-data-1"],
+            ]
+        },
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 207
+    first, failed, second = result.json["results"]
+    assert failed["status"] == "Failed"
+    assert failed["http_status_code"] == 500
+    assert not mock_redis.exists(f"task_{failed['task_uuid']}")
+    # the others are still sent, in the order they were submitted
+    assert mock_redis.lrange("task_queue_13", 0, -1) == [
+        first["task_uuid"],
+        second["task_uuid"],
+    ]
+    task = RedisTask(mock_redis, first["task_uuid"])
+    assert get_default_task_storage().get_payload(task) == "codecodegood-data-0"
+    assert read_invocation_count(mock_redis) == 2
+
+
+@pytest.mark.parametrize("compress_payloads", (False, True))
+def test_submit_function_compresses_payloads(
+    flask_app,
+    flask_test_client,
+    mocker,
+    in_mock_auth_state,
+    mock_redis,
+    monkeypatch,
+    compress_payloads,
+):
+    monkeypatch.setitem(flask_app.config, "TASK_STORAGE_COMPRESSION", "zlib")
+    monkeypatch.setitem(flask_app.config, "TASK_STORAGE_COMPRESSION_THRESHOLD", 100)
+    monkeypatch.setitem(
+        flask_app.config, "TASK_STORAGE_COMPRESS_PAYLOADS", compress_payloads
+    )
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={"tasks": [["12", "13", "data-" * 100], ["12", "13", "small"]]},
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 200
+    large, small = [
+        RedisTask(mock_redis, res["task_uuid"]) for res in result.json["results"]
+    ]
+    # payloads are only compressed once the forwarder can decode them
+    assert large.payload_encoding == ("zlib" if compress_payloads else None)
+    storage = CompressingTaskStorage(get_default_task_storage())
+    assert (
+        resolve_task_payload(mock_redis, large, storage) == "codecode" + "data-" * 100
+    )
+    assert small.payload_encoding is None
+    assert small.payload == "codecodesmall"
 
-    put_call = mock_redis_pubsub.put.call_args
-    assert put_call[0][0] == "13"
+
+def test_submit_function_without_change_recorder(
+    flask_app, flask_test_client, mocker, in_mock_auth_state, mock_redis
+):
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", "123-45"),
+    )
+    # asked for, but not being kept up to date, e.g. with REDIS_SHARDS
+    flask_app.config["TASK_CHANGE_FEED"] = True
+    assert flask_app.extensions["TaskChangeRecorder"] is None
+    batch = mocker.patch(
+        "funcx_web_service.routes.funcx.RedisTaskBatch", wraps=RedisTaskBatch
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={"tasks": [["12", "13", "my_data"]]},
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 200
+    assert result.json["results"][0]["status"] == "Success"
+    assert batch.call_args.kwargs["record_changes"] is False
+
+
+def test_submit_function_serialize(
+    flask_test_client,
+    mocker,
+    in_mock_auth_state,
+    mock_redis,
+    mock_serialization_service,
+):
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={
+            "tasks": [["12", "13", f"data-{i}"] for i in range(3)],
+            "serialize": True,
+        },
+        headers={"Authorization": "my_token"},
+    )
+
+    assert result.status_code == 200
+    assert len(mock_serialization_service.calls) == 3
+    for i, res in enumerate(result.json["results"]):
+        task = RedisTask(mock_redis, res["task_uuid"])
+        assert task.payload == f"codecodeserialize:data-{i}"
+
+
+def test_submit_function_ndjson(
+    flask_app, flask_test_client, mocker, in_mock_auth_state, mock_redis, monkeypatch
+):
+    monkeypatch.setitem(flask_app.config, "SUBMIT_STREAM_CHUNK_SIZE", 2)
+    mocker.patch.object(SubmitBatchLookup, "authorize_function", return_value=True)
+    mocker.patch.object(SubmitBatchLookup, "authorize_endpoint", return_value=True)
+    mocker.patch.object(
+        SubmitBatchLookup,
+        "resolve_function",
+        return_value=("codecode", "entry", None),
+    )
+    execute_spy = mocker.spy(RedisTaskBatch, "execute")
+
+    result = flask_test_client.post(
+        "/api/v1/submit",
+        json={
+            "tasks": [["12", "13", f"data-{i}"] for i in range(5)],
+            "task_group_id": "00000000-0000-0000-0000-000000000001",
+        },
+        headers={"Authorization": "my_token", "Accept": "application/x-ndjson"},
+    )
+
+    assert result.status_code == 200
+    assert result.mimetype == "application/x-ndjson"
+    header, *lines = [json.loads(line) for line in result.data.splitlines()]
+    assert header == {
+        "response": "batch",
+        "task_group_id": "00000000-0000-0000-0000-000000000001",
+    }
+    assert [line["status"] for line in lines] == ["Success"] * 5
+    for i, line in enumerate(lines):
+        assert RedisTask(mock_redis, line["task_uuid"]).payload == f"codecodedata-{i}"
+    # the tasks were written in chunks of 2
+    assert execute_spy.call_count == 3
+    assert TaskGroup.exists(mock_redis, "00000000-0000-0000-0000-000000000001")
@@ -1,3 +1,8 @@
+import json
+import threading
+
+import pytest
+
 from funcx_web_service.models.tasks import TaskGroup
 
 
@@ -12,3 +17,144 @@ def test_get_batch_info(
     )
     assert result.json["authorized"]
     exists_spy.assert_called_with(mock_redis, "123")
+
+
+@pytest.fixture
+def short_streams(flask_app, mocker):
+    mocker.patch.dict(
+        flask_app.config,
+        {
+            "TASK_GROUP_EVENTS_DURATION": 0.5,
+            "TASK_GROUP_EVENTS_HEARTBEAT": 0.1,
+            "TASK_WAIT_RECHECK_INTERVAL": 0.05,
+        },
+    )
+
+
+@pytest.fixture
+def task_group(mock_redis, mock_user, mock_redis_task_factory):
+    task_group = TaskGroup(mock_redis, "123", user_id=mock_user.id)
+    for task_id in ("1", "2", "3"):
+        mock_redis_task_factory(task_id).task_group_id = "123"
+    mock_redis.rpush(TaskGroup.members_key("123"), "1", "2", "3")
+    return task_group
+
+
+def _events(response):
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if block.startswith("id: "):
+            lines = dict(line.split(": ", 1) for line in block.splitlines())
+            events.append((int(lines["id"]), json.loads(lines["data"])))
+    return events
+
+
+def test_get_task_group_events(
+    flask_test_client, in_mock_auth_state, mock_redis, task_group, short_streams
+):
+    mock_redis.hset("task_2", "result", "result-2")
+    threading.Timer(
+        0.2, lambda: mock_redis.hset("task_3", "exception", "exception-3")
+    ).start()
+
+    response = flask_test_client.get(
+        "/api/v1/task_groups/123/events", headers={"Authorization": "my_token"}
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = _events(response)
+    assert [event_id for event_id, _ in events] == [0, 1]
+    assert events[0][1]["task_id"] == "2"
+    assert events[0][1]["result"] == "result-2"
+    assert events[1][1]["task_id"] == "3"
+    assert events[1][1]["exception"] == "exception-3"
+    # the results can still be fetched
+    assert mock_redis.exists("task_2", "task_3") == 2
+
+
+def test_get_task_group_events_resumes(
+    flask_test_client, in_mock_auth_state, mock_redis, task_group, short_streams
+):
+    mock_redis.hset("task_1", "result", "result-1")
+    mock_redis.hset("task_3", "result", "result-3")
+    first = _events(
+        flask_test_client.get(
+            "/api/v1/task_groups/123/events", headers={"Authorization": "my_token"}
+        )
+    )
+    assert [data["task_id"] for _, data in first] == ["1", "3"]
+
+    mock_redis.hset("task_2", "result", "result-2")
+    resumed = _events(
+        flask_test_client.get(
+            "/api/v1/task_groups/123/events",
+            headers={"Authorization": "my_token", "Last-Event-ID": "0"},
+        )
+    )
+    assert [(event_id, data["task_id"]) for event_id, data in resumed] == [
+        (1, "3"),
+        (2, "2"),
+    ]
+
+
+def test_get_task_group_events_fetched(
+    flask_test_client, in_mock_auth_state, mock_redis, task_group, short_streams
+):
+    mock_redis.hset("task_1", "result", "result-1")
+    # as batch_status does once it has read a result
+    mock_redis.delete("task_2")
+
+    events = _events(
+        flask_test_client.get(
+            "/api/v1/task_groups/123/events", headers={"Authorization": "my_token"}
+        )
+    )
+
+    assert [data["task_id"] for _, data in events] == ["1", "2"]
+    assert events[0][1]["result"] == "result-1"
+    assert events[1][1] == {"task_id": "2", "status": "fetched"}
+
+
+def test_get_task_group_events_forbidden(
+    flask_test_client, in_mock_auth_state, mock_redis
+):
+    TaskGroup(mock_redis, "123", user_id=999)
+    response = flask_test_client.get(
+        "/api/v1/task_groups/123/events", headers={"Authorization": "my_token"}
+    )
+    assert response.status_code == 403
+
+
+def test_get_task_group_changes(
+    flask_test_client, in_mock_auth_state, mock_redis, task_group, mocker
+):
+    xrange = mocker.patch.object(
+        mock_redis,
+        "xrange",
+        return_value=[("7-0", {"task_id": "1", "status": "success"})],
+    )
+
+    response = flask_test_client.get(
+        "/api/v1/task_groups/123/changes?since=6-9&limit=5",
+        headers={"Authorization": "my_token"},
+    )
+
+    assert response.status_code == 200
+    assert response.json == {
+        "task_group_id": "123",
+        "changes": [{"task_id": "1", "status": "success", "cursor": "7-0"}],
+        "cursor": "7-0",
+    }
+    assert xrange.call_args.args[1] == "6-10"
+    assert xrange.call_args.kwargs["count"] == 5
+
+
+def test_get_task_group_changes_rejects_bad_cursor(
+    flask_test_client, in_mock_auth_state, task_group
+):
+    response = flask_test_client.get(
+        "/api/v1/task_groups/123/changes?since=yesterday",
+        headers={"Authorization": "my_token"},
+    )
+    assert response.status_code == 400
@@ -23,3 +23,32 @@ def test_read_from_config(tmp_path, monkeypatch):
     app_from_env = funcx_web_service.create_app()
     assert app_from_env.config["SECRET_VALUE"] == "shhh"
     assert app_from_env.config["BOOL_VALUE"]
+
+
+def test_warns_when_waits_hold_the_worker(mocker, caplog):
+    mocker.patch("funcx_web_service.RedisPoolManager")
+
+    app = funcx_web_service.create_app(
+        {"REDIS_HOST": "localhost", "REDIS_PORT": 6379, "TASK_WAIT_MAX": 30}
+    )
+
+    assert app.extensions["TaskWaiter"] is not None
+    assert "gevent" in caplog.text
+
+
+def test_no_task_waits_with_shards(mocker, caplog):
+    mocker.patch("funcx_web_service.RedisPoolManager")
+
+    app = funcx_web_service.create_app(
+        {"REDIS_HOST": "localhost", "REDIS_PORT": 6379, "REDIS_SHARDS": "r1:6379"}
+    )
+
+    assert app.extensions["TaskWaiter"] is None
+    assert "REDIS_SHARDS" in caplog.text
+
+
+def test_no_search_ingest_queue_without_redis(caplog):
+    app = funcx_web_service.create_app({"SEARCH_INGEST_QUEUE": True})
+
+    assert app.extensions["SearchIngestQueue"] is None
+    assert "SEARCH_INGEST_QUEUE" in caplog.text
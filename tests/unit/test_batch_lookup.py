@@ -0,0 +1,113 @@
+import contextlib
+import uuid
+
+import pytest
+from funcx_common.response_errors import EndpointNotFound, FunctionNotFound
+from sqlalchemy import event
+
+import funcx_web_service.authentication.auth
+from funcx_web_service.models import db
+from funcx_web_service.models.auth_groups import AuthGroup
+from funcx_web_service.models.batch import SubmitBatchLookup
+from funcx_web_service.models.container import Container
+from funcx_web_service.models.endpoint import Endpoint
+from funcx_web_service.models.function import (
+    Function,
+    FunctionAuthGroup,
+    FunctionContainer,
+)
+
+
+@pytest.fixture(autouse=True)
+def _auto_app_context(flask_app_ctx):
+    """Ensures that all tests in this module execute within a flask app context."""
+
+
+@contextlib.contextmanager
+def count_queries():
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _record)
+
+
+@pytest.fixture
+def stored_records():
+    container = Container(container_uuid=str(uuid.uuid4()), name="ctr")
+    owned = Function(function_uuid=str(uuid.uuid4()), user_id=22, entry_point="f")
+    owned.function_source_code = "owned-code"
+    owned.container = FunctionContainer(function=owned, container=container)
+    grouped = Function(function_uuid=str(uuid.uuid4()), user_id=1, entry_point="g")
+    grouped.auth_groups = [FunctionAuthGroup(group_id="fn-group", function=grouped)]
+    endpoint = Endpoint(endpoint_uuid=str(uuid.uuid4()), user_id=1, public=False)
+    ep_group = AuthGroup(group_id="ep-group", endpoint_id=endpoint.endpoint_uuid)
+
+    uuids = owned.function_uuid, grouped.function_uuid, endpoint.endpoint_uuid
+
+    db.session.add_all([container, owned, grouped, endpoint, ep_group])
+    db.session.commit()
+    # make sure that nothing is served from already loaded objects
+    db.session.expunge_all()
+    return uuids
+
+
+def test_lookup_resolves_batch_with_few_queries(stored_records):
+    owned, grouped, endpoint = stored_records
+    tasks = [[owned, endpoint, "x"], [grouped, endpoint, "y"]] * 500
+
+    with count_queries() as statements:
+        lookup = SubmitBatchLookup.from_tasks(tasks)
+        for function_uuid, _, _ in tasks:
+            lookup.resolve_function(function_uuid)
+            [g.group_id for g in lookup.get_function(function_uuid).auth_groups]
+        lookup.get_endpoint(endpoint).restricted_functions
+
+    # functions, their containers and groups, endpoints, whitelists and groups
+    assert len(statements) <= 6
+
+    assert set(lookup.functions) == {owned, grouped}
+    assert set(lookup.endpoints) == {endpoint}
+    assert lookup.endpoint_groups[endpoint] == ["ep-group"]
+    code, entry, container_uuid = lookup.resolve_function(owned)
+    assert (code, entry) == ("owned-code", "f")
+    assert container_uuid is not None
+    assert lookup.resolve_function(grouped)[2] is None
+
+
+def test_lookup_is_read_only(stored_records):
+    owned, _, endpoint = stored_records
+    lookup = SubmitBatchLookup.load([owned], [endpoint])
+    with pytest.raises(TypeError):
+        lookup.functions["other"] = None
+
+
+def test_lookup_missing_records(stored_records):
+    lookup = SubmitBatchLookup.from_tasks([["nope", "nada", ""], [{}, [], ""]])
+    with pytest.raises(FunctionNotFound):
+        lookup.resolve_function("nope")
+    with pytest.raises(EndpointNotFound):
+        lookup.authorize_endpoint(22, "nada", "nope", "ttttt")
+
+
+def test_lookup_checks_group_membership_once_per_batch(stored_records, mocker):
+    _, grouped, endpoint = stored_records
+    mock_check_group_membership = mocker.patch.object(
+        funcx_web_service.authentication.auth,
+        "check_group_membership",
+        return_value=True,
+    )
+
+    lookup = SubmitBatchLookup.load([grouped], [endpoint])
+    for _ in range(10):
+        assert lookup.authorize_function(22, grouped, "ttttt")
+        assert lookup.authorize_endpoint(22, endpoint, grouped, "ttttt")
+
+    assert mock_check_group_membership.call_count == 2
+    mock_check_group_membership.assert_any_call("ttttt", ["fn-group"], user_id=22)
+    mock_check_group_membership.assert_any_call("ttttt", ["ep-group"], user_id=22)
@@ -0,0 +1,85 @@
+import gzip
+import json
+
+import pytest
+
+from funcx_web_service.compression import decompress_body
+
+TASK_IDS = [f"task-{i}" for i in range(100)]
+
+
+def _batch_status(flask_test_client, **kwargs):
+    return flask_test_client.post(
+        "/api/v1/batch_status",
+        headers={"Authorization": "my_token", **kwargs.pop("headers", {})},
+        **kwargs,
+    )
+
+
+def test_large_responses_are_compressed(
+    flask_test_client, in_mock_auth_state, mock_redis
+):
+    response = _batch_status(
+        flask_test_client,
+        json={"task_ids": TASK_IDS},
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    results = json.loads(gzip.decompress(response.get_data()))["results"]
+    assert sorted(results) == sorted(TASK_IDS)
+
+
+@pytest.mark.parametrize(
+    "task_ids, accept_encoding", [(TASK_IDS[:1], "gzip"), (TASK_IDS, "identity")]
+)
+def test_small_or_unaccepted_responses_are_not_compressed(
+    flask_test_client, in_mock_auth_state, mock_redis, task_ids, accept_encoding
+):
+    response = _batch_status(
+        flask_test_client,
+        json={"task_ids": task_ids},
+        headers={"Accept-Encoding": accept_encoding},
+    )
+
+    assert "Content-Encoding" not in response.headers
+    assert sorted(response.json["results"]) == sorted(task_ids)
+
+
+def test_compressed_request_bodies(flask_test_client, in_mock_auth_state, mock_redis):
+    response = _batch_status(
+        flask_test_client,
+        data=gzip.compress(json.dumps({"task_ids": TASK_IDS}).encode()),
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 200
+    assert sorted(response.json["results"]) == sorted(TASK_IDS)
+
+
+def test_decompression_bombs_are_refused(flask_app, flask_test_client, monkeypatch):
+    monkeypatch.setitem(flask_app.config, "REQUEST_MAX_DECOMPRESSED_SIZE", 1000)
+    body = gzip.compress(json.dumps({"task_ids": ["x" * 10000]}).encode())
+
+    response = _batch_status(
+        flask_test_client,
+        data=body,
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 400
+    assert "larger than 1000 bytes" in response.json["reason"]
+
+
+def test_decompress_body_rejects_bad_data():
+    data = gzip.compress(b"x" * 100)
+    assert decompress_body(data, "gzip", 100) == b"x" * 100
+    for body, encoding in [
+        (data[:-20], "gzip"),
+        (b"not gzip", "gzip"),
+        (data, "br"),
+    ]:
+        with pytest.raises(Exception) as excinfo:
+            decompress_body(body, encoding, 100)
+        assert excinfo.value.http_status_code == 400
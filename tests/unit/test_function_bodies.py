@@ -0,0 +1,113 @@
+import uuid
+
+import pytest
+from funcx_common.task_storage import ImplicitRedisStorage, StorageException
+
+from funcx_web_service.models.function_bodies import (
+    FUNCTION_BODY_TTL,
+    function_body_id,
+    function_body_key,
+    resolve_task_payload,
+)
+from funcx_web_service.models.tasks import RedisTask, RedisTaskBatch, TaskSnapshot
+
+BODY = "packed-function-body" * 100
+
+
+def _launch(redis_client, bodies_and_args):
+    storage = ImplicitRedisStorage()
+    batch = RedisTaskBatch(redis_client)
+    tasks = []
+    for body, args in bodies_and_args:
+        task = batch.add(str(uuid.uuid1()), user_id=101)
+        task.function_body_id = batch.add_function_body(body)
+        storage.store_payload(task, args)
+        batch.put("ep-1", task)
+        tasks.append(task)
+    batch.execute()
+    return tasks
+
+
+def test_function_body_is_stored_once(mock_redis):
+    tasks = _launch(mock_redis, [(BODY, f"args-{i}") for i in range(100)])
+
+    key = function_body_key(function_body_id(BODY))
+    assert mock_redis.keys("function_body_*") == [key]
+    assert mock_redis.hget(key, "body") == BODY
+    assert mock_redis.hget(key, "refs") == "100"
+    assert 0 < mock_redis.ttl(key) <= FUNCTION_BODY_TTL.total_seconds()
+
+    storage = ImplicitRedisStorage()
+    for i, task in enumerate(tasks):
+        assert task.payload == f"args-{i}"
+        assert resolve_task_payload(mock_redis, task, storage) == BODY + f"args-{i}"
+
+
+def test_function_body_refs_accumulate_across_batches(mock_redis):
+    _launch(mock_redis, [(BODY, "a"), ("other-body", "b")])
+    _launch(mock_redis, [(BODY, "c")])
+
+    assert mock_redis.hget(function_body_key(function_body_id(BODY)), "refs") == "2"
+    other_key = function_body_key(function_body_id("other-body"))
+    assert mock_redis.hget(other_key, "refs") == "1"
+
+
+def test_function_body_released_with_last_task(mock_redis):
+    first, second = _launch(mock_redis, [(BODY, "a"), (BODY, "b")])
+    key = function_body_key(function_body_id(BODY))
+
+    RedisTask(mock_redis, first.task_id).delete()
+    assert mock_redis.hget(key, "refs") == "1"
+
+    RedisTask(mock_redis, second.task_id).delete()
+    assert not mock_redis.exists(key)
+
+
+def test_function_bodies_released_by_delete_many(mock_redis):
+    tasks = _launch(mock_redis, [(BODY, "a"), (BODY, "b"), ("other-body", "c")])
+    read = TaskSnapshot.read_many(mock_redis, [task.task_id for task in tasks])
+
+    RedisTask.delete_many(mock_redis, read.values())
+
+    assert mock_redis.exists(*[task.hname for task in tasks]) == 0
+    assert mock_redis.keys("function_body_*") == []
+
+
+def test_function_bodies_released_by_fetch_many(mock_redis):
+    done, running = _launch(mock_redis, [(BODY, "a"), (BODY, "b")])
+    mock_redis.hset(done.hname, "result", "result-a")
+    key = function_body_key(function_body_id(BODY))
+
+    fetched = TaskSnapshot.fetch_many(mock_redis, [done.task_id], 101)
+    assert mock_redis.hget(key, "refs") == "1"
+
+    # a task put back after its result couldn't be returned no longer holds a ref
+    RedisTask.restore_many(mock_redis, fetched.values())
+    assert RedisTask(mock_redis, done.task_id).function_body_id is None
+    TaskSnapshot.fetch_many(mock_redis, [done.task_id], 101)
+    assert mock_redis.hget(key, "refs") == "1"
+
+
+def test_function_body_not_written_for_tasks_which_are_not_put(mock_redis):
+    batch = RedisTaskBatch(mock_redis)
+    task = batch.add(str(uuid.uuid1()), user_id=101)
+    task.function_body_id = batch.add_function_body(BODY)
+    batch.execute()
+
+    assert mock_redis.keys("function_body_*") == []
+
+
+def test_resolve_task_payload_without_function_body(mock_redis):
+    task = RedisTask(mock_redis, str(uuid.uuid1()))
+    task.payload = BODY + "args"
+    assert resolve_task_payload(mock_redis, task, ImplicitRedisStorage()) == (
+        BODY + "args"
+    )
+
+
+def test_resolve_task_payload_missing_function_body(mock_redis):
+    (task,) = _launch(mock_redis, [(BODY, "args")])
+    mock_redis.delete(function_body_key(function_body_id(BODY)))
+
+    with pytest.raises(StorageException):
+        resolve_task_payload(mock_redis, task, ImplicitRedisStorage())
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+from funcx_common.task_storage import RedisS3Storage, StorageException
+
+from funcx_web_service.models.payload_writer import PayloadWriter
+from funcx_web_service.models.tasks import RedisTaskBatch
+
+
+@pytest.fixture
+def storage(mock_s3_bucket):
+    return RedisS3Storage(bucket_name=mock_s3_bucket, redis_threshold=10)
+
+
+def _tasks(mock_redis, count):
+    batch = RedisTaskBatch(mock_redis)
+    return [batch.add(f"task-{i}") for i in range(count)]
+
+
+def test_store_uploads_large_payloads_concurrently(storage, mock_redis, mocker):
+    store_payload = storage.store_payload
+    uploading = threading.Barrier(3, timeout=5)
+
+    def _store_together(task, payload):
+        # only returns once all three uploads are in progress at once
+        uploading.wait()
+        store_payload(task, payload)
+
+    mocker.patch.object(storage, "store_payload", side_effect=_store_together)
+    writer = PayloadWriter(storage, max_concurrency=3)
+    tasks = _tasks(mock_redis, 3)
+    for i, task in enumerate(tasks):
+        writer.store(task, f"payload-{i}" * 10)
+
+    assert writer.wait() == {}
+    for i, task in enumerate(tasks):
+        assert task.payload_reference["key"] == f"task-{i}.payload_reference"
+        assert storage.get_payload(task) == f"payload-{i}" * 10
+
+
+def test_store_keeps_small_payloads_inline(storage, mock_redis):
+    writer = PayloadWriter(storage)
+    (task,) = _tasks(mock_redis, 1)
+
+    writer.store(task, "small")
+
+    assert task.payload == "small"
+    assert writer._executor is None
+    assert writer.wait() == {}
+
+
+def test_wait_reports_failed_and_timed_out_uploads(storage, mock_redis, mocker):
+    release = threading.Event()
+
+    def _store(task, payload):
+        if task.task_id == "task-0":
+            raise StorageException("s3 is down")
+        if task.task_id == "task-1":
+            release.wait(5)
+
+    mocker.patch.object(storage, "store_payload", side_effect=_store)
+    writer = PayloadWriter(storage, timeout=0.1)
+    for task in _tasks(mock_redis, 3):
+        writer.store(task, "x" * 100)
+
+    errors = writer.wait()
+    release.set()
+
+    assert set(errors) == {"task-0", "task-1"}
+    assert isinstance(errors["task-0"], StorageException)
+    assert "timed out" in errors["task-1"].reason
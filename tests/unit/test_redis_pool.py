@@ -0,0 +1,67 @@
+import fakeredis
+import pytest
+import redis
+
+from funcx_web_service.models.redis_pool import (
+    MeteredConnectionPool,
+    RedisPoolManager,
+    RedisPoolMetrics,
+)
+from funcx_web_service.models.utils import get_redis_client
+
+
+@pytest.fixture
+def pool():
+    return MeteredConnectionPool(
+        metrics=RedisPoolMetrics(),
+        connection_class=fakeredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True,
+        max_connections=2,
+        timeout=0.01,
+    )
+
+
+def test_pool_reuses_connections(pool):
+    client = redis.StrictRedis(connection_pool=pool)
+    for i in range(10):
+        client.set("key", i)
+
+    assert client.get("key") == "9"
+    assert pool.size == 1
+    assert pool.metrics.checkouts == 11
+    assert pool.metrics.connects == 1
+    assert pool.metrics.reconnects == 0
+
+
+def test_pool_counts_reconnects(pool):
+    client = redis.StrictRedis(connection_pool=pool)
+    client.ping()
+    (connection,) = pool._connections
+    connection.disconnect()
+
+    client.ping()
+
+    assert pool.metrics.connects == 2
+    assert pool.metrics.reconnects == 1
+
+
+def test_pool_counts_checkout_failures(pool):
+    held = [pool.get_connection("PING") for _ in range(2)]
+
+    with pytest.raises(redis.ConnectionError):
+        pool.get_connection("PING")
+
+    assert pool.metrics.checkout_failures == 1
+    assert pool.metrics.max_wait_seconds >= 0.01
+    for connection in held:
+        pool.release(connection)
+
+
+def test_get_redis_client_uses_the_pool(flask_app, flask_app_ctx, mocker):
+    manager = RedisPoolManager("localhost", 6379)
+    mocker.patch.dict(flask_app.extensions, {"RedisPoolManager": manager})
+
+    assert get_redis_client() is manager.client
+    assert get_redis_client().connection_pool is manager.pool
+    assert manager.stats()["max_connections"] == 50
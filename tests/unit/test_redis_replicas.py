@@ -0,0 +1,50 @@
+from funcx_web_service.models.redis_replicas import ReplicaReader
+
+IN_SYNC = {
+    "role": "slave",
+    "master_link_status": "up",
+    "master_sync_in_progress": 0,
+    "master_last_io_seconds_ago": 3,
+}
+
+
+def _replica(mocker, **info):
+    replica = mocker.Mock()
+    replica.info.return_value = {**IN_SYNC, **info}
+    return replica
+
+
+def test_reader_takes_turns(mocker):
+    replicas = [_replica(mocker), _replica(mocker)]
+    reader = ReplicaReader(replicas)
+
+    assert [reader.client() for _ in range(4)] == replicas * 2
+
+
+def test_reader_skips_replicas_out_of_sync(mocker):
+    fresh = _replica(mocker)
+    syncing = _replica(mocker, master_sync_in_progress=1)
+    down = _replica(mocker, master_link_status="down")
+    reader = ReplicaReader([syncing, fresh, down])
+
+    assert {reader.client() for _ in range(3)} == {fresh}
+    assert ReplicaReader([syncing, down]).client() is None
+
+
+def test_reader_bounds_staleness(mocker):
+    replica = _replica(mocker)
+
+    assert ReplicaReader([replica], max_staleness=5).client() is replica
+    assert ReplicaReader([replica], max_staleness=1).client() is None
+
+
+def test_reader_checks_replicas_every_check_interval(mocker):
+    replica = _replica(mocker)
+    reader = ReplicaReader([replica], check_interval=60)
+    for _ in range(3):
+        reader.client()
+    assert replica.info.call_count == 1
+
+    replica.info.side_effect = ConnectionError
+    reader = ReplicaReader([replica], check_interval=0)
+    assert reader.client() is None
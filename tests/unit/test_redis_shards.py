@@ -0,0 +1,185 @@
+import uuid
+
+import fakeredis
+import pytest
+
+from funcx_web_service.models.function_bodies import function_body_key
+from funcx_web_service.models.invocation_counter import read_invocation_count
+from funcx_web_service.models.redis_pool import RedisPoolManager
+from funcx_web_service.models.redis_shards import (
+    HashRing,
+    ShardedRedis,
+    colocated_uuid,
+    parse_nodes,
+    routing_id,
+)
+from funcx_web_service.models.tasks import (
+    RedisTask,
+    RedisTaskBatch,
+    TaskGroup,
+    TaskSnapshot,
+)
+
+
+def _node():
+    return fakeredis.FakeStrictRedis(
+        server=fakeredis.FakeServer(), decode_responses=True
+    )
+
+
+@pytest.fixture
+def sharded():
+    return ShardedRedis(
+        _node(), [_node() for _ in range(3)], ["r1:6379", "r2:6379", "r3:6379"]
+    )
+
+
+@pytest.mark.parametrize(
+    "key, expected",
+    (
+        ("task_abc-1", "abc-1"),
+        ("task_group_g-1", "g-1"),
+        ("task_group_tasks_g-1", "g-1"),
+        ("task_group_completed_g-1_set", "g-1"),
+        ("task_group_change_state_g-1", "g-1"),
+        ("task_queue_ep-1", "ep-1"),
+        ("task_channel_ep-1", "ep-1"),
+        ("function_body_f00d", "f00d"),
+        ("results_{g-1}", "g-1"),
+        ("task_0b5e4a5c-6f1d-4a8e-9c4e-3d1f2a7b8c9d", "3d1f2a7b8c9d"),
+        ("task_group_tasks_0b5e4a5c-6f1d-4a8e-9c4e-3d1f2a7b8c9d", "3d1f2a7b8c9d"),
+        ("funcx_invocation_counter", None),
+        ("funcx_invocation_counter_3", None),
+        ("search_ingest_queue", None),
+    ),
+)
+def test_routing_id(key, expected):
+    assert routing_id(key) == expected
+
+
+def test_hash_ring_spreads_and_keeps_ids():
+    ids = [str(uuid.UUID(int=i)) for i in range(3000)]
+    ring = HashRing(["r1", "r2", "r3"])
+    placed = [ring.node_for(i) for i in ids]
+    for node in range(3):
+        assert placed.count(node) > 600
+
+    # a fourth node only takes ids from the others
+    grown = HashRing(["r1", "r2", "r3", "r4"])
+    moved = [i for i, node in zip(ids, placed) if grown.node_for(i) != node]
+    assert all(grown.node_for(i) == 3 for i in moved)
+    assert len(moved) < 1200
+
+
+def test_colocated_uuid(sharded):
+    task_group_id = str(uuid.uuid4())
+    task_id = colocated_uuid(task_group_id)
+
+    assert uuid.UUID(task_id).version == 4
+    assert task_id != task_group_id
+    assert sharded.node_for(f"task_{task_id}") is sharded.node_for(
+        f"task_group_{task_group_id}"
+    )
+    with pytest.raises(ValueError):
+        colocated_uuid("tg-1")
+
+
+def test_parse_nodes():
+    assert parse_nodes("r1:6379, r2:6380") == [("r1", 6379), ("r2", 6380)]
+    assert parse_nodes(["r1:6379"]) == [("r1", 6379)]
+    assert parse_nodes("") == []
+
+
+def test_sharded_batch(sharded, mocker):
+    task_group_id = str(uuid.uuid4())
+    batch = RedisTaskBatch(sharded, use_lua=True, task_group_id=task_group_id)
+    assert not batch.use_lua
+
+    body_id = batch.add_function_body("def f(): pass")
+    task_ids = []
+    for i in range(30):
+        task = batch.add(
+            batch.new_task_id(),
+            user_id=101,
+            function_id="fn-1",
+            container="RAW",
+            task_group_id=task_group_id,
+        )
+        task.function_body_id = body_id
+        task.payload = "payload"
+        batch.put(f"ep-{i % 2}", task)
+        task_ids.append(task.task_id)
+    batch.execute()
+
+    # the tasks are all on the node of their group
+    node = sharded.node_for(f"task_group_{task_group_id}")
+    assert node.exists(*[f"task_{task_id}" for task_id in task_ids]) == 30
+    # only the invocation counter is on the default node, where it's read from
+    assert all(
+        key.startswith("funcx_invocation_counter_") for key in sharded.default.keys()
+    )
+    assert read_invocation_count(sharded.default) == 30
+    assert sharded.lrange("task_queue_ep-0", 0, -1) == task_ids[::2]
+    assert sharded.lrange("task_queue_ep-1", 0, -1) == task_ids[1::2]
+    assert TaskGroup(sharded, task_group_id).task_ids() == task_ids
+    assert sharded.hget(function_body_key(body_id), "refs") == "30"
+
+    snapshots = TaskSnapshot.read_many(sharded, task_ids)
+    assert list(snapshots) == task_ids
+    assert all(snapshot.payload == "payload" for snapshot in snapshots.values())
+
+    for task_id in task_ids[:10]:
+        sharded.hset(f"task_{task_id}", "result", "result")
+    keys_by_node = mocker.spy(sharded, "keys_by_node")
+    fetched = TaskSnapshot.fetch_many(sharded, task_ids, 101)
+    # in one script, on the one node
+    assert [node for node, _ in keys_by_node.spy_return] == [node]
+    assert list(fetched) == task_ids
+    assert sharded.exists(*[f"task_{task_id}" for task_id in task_ids]) == 20
+    assert sharded.hget(function_body_key(body_id), "refs") == "20"
+
+    RedisTask.delete_many(sharded, snapshots.values())
+    assert sharded.exists(*[f"task_{task_id}" for task_id in task_ids]) == 0
+    assert not sharded.exists(function_body_key(body_id))
+
+
+def test_sharded_task_group_keys_share_a_node(sharded):
+    task_group = TaskGroup(sharded, "tg-1", user_id=101)
+    task_group.record_completed(["b", "a"])
+    task_group.record_completed(["a", "c"])
+
+    assert task_group.completed_task_ids() == ["b", "a", "c"]
+    node = sharded.node_for("task_group_tg-1")
+    assert sorted(node.keys()) == [
+        "task_group_completed_tg-1",
+        "task_group_completed_tg-1_set",
+        "task_group_tg-1",
+    ]
+
+
+def test_sharded_published_tasks_are_not_queued(sharded):
+    subscriber = sharded.node_for("task_channel_ep-1").pubsub()
+    subscriber.subscribe("task_channel_ep-1")
+
+    batch = RedisTaskBatch(sharded)
+    for _ in range(5):
+        batch.put("ep-1", batch.add(str(uuid.uuid4()), user_id=101))
+    batch.execute()
+
+    assert sharded.llen("task_queue_ep-1") == 0
+
+
+def test_sharded_script_keys_must_share_a_node(sharded):
+    script = sharded.register_script("return #KEYS")
+    assert script(keys=["task_group_tg-1", "task_group_tasks_tg-1"]) == 2
+
+    keys = [f"task_{uuid.uuid4()}" for _ in range(20)]
+    with pytest.raises(ValueError):
+        script(keys=keys)
+
+
+def test_pool_manager_with_shards():
+    manager = RedisPoolManager("localhost", 6379, shards=parse_nodes("r1:1,r2:2"))
+
+    assert isinstance(manager.client, ShardedRedis)
+    assert manager.stats()["shards"] == 2
@@ -0,0 +1,167 @@
+import time
+
+import pytest
+
+from funcx_web_service.models import search
+from funcx_web_service.models.search_queue import (
+    _KEYS,
+    CLAIMS_KEY,
+    IN_FLIGHT_KEY,
+    QUEUE_KEY,
+    SearchIngestQueue,
+)
+
+
+@pytest.fixture(autouse=True)
+def _auto_app_context(flask_app_ctx):
+    """Ensures that all tests in this module execute within a flask app context."""
+
+
+@pytest.fixture
+def ingest_queue(flask_app, mock_redis):
+    ingest_queue = SearchIngestQueue(
+        flask_app, mock_redis, batch_size=3, max_attempts=2, poll_interval=0.01
+    )
+    yield ingest_queue
+    ingest_queue.shutdown()
+
+
+@pytest.fixture
+def mock_ingest_entries(mocker):
+    return mocker.patch.object(search, "ingest_entries")
+
+
+def _entry(subject, version=0):
+    return {"subject": subject, "visible_to": ["public"], "content": {"v": version}}
+
+
+def _enqueue_without_thread(ingest_queue, mocker, *entries):
+    mocker.patch.object(ingest_queue, "_ensure_started")
+    for index_id, entry in entries:
+        ingest_queue.enqueue(index_id, entry)
+
+
+def test_enqueue_coalesces_updates_to_a_subject(
+    ingest_queue, mock_ingest_entries, mocker
+):
+    _enqueue_without_thread(
+        ingest_queue,
+        mocker,
+        ("index-1", _entry("fn-1", 0)),
+        ("index-1", _entry("fn-2", 0)),
+        ("index-1", _entry("fn-1", 1)),
+    )
+    assert len(ingest_queue) == 2
+
+    assert ingest_queue.drain_once() == 2
+
+    mock_ingest_entries.assert_called_once_with(
+        "index-1", [_entry("fn-1", 1), _entry("fn-2", 0)]
+    )
+    assert len(ingest_queue) == 0
+    assert ingest_queue.redis_client.hlen(IN_FLIGHT_KEY) == 0
+    assert ingest_queue.redis_client.hlen(CLAIMS_KEY) == 0
+
+
+def test_drain_batches_per_index(ingest_queue, mock_ingest_entries, mocker):
+    _enqueue_without_thread(
+        ingest_queue,
+        mocker,
+        *[("functions", _entry(f"fn-{i}")) for i in range(4)],
+        ("endpoints", _entry("ep-1")),
+    )
+
+    assert ingest_queue.drain_once() == 3
+    assert ingest_queue.drain_once() == 2
+    assert ingest_queue.drain_once() == 0
+
+    assert [c.args[0] for c in mock_ingest_entries.call_args_list] == [
+        "functions",
+        "functions",
+        "endpoints",
+    ]
+    assert [len(c.args[1]) for c in mock_ingest_entries.call_args_list] == [3, 1, 1]
+
+
+def test_failed_ingest_is_retried_then_dropped(
+    ingest_queue, mock_ingest_entries, mocker
+):
+    mock_ingest_entries.side_effect = RuntimeError("search is down")
+    _enqueue_without_thread(ingest_queue, mocker, ("index-1", _entry("fn-1")))
+
+    with pytest.raises(RuntimeError):
+        ingest_queue.drain_once()
+    assert len(ingest_queue) == 1
+
+    # max_attempts is 2
+    with pytest.raises(RuntimeError):
+        ingest_queue.drain_once()
+    assert len(ingest_queue) == 0
+    assert ingest_queue.redis_client.hlen(IN_FLIGHT_KEY) == 0
+
+
+def test_failed_ingest_does_not_replace_newer_update(
+    ingest_queue, mock_ingest_entries, mocker
+):
+    _enqueue_without_thread(ingest_queue, mocker, ("index-1", _entry("fn-1", 0)))
+
+    def _update_during_ingest(index_id, entries):
+        ingest_queue.enqueue("index-1", _entry("fn-1", 1))
+        raise RuntimeError("search is down")
+
+    mock_ingest_entries.side_effect = _update_during_ingest
+    with pytest.raises(RuntimeError):
+        ingest_queue.drain_once()
+
+    mock_ingest_entries.side_effect = None
+    assert ingest_queue.drain_once() == 1
+    mock_ingest_entries.assert_called_with("index-1", [_entry("fn-1", 1)])
+    assert ingest_queue.redis_client.llen(QUEUE_KEY) == 0
+
+
+def test_recover_requeues_abandoned_entries(ingest_queue, mock_ingest_entries, mocker):
+    _enqueue_without_thread(ingest_queue, mocker, ("index-1", _entry("fn-1")))
+    # a worker which took the entry and then died
+    ingest_queue._take(keys=_KEYS, args=[10, time.time() - 1000])
+    assert len(ingest_queue) == 0
+
+    assert ingest_queue.recover() == 1
+    assert ingest_queue.drain_once() == 1
+    mock_ingest_entries.assert_called_once_with("index-1", [_entry("fn-1")])
+
+
+def test_background_thread_ingests(ingest_queue, mock_ingest_entries):
+    ingest_queue.enqueue("index-1", _entry("fn-1"))
+
+    deadline = time.monotonic() + 5
+    while not mock_ingest_entries.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    mock_ingest_entries.assert_called_once_with("index-1", [_entry("fn-1")])
+
+
+def test_func_ingest_or_update_uses_queue(flask_app, ingest_queue, mocker):
+    enqueue = mocker.patch.object(ingest_queue, "enqueue")
+    get_search_client = mocker.patch.object(search, "get_search_client")
+    mocker.patch.dict(flask_app.extensions, {"SearchIngestQueue": ingest_queue})
+
+    search.func_ingest_or_update(
+        "fn-1",
+        {
+            "function_name": "f",
+            "function_code": "code",
+            "function_source": "def f(): pass",
+            "description": "",
+            "public": True,
+            "group": None,
+        },
+        author="me",
+        author_urn="urn:me",
+    )
+
+    get_search_client.assert_not_called()
+    index_id, entry = enqueue.call_args.args
+    assert index_id == search.FUNCTION_SEARCH_INDEX_ID
+    assert entry["subject"] == "fn-1"
+    assert entry["visible_to"][0] == "public"
+    assert entry["content"]["author"] == "me"
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+import requests
+import responses
+
+from funcx_web_service.models.serializer import (
+    SerializationClient,
+    deserialize_result,
+    serialize_inputs,
+)
+from tests.conftest import TEST_SERIALIZATION_ADDR
+
+BASE_URL = f"http://{TEST_SERIALIZATION_ADDR}:8000"
+
+
+@pytest.fixture(autouse=True)
+def _auto_app_context(flask_app_ctx):
+    """Ensures that all tests in this module execute within a flask app context."""
+
+
+def test_serialize_and_deserialize(mock_serialization_service):
+    assert serialize_inputs("data") == "serialize:data"
+    assert deserialize_result("data") == "deserialize:data"
+
+
+def test_failed_call_returns_none(mocked_responses):
+    mocked_responses.add(responses.POST, f"{BASE_URL}/serialize", status=500)
+    assert SerializationClient(BASE_URL).serialize("data") is None
+
+
+def test_many_calls_in_order_over_one_session(mock_serialization_service, mocker):
+    client = SerializationClient(BASE_URL, timeout=3, max_concurrency=4)
+    post = mocker.spy(requests.Session, "post")
+
+    futures = client.serialize_many([f"data-{i}" for i in range(20)])
+
+    assert [f.result() for f in futures] == [f"serialize:data-{i}" for i in range(20)]
+    assert post.call_count == 20
+    assert {id(call.args[0]) for call in post.call_args_list} == {id(client.session)}
+    # each bounded by what is left of the batch's timeout
+    assert all(0 < call.kwargs["timeout"] <= 3 for call in post.call_args_list)
+
+
+def test_many_calls_raise_per_item(mocked_responses):
+    mocked_responses.add(
+        responses.POST,
+        f"{BASE_URL}/deserialize",
+        body=requests.Timeout("too slow"),
+    )
+    client = SerializationClient(BASE_URL)
+
+    (future,) = client.deserialize_many(["data"])
+
+    with pytest.raises(requests.Timeout):
+        future.result()
+    assert client.deserialize_many([]) == []
+
+
+def test_many_calls_share_one_executor(mock_serialization_service):
+    client = SerializationClient(BASE_URL, max_concurrency=2)
+
+    client.serialize_many(["data"])
+    executor = client.executor
+    client.deserialize_many(["data", "more data", "even more data"])
+
+    assert client.executor is executor
+    assert executor._max_workers == 2
+
+
+def test_many_calls_share_one_deadline(mocked_responses, mocker):
+    def slow_call(request):
+        time.sleep(0.3)
+        return (200, {}, '"done"')
+
+    mocked_responses.add_callback(
+        responses.POST, f"{BASE_URL}/deserialize", callback=slow_call
+    )
+    client = SerializationClient(BASE_URL, timeout=0.5, max_concurrency=1)
+    post = mocker.spy(requests.Session, "post")
+
+    start = time.monotonic()
+    futures = client.deserialize_many(["1", "2", "3"])
+
+    # each call would fit in the timeout, but not all of them one after another
+    assert time.monotonic() - start < 0.5 + 0.2
+    assert futures[0].result() == "done"
+    for future in futures[1:]:
+        with pytest.raises(requests.Timeout):
+            future.result()
+    # the call in progress when the batch ran out of time only had what was left
+    assert post.call_args_list[1].kwargs["timeout"] < 0.5
+    client.executor.shutdown(wait=True)
+    assert post.call_count == 2
+
+
+def test_session_is_replaced_after_fork(mocker):
+    client = SerializationClient(BASE_URL)
+    session = client.session
+    executor = client.executor
+    assert client.session is session
+
+    mocker.patch("os.getpid", return_value=-1)
+    assert client.session is not session
+    assert client.executor is not executor
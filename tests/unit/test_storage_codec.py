@@ -0,0 +1,91 @@
+import pytest
+from funcx_common.task_storage import ImplicitRedisStorage, StorageException
+
+from funcx_web_service.models import storage_codec
+from funcx_web_service.models.storage_codec import CompressingTaskStorage, compress
+from funcx_web_service.models.tasks import RedisTask
+
+DATA = "serialized-args-" * 200
+
+
+@pytest.fixture
+def storage():
+    return CompressingTaskStorage(ImplicitRedisStorage(), threshold=100)
+
+
+def test_compresses_large_results(storage, mock_redis):
+    task = RedisTask(mock_redis, "1")
+    storage.store_result(task, DATA)
+
+    task = RedisTask(mock_redis, "1")
+    assert task.result_encoding == "zlib"
+    assert len(task.result) < len(DATA) / 10
+    assert storage.get_result(task) == DATA
+    assert storage.get_stored_result(task) == task.result
+
+
+def test_stores_payloads_as_is(storage, mock_redis):
+    task = RedisTask(mock_redis, "1")
+    storage.store_payload(task, DATA)
+
+    assert task.payload == DATA
+    assert task.payload_encoding is None
+    assert storage.get_payload(task) == DATA
+
+
+def test_compresses_large_payloads_when_asked(mock_redis):
+    storage = CompressingTaskStorage(
+        ImplicitRedisStorage(), threshold=100, compress_payloads=True
+    )
+    task = RedisTask(mock_redis, "1")
+    storage.store_payload(task, DATA)
+
+    task = RedisTask(mock_redis, "1")
+    assert task.payload_encoding == "zlib"
+    assert len(task.payload) < len(DATA) / 10
+    assert storage.get_payload(task) == DATA
+
+
+def test_reads_compressed_payloads(storage, mock_redis):
+    task = RedisTask(mock_redis, "1")
+    task.payload = compress(DATA, "zlib")
+    task.payload_encoding = "zlib"
+
+    assert storage.get_payload(task) == DATA
+
+
+@pytest.mark.parametrize("data", ["small", "".join(chr(i) for i in range(32, 2000))])
+def test_stores_small_and_incompressible_data_as_is(storage, mock_redis, data):
+    task = RedisTask(mock_redis, "1")
+    storage.store_result(task, data)
+
+    assert task.result == data
+    assert task.result_encoding is None
+    assert storage.get_result(task) == data
+
+
+def test_reads_compressed_data_without_compressing(mock_redis):
+    task = RedisTask(mock_redis, "1")
+    task.result = compress(DATA, "zlib")
+    task.result_encoding = "zlib"
+
+    storage = CompressingTaskStorage(ImplicitRedisStorage(), encoding=None)
+    assert storage.get_result(task) == DATA
+
+    storage.store_result(task, DATA)
+    assert task.result == DATA
+
+
+def test_corrupt_data_raises_storage_exception(storage, mock_redis):
+    task = RedisTask(mock_redis, "1")
+    task.result = "not compressed"
+    task.result_encoding = "zlib"
+
+    with pytest.raises(StorageException):
+        storage.get_result(task)
+
+
+def test_zstd_needs_zstandard(monkeypatch):
+    monkeypatch.setattr(storage_codec, "has_zstd", False)
+    with pytest.raises(RuntimeError):
+        CompressingTaskStorage(ImplicitRedisStorage(), encoding="zstd")
@@ -1,8 +1,17 @@
 import uuid
 
+import pytest
 from funcx_common.tasks import TaskState
 
-from funcx_web_service.models.tasks import InternalTaskState, RedisTask, TaskGroup
+from funcx_web_service.models.invocation_counter import read_invocation_count
+from funcx_web_service.models.tasks import (
+    InternalTaskState,
+    RedisTask,
+    RedisTaskBatch,
+    TaskBatchError,
+    TaskGroup,
+    TaskSnapshot,
+)
 
 
 def test_redis_task_creation(mock_redis):
@@ -80,3 +89,209 @@ def test_task_group_no_user_id(mock_redis):
     assert tg.user_id is None
 
     assert not TaskGroup.exists(mock_redis, task_group_id)
+
+
+def _build_batch(batch, count, endpoint_id="ep-1"):
+    task_ids = [str(uuid.uuid1()) for _ in range(count)]
+    for task_id in task_ids:
+        task = batch.add(task_id, user_id=101, function_id="fn-1", container="RAW")
+        task.payload = "payload"
+        batch.put(endpoint_id, task)
+    return task_ids
+
+
+@pytest.mark.parametrize("use_lua", (False, True))
+def test_redis_task_batch_creation(mock_redis, use_lua):
+    batch = RedisTaskBatch(mock_redis, use_lua=use_lua)
+    task_ids = _build_batch(batch, 20)
+    # nothing is written until the batch is executed
+    assert not RedisTask.exists(mock_redis, task_ids[0])
+
+    batch.execute()
+
+    for task_id in task_ids:
+        assert RedisTask.exists(mock_redis, task_id)
+        assert (
+            0 < mock_redis.ttl(f"task_{task_id}") <= RedisTask.TASK_TTL.total_seconds()
+        )
+        task = RedisTask(mock_redis, task_id)
+        assert task.status == TaskState.WAITING_FOR_EP
+        assert task.internal_status == InternalTaskState.INCOMPLETE
+        assert task.user_id == 101
+        assert task.function_id == "fn-1"
+        assert task.endpoint == "ep-1"
+        assert task.payload == "payload"
+    # no endpoint was subscribed, so every task was queued in order
+    assert mock_redis.lrange("task_queue_ep-1", 0, -1) == task_ids
+    assert read_invocation_count(mock_redis) == 20
+    # one round trip for the whole batch, plus one to queue the unreceived tasks
+    assert batch.round_trips == (1 if use_lua else 2)
+
+
+def test_redis_task_batch_published_tasks_are_not_queued(mock_redis):
+    subscriber = mock_redis.pubsub()
+    subscriber.subscribe("task_channel_ep-1")
+
+    batch = RedisTaskBatch(mock_redis)
+    _build_batch(batch, 5)
+    batch.execute()
+
+    assert mock_redis.llen("task_queue_ep-1") == 0
+    assert batch.round_trips == 1
+
+
+def test_redis_task_batch_skips_tasks_which_are_not_put(mock_redis):
+    batch = RedisTaskBatch(mock_redis)
+    task_id = str(uuid.uuid1())
+    batch.add(task_id, user_id=101)
+    batch.execute()
+
+    assert len(batch) == 0
+    assert not RedisTask.exists(mock_redis, task_id)
+    assert batch.round_trips == 0
+
+
+def test_redis_task_batch_adds_tasks_to_task_groups(mock_redis):
+    batch = RedisTaskBatch(mock_redis)
+    task_ids = []
+    for i in range(4):
+        task = batch.add(str(uuid.uuid1()), user_id=101, task_group_id=f"tg-{i % 2}")
+        batch.put("ep-1", task)
+        task_ids.append(task.task_id)
+    batch.execute()
+
+    assert TaskGroup(mock_redis, "tg-0").task_ids() == task_ids[::2]
+    assert TaskGroup(mock_redis, "tg-1").task_ids() == task_ids[1::2]
+    assert 0 < mock_redis.ttl(TaskGroup.members_key("tg-0"))
+    # one more round trip, for the member lists of every group
+    assert batch.round_trips == 3
+
+
+def test_redis_task_batch_reports_tasks_it_could_not_queue(mock_redis, mocker):
+    mocker.patch.object(RedisTaskBatch, "CHUNK_SIZE", 2)
+    mocker.patch.object(
+        RedisTaskBatch,
+        "_queue_unreceived",
+        side_effect=[None, ConnectionError("redis is down")],
+    )
+    batch = RedisTaskBatch(mock_redis)
+    body_id = batch.add_function_body("def f(): pass")
+    task_ids = []
+    for _ in range(5):
+        task = batch.add(str(uuid.uuid1()), user_id=101)
+        task.function_body_id = body_id
+        batch.put("ep-1", task)
+        task_ids.append(task.task_id)
+
+    with pytest.raises(TaskBatchError) as excinfo:
+        batch.execute()
+
+    assert excinfo.value.committed_task_ids == task_ids[:2]
+    assert excinfo.value.unqueued_task_ids == task_ids[2:4]
+    # the unqueued tasks exist, so only the unwritten one gives up its reference
+    assert mock_redis.exists(*[f"task_{task_id}" for task_id in task_ids]) == 4
+    assert mock_redis.hget(f"function_body_{body_id}", "refs") == "4"
+    assert read_invocation_count(mock_redis) == 4
+
+
+def test_task_snapshot_done_ids(mock_redis):
+    for task_id in ("1", "2", "3"):
+        RedisTask(mock_redis, task_id, user_id=7).payload = "payload" * 1000
+    mock_redis.hset("task_2", "result", "result")
+    mock_redis.hset("task_3", "exception", "")
+
+    assert TaskSnapshot.done_ids(mock_redis, ["1", "2", "3", "gone"]) == ["2", "gone"]
+
+
+def test_task_group_record_completed(mock_redis):
+    task_group = TaskGroup(mock_redis, "tg-1", user_id=101)
+    task_group.record_completed(["b", "a"])
+    task_group.record_completed(["a", "c"])
+
+    assert task_group.completed_task_ids() == ["b", "a", "c"]
+    assert task_group.completed_task_ids(2) == ["c"]
+
+
+def test_redis_task_batch_chunks(mock_redis, mocker):
+    mocker.patch.object(RedisTaskBatch, "CHUNK_SIZE", 2)
+    batch = RedisTaskBatch(mock_redis, use_lua=True)
+    task_ids = _build_batch(batch, 5)
+    batch.execute()
+
+    assert batch.round_trips == 3
+    assert mock_redis.lrange("task_queue_ep-1", 0, -1) == task_ids
+    assert read_invocation_count(mock_redis) == 5
+
+    # once written, tasks are ordinary RedisTasks
+    task = RedisTask(mock_redis, task_ids[0])
+    task.status = TaskState.SUCCESS
+    assert mock_redis.hget(f"task_{task_ids[0]}", "status") == "success"
+
+
+def test_task_snapshot_reads_without_touching_expiry(mock_redis, mocker):
+    task = RedisTask(mock_redis, "snapshot-task", user_id=7, function_id="fn-1")
+    task.result_reference = {"storage_id": "s3", "key": "k"}
+    mock_redis.persist(task.hname)
+
+    hgetall_spy = mocker.spy(mock_redis, "hgetall")
+    ttl_spy = mocker.spy(mock_redis, "ttl")
+    expire_spy = mocker.spy(mock_redis, "expire")
+
+    snapshot = TaskSnapshot.read(mock_redis, "snapshot-task")
+
+    assert snapshot.user_id == 7
+    assert snapshot.function_id == "fn-1"
+    assert snapshot.status == TaskState.WAITING_FOR_EP
+    assert snapshot.result_reference == {"storage_id": "s3", "key": "k"}
+    assert snapshot.result is None
+    hgetall_spy.assert_called_once_with("task_snapshot-task")
+    ttl_spy.assert_not_called()
+    expire_spy.assert_not_called()
+    assert mock_redis.ttl(task.hname) == -1
+
+    with pytest.raises(AttributeError):
+        snapshot.status = TaskState.SUCCESS
+    assert not hasattr(snapshot, "__dict__")
+    assert TaskSnapshot.read(mock_redis, "no-such-task") is None
+
+
+def test_task_snapshot_fetch_many(mock_redis):
+    for task_id in ("done", "running", "other"):
+        RedisTask(mock_redis, task_id, user_id=7 if task_id != "other" else 8)
+    mock_redis.hset("task_done", "result", "result-1")
+    mock_redis.hset("task_other", "result", "result-2")
+
+    tasks = TaskSnapshot.fetch_many(
+        mock_redis, ["done", "running", "other", "unknown"], 7
+    )
+
+    assert tasks["done"].result == "result-1"
+    assert tasks["running"].status == TaskState.WAITING_FOR_EP
+    # other users' tasks are neither returned nor deleted
+    assert tasks["other"] is None and tasks["unknown"] is None
+    assert mock_redis.exists("task_done", "task_running", "task_other") == 2
+
+    # only the first fetch of a completed task gets it
+    assert TaskSnapshot.fetch_many(mock_redis, ["done"], 7) == {"done": None}
+
+
+def test_redis_task_restore_many(mock_redis):
+    RedisTask(mock_redis, "done", user_id=7)
+    mock_redis.hset("task_done", "result", "result-1")
+    tasks = TaskSnapshot.fetch_many(mock_redis, ["done"], 7)
+
+    RedisTask.restore_many(mock_redis, tasks.values())
+
+    assert mock_redis.hget("task_done", "result") == "result-1"
+    assert 0 < mock_redis.ttl("task_done") <= RedisTask.TASK_TTL.total_seconds()
+
+
+def test_redis_task_batch_spreads_invocation_count(mock_redis):
+    for _ in range(20):
+        batch = RedisTaskBatch(mock_redis)
+        _build_batch(batch, 2)
+        batch.execute()
+
+    assert read_invocation_count(mock_redis) == 40
+    assert not mock_redis.exists("funcx_invocation_counter")
+    assert len(mock_redis.keys("funcx_invocation_counter_*")) > 1
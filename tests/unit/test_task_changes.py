@@ -0,0 +1,142 @@
+import time
+
+import pytest
+
+from funcx_web_service.models import task_changes
+from funcx_web_service.models.task_changes import (
+    GROUPS_KEY,
+    LEASE_KEY,
+    TaskChangeRecorder,
+    changes_key,
+    read_changes,
+)
+
+
+@pytest.fixture
+def recorder(flask_app, mock_redis):
+    recorder = TaskChangeRecorder(flask_app, mock_redis, lease_ttl=1)
+    yield recorder
+    recorder.shutdown()
+
+
+def test_record_tasks_groups_changes(recorder, mock_redis, mocker):
+    record_changes = mocker.patch.object(task_changes, "record_changes", return_value=1)
+    mock_redis.hset("task_1", mapping={"task_group_id": "tg-1", "status": "running"})
+    mock_redis.hset("task_2", mapping={"task_group_id": "tg-2", "status": "success"})
+    mock_redis.hset("task_3", mapping={"task_group_id": "tg-1", "status": "failed"})
+    # not in a task group
+    mock_redis.hset("task_4", mapping={"status": "running"})
+
+    assert recorder.record_tasks(["1", "2", "3", "4", "missing"]) == 2
+
+    record_changes.assert_has_calls(
+        [
+            mocker.call(mock_redis, "tg-1", [("1", "running"), ("3", "failed")]),
+            mocker.call(mock_redis, "tg-2", [("2", "success")]),
+        ]
+    )
+
+
+def test_reconcile_records_missed_changes(recorder, mock_redis, mocker):
+    record_changes = mocker.patch.object(task_changes, "record_changes", return_value=1)
+    # recorded as created, then run and completed while no one was subscribed
+    mock_redis.hset(
+        task_changes.state_key("tg-1"), mapping={"1": "waiting-for-ep", "2": "running"}
+    )
+    mock_redis.zadd(GROUPS_KEY, {"tg-1": time.time()})
+    mock_redis.hset("task_1", mapping={"task_group_id": "tg-1", "status": "running"})
+    mock_redis.hset("task_2", mapping={"task_group_id": "tg-1", "status": "success"})
+
+    assert recorder.reconcile() == 1
+
+    record_changes.assert_called_once_with(
+        mock_redis, "tg-1", [("1", "running"), ("2", "success")]
+    )
+
+
+def test_reconcile_only_tracked_groups(recorder, mock_redis, mocker):
+    record_tasks = mocker.patch.object(recorder, "record_tasks", return_value=0)
+    for task_group_id, task_id in [("tg-1", "1"), ("tg-2", "2"), ("tg-3", "3")]:
+        mock_redis.hset(task_changes.state_key(task_group_id), task_id, "running")
+    mock_redis.zadd(GROUPS_KEY, {"tg-1": time.time()})
+    # created too long ago for its changes to still be kept
+    mock_redis.zadd(
+        GROUPS_KEY, {"tg-2": time.time() - task_changes.CHANGES_TTL.total_seconds()}
+    )
+
+    recorder.reconcile()
+
+    record_tasks.assert_called_once_with(["1"])
+    assert mock_redis.zrange(GROUPS_KEY, 0, -1) == ["tg-1"]
+
+
+def test_warns_without_notifications(recorder, mock_redis, mocker):
+    mocker.patch.object(
+        mock_redis, "config_get", return_value={"notify-keyspace-events": ""}
+    )
+    config_set = mocker.patch.object(mock_redis, "config_set")
+    warning = mocker.patch.object(recorder.app.logger, "warning")
+
+    recorder._check_notifications()
+    warning.assert_called_once()
+    config_set.assert_not_called()
+
+    recorder.configure_notifications = True
+    recorder._check_notifications()
+    config_set.assert_called_once_with("notify-keyspace-events", "Kh")
+
+
+def test_collect_keeps_task_hash_changes(recorder, mocker):
+    messages = [
+        {"type": "pmessage", "channel": "__keyspace@0__:task_1", "data": "hset"},
+        {"type": "pmessage", "channel": "__keyspace@0__:task_1", "data": "hset"},
+        {"type": "pmessage", "channel": "__keyspace@0__:task_2", "data": "expire"},
+        {"type": "pmessage", "channel": "__keyspace@0__:task_group_9", "data": "hset"},
+        {"type": "pmessage", "channel": "__keyspace@0__:task_3", "data": "hset"},
+        None,
+    ]
+    pubsub = mocker.Mock()
+    pubsub.get_message.side_effect = messages
+
+    assert recorder._collect(pubsub) == ["1", "3"]
+
+
+def test_only_one_recorder_holds_the_lease(flask_app, mock_redis, recorder):
+    other = TaskChangeRecorder(flask_app, mock_redis, lease_ttl=1)
+    recorder._token, other._token = "a", "b"
+
+    assert recorder._acquire_lease()
+    assert not other._acquire_lease()
+    # renewing
+    assert recorder._acquire_lease()
+
+    recorder._release_lease()
+    time.sleep(0.01)
+    assert other._acquire_lease()
+    assert mock_redis.get(LEASE_KEY) == "b"
+
+
+def test_read_changes_after_cursor(mock_redis, mocker):
+    xrange = mocker.patch.object(
+        mock_redis,
+        "xrange",
+        return_value=[
+            ("5-0", {"task_id": "1", "status": "running"}),
+            ("5-1", {"task_id": "2", "status": "running"}),
+            ("6-0", {"task_id": "1", "status": "success"}),
+        ],
+    )
+
+    changes, cursor = read_changes(mock_redis, "tg-1", since="4-3", count=10)
+
+    xrange.assert_called_once_with(changes_key("tg-1"), "4-4", "+", count=10)
+    assert changes == [
+        {"task_id": "2", "status": "running", "cursor": "5-1"},
+        {"task_id": "1", "status": "success", "cursor": "6-0"},
+    ]
+    assert cursor == "6-0"
+
+
+def test_read_changes_without_new_changes(mock_redis, mocker):
+    mocker.patch.object(mock_redis, "xrange", return_value=[])
+    assert read_changes(mock_redis, "tg-1", since="4-3") == ([], "4-3")
@@ -0,0 +1,116 @@
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from funcx_web_service.models import db
+from funcx_web_service.models.task_log import TaskLogWriter
+from funcx_web_service.models.tasks import DBTask
+from funcx_web_service.models.utils import db_invocation_logger
+
+
+@pytest.fixture(autouse=True)
+def _auto_app_context(flask_app_ctx):
+    """Ensures that all tests in this module execute within a flask app context."""
+
+
+@pytest.fixture
+def insert_statements():
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO tasks"):
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", _record)
+
+
+@pytest.fixture
+def background_writer(flask_app):
+    writer = TaskLogWriter(flask_app, max_queue_size=100, flush_interval=0.01)
+    flask_app.extensions["TaskLogWriter"] = writer
+    yield writer
+    flask_app.extensions["TaskLogWriter"] = None
+    writer.shutdown(timeout=5)
+
+
+def _make_rows(count):
+    task_ids = [str(uuid.uuid4()) for _ in range(count)]
+    return task_ids, [
+        {"user_id": 22, "task_uuid": task_id, "status": "CREATED"}
+        for task_id in task_ids
+    ]
+
+
+def _stored(task_ids):
+    return DBTask.query.filter(DBTask.task_uuid.in_(task_ids)).count()
+
+
+def test_deferred_log_is_written_on_commit(insert_statements):
+    logger = db_invocation_logger()
+    task_ids = [str(uuid.uuid4()) for _ in range(50)]
+    for task_id in task_ids:
+        logger.log(22, task_id, "fn-1", "ep-1", deferred=True)
+    assert _stored(task_ids) == 0
+
+    logger.commit()
+
+    assert _stored(task_ids) == 50
+    assert len(insert_statements) == 1
+    row = DBTask.query.filter_by(task_uuid=task_ids[0]).one()
+    assert (row.user_id, row.status) == (22, "CREATED")
+    assert (row.function_id, row.endpoint_id) == ("fn-1", "ep-1")
+
+
+def test_deferred_log_discard():
+    logger = db_invocation_logger()
+    task_id = str(uuid.uuid4())
+    logger.log(22, task_id, "fn-1", "ep-1", deferred=True)
+    logger.discard()
+    logger.commit()
+
+    assert _stored([task_id]) == 0
+
+
+def test_immediate_log():
+    task_id = str(uuid.uuid4())
+    db_invocation_logger().log(22, task_id, "fn-1", "ep-1")
+    assert _stored([task_id]) == 1
+
+
+def test_commit_hands_rows_to_background_writer(background_writer):
+    logger = db_invocation_logger()
+    task_ids = [str(uuid.uuid4()) for _ in range(10)]
+    for task_id in task_ids:
+        logger.log(22, task_id, "fn-1", "ep-1", deferred=True)
+    logger.commit()
+
+    assert background_writer.flush(timeout=5)
+    assert _stored(task_ids) == 10
+
+
+def test_background_writer_drops_rows_on_overflow(flask_app, mocker):
+    writer = TaskLogWriter(flask_app, max_queue_size=3)
+    # keep the thread from draining the queue, as a stalled database would
+    mocker.patch.object(writer, "_ensure_started")
+
+    task_ids, rows = _make_rows(5)
+    assert writer.submit(rows) == 3
+    assert writer.dropped == 2
+
+    # without a running thread, shutdown writes what was queued itself
+    writer.shutdown()
+    assert _stored(task_ids) == 3
+
+
+def test_background_writer_shutdown_flushes(flask_app):
+    writer = TaskLogWriter(flask_app, batch_size=4, flush_interval=10)
+    task_ids, rows = _make_rows(10)
+    assert writer.submit(rows) == 10
+
+    writer.shutdown(timeout=5)
+
+    assert not writer._thread.is_alive()
+    assert _stored(task_ids) == 10
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from funcx_web_service.models.task_waiter import TaskWaiter
+
+
+@pytest.fixture
+def task_waiter(flask_app, mock_redis):
+    task_waiter = TaskWaiter(flask_app, mock_redis, recheck_interval=10)
+    yield task_waiter
+    task_waiter.shutdown()
+
+
+def _later(delay, func):
+    timer = threading.Timer(delay, func)
+    timer.start()
+    return timer
+
+
+def test_wait_returns_straight_away_if_done(task_waiter):
+    start = time.monotonic()
+    assert task_waiter.wait(["1"], lambda: True, timeout=5)
+    assert time.monotonic() - start < 1
+
+
+def test_wait_wakes_on_notification(task_waiter, mock_redis):
+    def complete():
+        mock_redis.hset("task_1", "result", "done")
+        # what Redis publishes with keyspace notifications enabled
+        mock_redis.publish(task_waiter.channel("1"), "hset")
+
+    _later(0.2, complete)
+    start = time.monotonic()
+
+    assert task_waiter.wait(["1"], lambda: mock_redis.hexists("task_1", "result"), 5)
+    # well before recheck_interval
+    assert time.monotonic() - start < 2
+    assert task_waiter._waiters == {}
+
+
+def test_wait_ignores_other_tasks(task_waiter, mock_redis):
+    _later(0.1, lambda: mock_redis.publish(task_waiter.channel("2"), "hset"))
+    checks = []
+
+    assert not task_waiter.wait(["1"], lambda: checks.append(1) and False, 0.5)
+    assert len(checks) == 2
+
+
+def test_wait_rechecks_without_notifications(flask_app, mock_redis):
+    task_waiter = TaskWaiter(flask_app, mock_redis, recheck_interval=0.1)
+    _later(0.2, lambda: mock_redis.hset("task_1", "result", "done"))
+    try:
+        assert task_waiter.wait(
+            ["1"], lambda: mock_redis.hexists("task_1", "result"), 5
+        )
+    finally:
+        task_waiter.shutdown()
+
+
+def test_wait_times_out(task_waiter):
+    start = time.monotonic()
+    assert not task_waiter.wait(["1"], lambda: False, timeout=0.3)
+    assert 0.3 <= time.monotonic() - start < 2